@@ -1,230 +1,284 @@
-import sqlite3
-from flask import Flask, request, jsonify
-
-# Create a Flask application instance
-app = Flask(__name__)
-
-# --- Database Connection ---
-# Establishes a connection to the SQLite database.
-# Using sqlite3.Row as the row_factory allows accessing columns by name.
-def get_db_connection():
-    """Creates and returns a database connection."""
-    conn = sqlite3.connect('trackwise_db.sqlite')
-    conn.row_factory = sqlite3.Row
-    return conn
-
-# --- API Endpoint for User Login ---
-@app.route('/api/login', methods=['POST'])
-def login():
-    """
-    Handles user login attempts.
-    Expects a JSON payload with 'username' and 'password'.
-    """
-    # 1. Receive JSON data from the request
-    try:
-        data = request.get_json()
-        username = data.get('username')
-        password = data.get('password')
-
-        if not username or not password:
-            return jsonify({"success": False, "message": "Username and password are required"}), 400
-            
-    except Exception as e:
-        # Handle cases where the request is not JSON or is malformed
-        return jsonify({"success": False, "message": "Invalid request format"}), 400
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    try:
-        # 2. Query the Employee table for the given username
-        cursor.execute("SELECT * FROM Employee WHERE Username = ?", (username,))
-        employee = cursor.fetchone() # Fetch one record
-
-        # 3. Check if user exists and if the password matches
-        # NOTE: This is a simple, direct password comparison as requested.
-        # In a real-world application, ALWAYS use hashed passwords (e.g., with Werkzeug or passlib).
-        if employee and employee['PasswordHash'] == password:
-            # 4. Successful login
-            return jsonify({"success": True}), 200
-        else:
-            # 5. Invalid username or password
-            return jsonify({"success": False, "message": "Invalid credentials"}), 401
-
-    except Exception as e:
-        # General error handling for database issues
-        return jsonify({"success": False, "message": f"An internal error occurred: {e}"}), 500
-        
-    finally:
-        # 6. Always close the database connection
-        conn.close()
-
-# --- Main entry point to run the Flask app ---
-if __name__ == '__main__':
-    # Runs the app on port 5000 in debug mode for development
-    app.run(debug=True)
-    
-    # ==============================================================================
+# ==============================================================================
 # TrackWise Inventory Management System - Flask API
 # ==============================================================================
 
 # --- Imports ---
-# Flask for web server functionality.
+# Flask for web server functionality; the routes live on a Blueprint that
+# create_app() registers.
 # jsonify for creating JSON responses.
 # request to access incoming request data (like JSON payloads).
+# Response to stream generated bodies (used by the export endpoints).
+# g holds the authenticated session for the current request.
 # sqlite3 to interact with the SQLite database.
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, Response, g, jsonify, request
 import sqlite3
+import time
+
+# The shared, pooled connection layer, one pool per store shard (see db.py).
+from db import (ALL_STORES, DEFAULT_STORE, STORES, current_store, get_db_connection,
+                pool_for, pools, read_only, read_pools, read_transaction, release_db_connection)
+# Trigger-maintained dashboard totals (see kpi.py).
+import kpi
+# Per-product sales rollups behind the reports page (see rollups.py).
+import rollups
+# Versioned schema migrations (see schema.py).
+import schema
+# Product field validation and streaming bulk import (see products.py).
+import products
+# Streaming, keyset-paginated table export (see export.py).
+import export
+# Online, stepped backups with compression and rotation (see backup.py).
+from backup import backups
+# Server-Sent Events change feed for dashboards (see events.py).
+import events
+# Group-commit writer for product and sale writes (see writer.py).
+from writer import write_queues, WriteQueueFull, WriteTimeout
+# Sale validation and recording (see sales.py).
+import sales
+# Password hashing, signed session tokens and the session cache (see auth.py).
+import auth
+from auth import login_required
+# Version-keyed response cache with ETags for the dashboard reads (see cache.py).
+from cache import responses
+# Columnar list payloads and gzip compression (see payload.py).
+import payload
+# Paginated product listing and FTS5 search (see catalog.py).
+import catalog
+# In-memory barcode -> product index for point-of-sale scans (see barcodes.py).
+from barcodes import barcode_indexes
+import barcodes
+# Append-only stock movement ledger and point-in-time stock (see stock.py).
+import stock
+# Request and SQL metrics in the Prometheus text format (see metrics.py).
+import metrics
+# Slow statements with their query plans (see slowlog.py).
+from slowlog import slow_queries
+# Parallel queries and merges across the store shards (see shards.py).
+import shards
+# NumPy reorder suggestions from sales velocity and lead times (see reorder.py).
+import reorder
+# Closed months of sales moved to per-month archive files (see archive.py).
+import archive
+# The dashboard's reads bundled into one snapshot (see dashboard.py).
+import dashboard
 
 # --- Application Setup ---
-# 1. Create a Flask application instance.
-app = Flask(__name__)
-
-# 2. Define the path to the SQLite database file.
-DATABASE = 'trackwise.db'
-
-
-# --- Database Utility Function ---
-# 3. A function to create and return a database connection.
-#    This helps avoid redundant code and manages connections cleanly.
-def get_db_connection():
-    """
-    Creates and returns a connection to the SQLite database.
-    The connection is configured to return rows as dictionary-like objects
-    (sqlite3.Row), which allows accessing columns by name.
-    """
+# 1. Every route and request hook is registered on this Blueprint. The
+#    application itself is built by create_app() at the end of this file,
+#    which the development server and the prefork server (see server.py)
+#    both call.
+api = Blueprint('api', __name__)
+
+
+# --- Database Bootstrap ---
+# 2. Bring the database schema up to date before serving any request.
+#    Only migrations newer than the database's schema version are applied.
+#    Every store's shard is migrated. create_app() runs this.
+def bootstrap_database():
+    """Applies any pending schema migrations, then loads the in-memory indexes."""
+    for store in STORES:
+        conn = get_db_connection(store)
+        try:
+            schema.migrate(conn)
+        finally:
+            release_db_connection(conn)
+
+        # 3. Warm the barcode index so the first scan does not pay for the load.
+        barcode_indexes.get(store).load()
+
+
+# --- Store Selection ---
+# 4. Each request works on one store, named by the X-Store header or the
+#    ?store= parameter (default: DEFAULT_STORE). Connections, the writer,
+#    the caches and session tokens all follow it. store=all is only accepted
+#    by the cross-store views, which fan out to every shard (see shards.py).
+STORE_HEADER = 'X-Store'
+CROSS_STORE_ENDPOINTS = {
+    'api.get_low_stock_products', 'api.get_recent_sales', 'api.get_dashboard_kpis', 'api.get_dashboard'
+}
+
+
+@api.before_app_request
+def select_store():
+    """Resolves the request's store, or rejects an unknown one."""
+    store = request.headers.get(STORE_HEADER) or request.args.get('store') or DEFAULT_STORE
+    if store == ALL_STORES:
+        if request.endpoint not in CROSS_STORE_ENDPOINTS:
+            return jsonify({"error": "store=all is only supported by the low stock, "
+                                     "recent sales, dashboard KPI and dashboard endpoints"}), 400
+    elif store not in STORES:
+        return jsonify({"error": f"Unknown store: {store}"}), 404
+    g.store = store
+    g.store_token = current_store.set(store if store != ALL_STORES else DEFAULT_STORE)
+
+
+# 5. GET requests only read, so their connections come from the store's
+#    read-only pool (see db.py). Mutations go through the store's writer.
+@api.before_app_request
+def route_connections():
+    g.read_only_token = read_only.set(request.method in ('GET', 'HEAD'))
+
+
+@api.teardown_app_request
+def reset_request_context(exception=None):
+    for name, variable in (('read_only_token', read_only), ('store_token', current_store)):
+        token = g.pop(name, None)
+        if token is not None:
+            variable.reset(token)
+
+
+# --- Request Metrics ---
+@api.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+# Flask runs after_request hooks in reverse order of registration, so this
+# one runs last and the recorded time includes compression.
+@api.after_app_request
+def record_request_metrics(response):
+    """Records the request's latency and status under its route pattern."""
+    started = g.get('request_started')
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe_request(request.method, route, response.status_code, time.perf_counter() - started)
+    return response
+
+
+# --- Response Compression ---
+@api.after_app_request
+def compress_response(response):
+    """Gzips large JSON/CSV responses for clients that accept it (see payload.py)."""
+    return payload.gzip_response(response)
 
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # This is a crucial line for convenient data access
-    return conn
 
+# --- API ROUTES ---
 
-# --- API ROUTES WILL GO HERE ---
-# 4. Placeholder for all your future API endpoints.
-#    Example: @app.route('/api/products', methods=['GET'])
-
-@app.route('/')
+@api.route('/')
 def index():
     """A simple route to confirm the server is running."""
     return "TrackWise API is running!"
 
 
-# --- Main Execution Block ---
-# 5. The standard Python entry point.
-#    This block runs the Flask development server when the script is executed directly.
-#    debug=True enables auto-reloading on code changes and provides helpful error pages.
-if __name__ == '__main__':
-    app.run(debug=True)
-    
-    # ==============================================================================
-# TrackWise Inventory Management System - Flask API
-# ==============================================================================
-
-# --- Imports ---
-from flask import Flask, jsonify, request
-import sqlite3
-
-# --- Application Setup ---
-app = Flask(__name__)
-DATABASE = 'trackwise.db'
-
-
-# --- Database Utility Function ---
-def get_db_connection():
-    """
-    Creates and returns a connection to the SQLite database.
-    The connection is configured to return rows as dictionary-like objects.
-    """
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-# --- API ROUTES WILL GO HERE ---
-# ==============================================================================
-# TrackWise Inventory Management System - Flask API
-# ==============================================================================
-
-# --- Imports ---
-from flask import Flask, jsonify, request
-import sqlite3
-
-# --- Application Setup ---
-app = Flask(__name__)
-DATABASE = 'trackwise.db'
-
-
-# --- Database Utility Function ---
-def get_db_connection():
-    """
-    Creates and returns a connection to the SQLite database.
-    The connection is configured to return rows as dictionary-like objects.
-    """
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-# --- API ROUTES WILL GO HERE ---
-
-@app.route('/')
-def index():
-    """A simple route to confirm the server is running."""
-    return "TrackWise API is running!"
-
 # ======================= User Login Endpoint =======================
-@app.route('/api/login', methods=['POST'])
+@api.route('/api/login', methods=['POST'])
 def login():
     """
     Handles user login by validating credentials against the Employee table.
     Expects a JSON payload with 'username' and 'password'.
+    On success, returns a signed session token to send as
+    'Authorization: Bearer <token>' on protected endpoints.
     """
+    # 1. Get the JSON data from the incoming request.
     try:
         data = request.get_json()
         username = data.get('username')
         password = data.get('password')
 
+        # Basic validation to ensure fields are not empty
         if not username or not password:
             return jsonify({"success": False, "message": "Username and password are required"}), 400
+        # The hash check encodes the password; a number or list would fail there with a 500.
+        if not isinstance(username, str) or not isinstance(password, str):
+            return jsonify({"success": False, "message": "Username and password must be strings"}), 400
+
     except:
+        # Handle cases where the request body is not valid JSON
         return jsonify({"success": False, "message": "Invalid request format"}), 400
 
     conn = get_db_connection()
     try:
+        # 2. Query the Employee table for the username.
+        #    Using parameterized queries (?) prevents SQL injection vulnerabilities.
         cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM Employee WHERE Username = ? AND PasswordHash = ?",
-            (username, password)
-        )
+        cursor.execute("SELECT * FROM Employee WHERE Username = ?", (username,))
         employee = cursor.fetchone()
 
-        if employee:
-            return jsonify({"success": True})
-        else:
-            return jsonify({"success": false, "message": "Invalid credentials"}), 401
     except Exception as e:
+        # Catch any potential database errors
         print(f"Database error: {e}")
         return jsonify({"success": False, "message": "An internal server error occurred"}), 500
+
     finally:
-        conn.close()
+        # Hand the connection back to the pool before the (slow) hash check
+        release_db_connection(conn)
+
+    # 3. Verify the password on the hashing pool (see auth.py).
+    if employee is None or not auth.verify_password_async(password, employee['PasswordHash']).result():
+        # 4. If it fails, return a 401 Unauthorized status and an error message.
+        return jsonify({"success": False, "message": "Invalid credentials"}), 401
+
+    # 5. Upgrade a legacy plain-text password to a hash, off the request path.
+    if not auth.is_hashed(employee['PasswordHash']):
+        auth.rehash_in_background(employee['EmployeeID'], password)
+
+    # 6. If successful, return a session token for this store.
+    token = auth.issue_token(employee, g.store)
+    return jsonify({
+        "success": True,
+        "token": token,
+        "expiresIn": auth.SESSION_TTL_SECONDS,
+        "employee": auth.check_token(token)
+    })
+
+
+# ======================= Session Endpoints =======================
+@api.route('/api/logout', methods=['POST'])
+@login_required
+def logout():
+    """Revokes the caller's session token in every worker process."""
+    try:
+        auth.revoke_token(auth.bearer_token(), g.session)
+        return jsonify({"success": True})
+    except WriteQueueFull:
+        return jsonify({"success": False, "message": "Server is busy, please retry"}), 503, {"Retry-After": "1"}
+    except WriteTimeout:
+        # Still queued: it may yet be applied, so this is not a failure.
+        return jsonify({"success": False, "message": "The write is taking longer than expected; "
+                                                     "check before retrying"}), 503, {"Retry-After": "5"}
+    except Exception as e:
+        print(f"Database error: {e}")
+        return jsonify({"success": False, "message": "An internal server error occurred"}), 500
+
+
+@api.route('/api/session', methods=['GET'])
+@login_required
+def get_session():
+    """Returns the employee behind the caller's session token (no database access)."""
+    return jsonify(g.session)
 
 
 # ======================= Low Stock Products Endpoint =======================
-@app.route('/api/products/lowstock', methods=['GET'])
+@api.route('/api/products/lowstock', methods=['GET'])
+@responses.cached
 def get_low_stock_products():
     """
-    Retrieves a list of all products where the stock quantity is 10 or less.
+    Retrieves a list of all products whose stock quantity is at or below
+    their own reorder level. Supports ?format=columnar (see payload.py) and
+    store=all, which merges every store's list.
     """
-    conn = get_db_connection()
     try:
-        # 1. Query the Product table for items with QuantityInStock <= 10.
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Product WHERE QuantityInStock <= 10 ORDER BY QuantityInStock ASC")
-        rows = cursor.fetchall()
+        fmt = payload.list_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if g.store == ALL_STORES:
+        try:
+            return jsonify(shards.merge_lists(
+                dashboard.LOW_STOCK_SQL,
+                sort_column='QuantityInStock', fmt=fmt
+            ))
+        except Exception as e:
+            print(f"Database error: {e}")
+            return jsonify({"error": "An internal server error occurred"}), 500
 
-        # 2. Convert the list of database rows into a list of dictionaries.
-        #    This is the standard way to prepare data for JSON serialization.
-        low_stock_products = [dict(row) for row in rows]
+    conn = get_db_connection()
+    try:
+        # 1. Query the Product table for items with QuantityInStock <= ReorderLevel.
+        #    This exact condition matches the partial index idx_product_low_stock,
+        #    which only contains low-stock rows (see schema.py).
+        # 2. Build the list of row objects, or columns plus value arrays.
+        low_stock_products = payload.fetch_list(conn, dashboard.LOW_STOCK_SQL, fmt=fmt)
 
         # 3. Return the list as a JSON response with a 200 OK status.
         return jsonify(low_stock_products)
@@ -235,389 +289,468 @@ def get_low_stock_products():
         return jsonify({"error": "An internal server error occurred"}), 500
 
     finally:
-        # Ensure the database connection is always closed.
-        conn.close()
+        # Hand the connection back to the pool.
+        release_db_connection(conn)
 
 
-# --- Main Execution Block ---
-if __name__ == '__main__':
-    app.run(debug=True)
-    
-@app.route('/')
-def index():
-    """A simple route to confirm the server is running."""
-    return "TrackWise API is running!"
-
-# ======================= User Login Endpoint =======================
-@app.route('/api/login', methods=['POST'])
-def login():
+# ======================= Reorder Suggestions Endpoint =======================
+@api.route('/api/products/reorder-suggestions', methods=['GET'])
+@responses.cached
+def get_reorder_suggestions():
     """
-    Handles user login by validating credentials against the Employee table.
-    Expects a JSON payload with 'username' and 'password'.
+    Returns how much to order of each product that needs it, grouped by
+    supplier, from recent sales velocity, days of cover, the supplier's
+    lead time and the reorder level (see reorder.py). ?supplierId= limits
+    it to one supplier. Cached until the next write, i.e. the next sale.
     """
-    # 1. Get the JSON data from the incoming request.
+    if not reorder.available():
+        return jsonify({"error": "Reorder suggestions require NumPy on the server"}), 503
     try:
-        data = request.get_json()
-        username = data.get('username')
-        password = data.get('password')
-
-        # Basic validation to ensure fields are not empty
-        if not username or not password:
-            return jsonify({"success": False, "message": "Username and password are required"}), 400
-
-    except:
-        # Handle cases where the request body is not valid JSON
-        return jsonify({"success": False, "message": "Invalid request format"}), 400
+        supplier_id = int(request.args['supplierId']) if request.args.get('supplierId') else None
+    except ValueError:
+        return jsonify({"error": "supplierId must be an integer"}), 400
 
     conn = get_db_connection()
     try:
-        # 2. Query the Employee table for a matching username and password.
-        #    Using parameterized queries (?) prevents SQL injection vulnerabilities.
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM Employee WHERE Username = ? AND PasswordHash = ?",
-            (username, password)
-        )
-        employee = cursor.fetchone()
-
-        # 3. Check if a user was found
-        if employee:
-            # 4. If successful, return a success response.
-            return jsonify({"success": True})
-        else:
-            # 5. If it fails, return a 401 Unauthorized status and an error message.
-            return jsonify({"success": false, "message": "Invalid credentials"}), 401
+        # 1. Products, rollups and lead times from one snapshot, computed at once.
+        with read_transaction(conn):
+            groups = reorder.suggestions(conn, supplier_id)
+        return jsonify({
+            "suppliers": groups,
+            "productCount": sum(len(group["items"]) for group in groups),
+            "shortWindowDays": reorder.SHORT_WINDOW_DAYS,
+            "longWindowDays": reorder.LONG_WINDOW_DAYS,
+        })
 
     except Exception as e:
-        # Catch any potential database errors
         print(f"Database error: {e}")
-        return jsonify({"success": False, "message": "An internal server error occurred"}), 500
+        return jsonify({"error": "An internal server error occurred"}), 500
 
     finally:
-        # Ensure the database connection is always closed
-        conn.close()
+        release_db_connection(conn)
 
 
-# --- Main Execution Block ---
-if __name__ == '__main__':
-    app.run(debug=True)
-    
-    # ==============================================================================
-# TrackWise Inventory Management System - Flask API
-# ==============================================================================
-
-# --- Imports ---
-from flask import Flask, jsonify, request
-import sqlite3
-
-# --- Application Setup ---
-app = Flask(__name__)
-DATABASE = 'trackwise.db'
-
-
-# --- Database Utility Function ---
-def get_db_connection():
+# ======================= Recent Sales Endpoint =======================
+@api.route('/api/sales/recent', methods=['GET'])
+@responses.cached
+def get_recent_sales():
     """
-    Creates and returns a connection to the SQLite database.
-    The connection is configured to return rows as dictionary-like objects.
+    Retrieves the 5 most recent sales from the Sale table.
+    Supports ?format=columnar (see payload.py) and store=all, which takes
+    the 5 most recent across every store.
     """
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
-# --- API ROUTES WILL GO HERE ---
-
-@app.route('/')
-def index():
-    """A simple route to confirm the server is running."""
-    return "TrackWise API is running!"
-
-# ======================= User Login Endpoint =======================
-"""@app.route('/api/login', methods=['POST'])
-
-def login():
-    
-    Handles user login by validating credentials against the Employee table.
-    Expects a JSON payload with 'username' and 'password'.
-    
     try:
-        data = request.get_json()
-        username = data.get('username')
-        password = data.get('password')
-
-        if not username or not password:
-            return jsonify({"success": False, "message": "Username and password are required"}), 400
-    except:
-        return jsonify({"success": False, "message": "Invalid request format"}), 400
+        fmt = payload.list_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if g.store == ALL_STORES:
+        try:
+            # Each shard's newest 5, k-way merged by date.
+            return jsonify(shards.merge_lists(
+                dashboard.RECENT_SALES_SQL,
+                sort_column='SaleDate', descending=True, limit=dashboard.RECENT_SALES_LIMIT, fmt=fmt
+            ))
+        except Exception as e:
+            print(f"Database error: {e}")
+            return jsonify({"error": "An internal server error occurred"}), 500
 
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM Employee WHERE Username = ? AND PasswordHash = ?",
-            (username, password)
-        )
-        employee = cursor.fetchone()
+        # 1. Query the Sale table, ordering by SaleDate in descending order
+        #    and limiting the result set to 5 records.
+        # 2. Build the list of row objects, or columns plus value arrays.
+        recent_sales = payload.fetch_list(conn, dashboard.RECENT_SALES_SQL, fmt=fmt)
+
+        # 3. Return the list as a JSON response.
+        return jsonify(recent_sales)
 
-        if employee:
-            return jsonify({"success": True})
-        else:
-            return jsonify({"success": false, "message": "Invalid credentials"}), 401
     except Exception as e:
+        # Handle any potential database errors.
         print(f"Database error: {e}")
-        return jsonify({"success": False, "message": "An internal server error occurred"}), 500
+        return jsonify({"error": "An internal server error occurred"}), 500
+
     finally:
-        conn.close()
-"""
+        # Hand the connection back to the pool.
+        release_db_connection(conn)
 
-# ======================= Low Stock Products Endpoint =======================
-@app.route('/api/products/lowstock', methods=['GET'])
-def get_low_stock_products():
+
+# ======================= Sales History Endpoint =======================
+@api.route('/api/sales/history', methods=['GET'])
+def get_sales_history():
     """
-    Retrieves a list of all products where the stock quantity is 10 or less.
+    Lists the sales between ?from= and ?to= (dates, to inclusive; default the
+    last 30 days), oldest first. ?limit (max 1000) and ?after=<nextCursor>
+    page through them. Months that were archived are read from their archive
+    files (see archive.py), so the range can reach back to the first sale.
     """
+    # 1. Validate the range and the page.
+    try:
+        start, end, limit, after = archive.history_request(request.args)
+    except archive.ArchiveError as e:
+        return jsonify({"error": str(e)}), e.status
+
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Product WHERE QuantityInStock <= 10 ORDER BY QuantityInStock ASC")
-        rows = cursor.fetchall()
+        # 2. Read the hot table and the archived months in range, merged by date.
+        return jsonify(archive.sales_between(conn, start, end, limit, after))
+
+    except archive.ArchiveError as e:
+        # An archived month whose file is missing.
+        print(f"Archive error: {e}")
+        return jsonify({"error": str(e)}), e.status
 
-        low_stock_products = [dict(row) for row in rows]
-        return jsonify(low_stock_products)
     except Exception as e:
+        # Handle any potential database errors.
         print(f"Database error: {e}")
         return jsonify({"error": "An internal server error occurred"}), 500
+
     finally:
-        conn.close()
+        # Hand the connection back to the pool.
+        release_db_connection(conn)
 
 
-# ======================= Recent Sales Endpoint =======================
-@app.route('/api/sales/recent', methods=['GET'])
-def get_recent_sales():
+# ======================= Dashboard KPIs Endpoint =======================
+@api.route('/api/kpi/dashboard', methods=['GET'])
+@responses.cached
+def get_dashboard_kpis():
     """
-    Retrieves the 5 most recent sales from the Sale table.
+    Returns key performance indicators for the dashboard.
+    The totals are maintained by triggers (see kpi.py), so this is two key lookups
+    instead of full-table aggregates over Sale and Product. With store=all
+    the stores' totals are summed, with each store's figures under "stores".
     """
+    if g.store == ALL_STORES:
+        try:
+            return jsonify(shards.dashboard_totals())
+        except Exception as e:
+            print(f"Database error: {e}")
+            return jsonify({"error": "An internal server error occurred"}), 500
+
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        # 1. Query the Sale table, ordering by SaleDate in descending order
-        #    and limiting the result set to 5 records.
-        cursor.execute("SELECT * FROM Sale ORDER BY SaleDate DESC LIMIT 5")
-        rows = cursor.fetchall()
+        # 1. Read today's sales bucket and the stock totals from the summary tables.
+        kpis = kpi.read_dashboard(conn)
 
-        # 2. Convert the database rows into a list of dictionaries.
-        recent_sales = [dict(row) for row in rows]
+        # 2. Return them as a single JSON object.
+        return jsonify(kpis)
 
-        # 3. Return the list as a JSON response.
-        return jsonify(recent_sales)
-        
     except Exception as e:
         # Handle any potential database errors.
         print(f"Database error: {e}")
         return jsonify({"error": "An internal server error occurred"}), 500
-        
+
     finally:
-        # Ensure the database connection is always closed.
-        conn.close()
+        # Hand the connection back to the pool.
+        release_db_connection(conn)
 
 
-# --- Main Execution Block ---
-if __name__ == '__main__':
-    app.run(debug=True)
-    
-    # ==============================================================================
-# TrackWise Inventory Management System - Flask API
-# ==============================================================================
+# ======================= Dashboard Bundle Endpoint =======================
+@api.route('/api/dashboard', methods=['GET'])
+@responses.cached
+def get_dashboard():
+    """
+    Returns everything the dashboard shows in one response: the KPIs, the
+    low stock list and the 5 most recent sales, all read in one read
+    transaction so they describe the same moment (see dashboard.py).
+    Supports ?format=columnar for the lists and store=all. Concurrent
+    identical requests share one run (see cache.py).
+    """
+    try:
+        fmt = payload.list_format()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-# --- Imports ---
-from flask import Flask, jsonify, request
-import sqlite3
+    if g.store == ALL_STORES:
+        try:
+            return jsonify(shards.dashboard_bundle(fmt))
+        except Exception as e:
+            print(f"Database error: {e}")
+            return jsonify({"error": "An internal server error occurred"}), 500
 
-# --- Application Setup ---
-app = Flask(__name__)
-DATABASE = 'trackwise.db'
+    conn = get_db_connection()
+    try:
+        # 1. Read the KPIs and both lists from one snapshot.
+        # 2. Return them as a single JSON object.
+        return jsonify(dashboard.read_bundle(conn, fmt))
+
+    except Exception as e:
+        # Handle any potential database errors.
+        print(f"Database error: {e}")
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+    finally:
+        # Hand the connection back to the pool.
+        release_db_connection(conn)
 
 
-# --- Database Utility Function ---
-def get_db_connection():
+# ======================= Dashboard Event Stream Endpoint =======================
+@api.route('/api/events/dashboard', methods=['GET'])
+def stream_dashboard_events():
     """
-    Creates and returns a connection to the SQLite database.
-    The connection is configured to return rows as dictionary-like objects.
+    Server-Sent Events stream of dashboard deltas.
+    Each 'delta' event carries the new sales, the added or changed products
+    and the current KPIs. All subscribers share one change-feed reader, so
+    the database work does not grow with the number of open dashboards.
     """
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
-
+    return Response(
+        events.stream(events.broadcasters.get()),
+        mimetype='text/event-stream',
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop reverse proxies (e.g. nginx) from buffering the stream.
+            "X-Accel-Buffering": "no"
+        }
+    )
 
-# --- API ROUTES WILL GO HERE ---
 
-@app.route('/')
-def index():
-    """A simple route to confirm the server is running."""
-    return "TrackWise API is running!"
+# ======================= Sales Report Endpoint =======================
+# The reports page offers 7, 30, 90 and 365 day windows.
+MAX_REPORT_DAYS = 366
 
-# ======================= User Login Endpoint =======================
-@app.route('/api/login', methods=['POST'])
-def login():
+@api.route('/api/reports/sales', methods=['GET'])
+def get_sales_report():
     """
-    Handles user login by validating credentials against the Employee table.
-    Expects a JSON payload with 'username' and 'password'.
+    Returns the sales-volume series and the top 10 selling products for the
+    last N days (?days=N, default 30). Everything is read from the rollup
+    tables (see rollups.py), never from raw Sale rows.
     """
+    # 1. Validate the requested window.
     try:
-        data = request.get_json()
-        username = data.get('username')
-        password = data.get('password')
-
-        if not username or not password:
-            return jsonify({"success": False, "message": "Username and password are required"}), 400
-    except:
-        return jsonify({"success": False, "message": "Invalid request format"}), 400
+        days = int(request.args.get('days', 30))
+    except ValueError:
+        days = 0
+    if not 1 <= days <= MAX_REPORT_DAYS:
+        return jsonify({"error": f"days must be an integer between 1 and {MAX_REPORT_DAYS}"}), 400
 
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM Employee WHERE Username = ? AND PasswordHash = ?",
-            (username, password)
-        )
-        employee = cursor.fetchone()
+        # 2. Build the report from the rollups and return it. The series and
+        #    the ranking are read from the same snapshot.
+        with read_transaction(conn):
+            return jsonify(rollups.sales_report(conn, days))
 
-        if employee:
-            return jsonify({"success": True})
-        else:
-            return jsonify({"success": false, "message": "Invalid credentials"}), 401
     except Exception as e:
+        # Handle any potential database errors.
         print(f"Database error: {e}")
-        return jsonify({"success": False, "message": "An internal server error occurred"}), 500
+        return jsonify({"error": "An internal server error occurred"}), 500
+
     finally:
-        conn.close()
+        # Hand the connection back to the pool.
+        release_db_connection(conn)
 
 
-# ======================= Low Stock Products Endpoint =======================
-@app.route('/api/products/lowstock', methods=['GET'])
-def get_low_stock_products():
+# ======================= Product Catalog Endpoint =======================
+@api.route('/api/products', methods=['GET'])
+@responses.cached
+def list_products():
     """
-    Retrieves a list of all products where the stock quantity is 10 or less.
+    Lists products a page at a time (see catalog.py for the parameters):
+    ?q= prefix search over name, description and barcode; ?sort=id|name|
+    quantity|price and ?order=asc|desc; filters ?supplierId, ?lowStock,
+    ?minQuantity, ?maxQuantity; ?limit and the ?after cursor from the
+    previous page's nextCursor. Supports ?format=columnar.
     """
+    # 1. Validate the query string.
+    try:
+        fmt = payload.list_format()
+        options = catalog.parse_options(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Product WHERE QuantityInStock <= 10 ORDER BY QuantityInStock ASC")
-        rows = cursor.fetchall()
+        # 2. Fetch one page (an index seek past the cursor, never an OFFSET).
+        return jsonify(catalog.list_products(conn, options, fmt))
 
-        low_stock_products = [dict(row) for row in rows]
-        return jsonify(low_stock_products)
     except Exception as e:
+        # Handle any potential database errors.
         print(f"Database error: {e}")
         return jsonify({"error": "An internal server error occurred"}), 500
+
     finally:
-        conn.close()
+        # Hand the connection back to the pool.
+        release_db_connection(conn)
 
 
-# ======================= Recent Sales Endpoint =======================
-@app.route('/api/sales/recent', methods=['GET'])
-def get_recent_sales():
+# ======================= Barcode Lookup Endpoints =======================
+@api.route('/api/barcodes/<barcode>', methods=['GET'])
+def lookup_barcode(barcode):
     """
-    Retrieves the 5 most recent sales from the Sale table.
+    Resolves one scanned barcode to its product (ID, name, price, stock)
+    from the in-memory index (see barcodes.py).
     """
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM Sale ORDER BY SaleDate DESC LIMIT 5")
-        rows = cursor.fetchall()
-
-        recent_sales = [dict(row) for row in rows]
-        return jsonify(recent_sales)
+        product = barcode_indexes.get().lookup(barcode)
     except Exception as e:
         print(f"Database error: {e}")
         return jsonify({"error": "An internal server error occurred"}), 500
-    finally:
-        conn.close()
 
+    if product is None:
+        return jsonify({"error": "Unknown barcode"}), 404
+    return jsonify(product)
 
-# ======================= Dashboard KPIs Endpoint =======================
-@app.route('/api/kpi/dashboard', methods=['GET'])
-def get_dashboard_kpis():
+
+@api.route('/api/barcodes/lookup', methods=['POST'])
+def lookup_barcodes():
     """
-    Calculates and returns key performance indicators for the dashboard.
+    Resolves a whole basket in one request.
+    Expects {"barcodes": [...]}; returns {"found": {barcode: product}, "missing": [...]}.
     """
-    conn = get_db_connection()
+    # 1. Validate the basket.
+    data = request.get_json(silent=True)
+    codes = data.get('barcodes') if isinstance(data, dict) else None
+    if not isinstance(codes, list) or not all(isinstance(code, str) for code in codes):
+        return jsonify({"error": "barcodes must be a list of strings"}), 400
+    if len(codes) > barcodes.MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {barcodes.MAX_BATCH_SIZE} barcodes per request"}), 400
+
+    # 2. Resolve them with one index sync.
     try:
-        cursor = conn.cursor()
+        found, missing = barcode_indexes.get().lookup_many(codes)
+    except Exception as e:
+        print(f"Database error: {e}")
+        return jsonify({"error": "An internal server error occurred"}), 500
+    return jsonify({"found": found, "missing": missing})
 
-        # 1. Calculate total sales for the current day.
-        #    date('now') is an SQLite function to get the current date.
-        cursor.execute("SELECT SUM(TotalAmount) FROM Sale WHERE date(SaleDate) = date('now')")
-        total_sales_today = cursor.fetchone()[0] or 0.0
 
-        # 2. Calculate the total number of items currently in stock.
-        cursor.execute("SELECT SUM(QuantityInStock) FROM Product")
-        total_items_in_stock = cursor.fetchone()[0] or 0
+# ======================= Stock Ledger Endpoints =======================
+@api.route('/api/stock', methods=['GET'])
+def stock_at():
+    """
+    Returns every product's stock at ?at= (a date means its closing stock;
+    default now), as columns plus rows: the nearest snapshot with the tail of the ledger
+    replayed on top (see stock.py).
+    """
+    # Without ?at= the response is stamped with the current time, which a
+    # copy cached at an unchanged data version would repeat; only explicit
+    # moments are cached.
+    if not request.args.get('at', '').strip():
+        return _stock_at()
+    return _cached_stock_at()
 
-        # 3. Calculate the total value of the inventory (based on purchase price).
-        cursor.execute("SELECT SUM(PurchasePrice * QuantityInStock) FROM Product")
-        total_inventory_value = cursor.fetchone()[0] or 0.0
 
-        # 4. Assemble the results into a single JSON object.
-        kpis = {
-            "totalSalesToday": round(total_sales_today, 2),
-            "totalItemsInStock": total_items_in_stock,
-            "totalInventoryValue": round(total_inventory_value, 2)
-        }
-        return jsonify(kpis)
+def _stock_at():
+    """Builds the /api/stock response for the request's ?at=."""
+    try:
+        moment = stock.parse_moment(request.args.get('at'))
+    except stock.StockError as e:
+        return jsonify({"error": str(e)}), e.status
 
+    conn = get_db_connection()
+    try:
+        with read_transaction(conn):
+            return jsonify(stock.stock_at(conn, moment))
+    except stock.StockError as e:
+        # No snapshot that early.
+        return jsonify({"error": str(e)}), e.status
     except Exception as e:
-        # Handle any potential database errors.
         print(f"Database error: {e}")
         return jsonify({"error": "An internal server error occurred"}), 500
-
     finally:
-        # Ensure the database connection is always closed.
-        conn.close()
+        release_db_connection(conn)
 
 
-# --- Main Execution Block ---
-if __name__ == '__main__':
-    app.run(debug=True)
-    
-    # ==============================================================================
-# TrackWise Inventory Management System - Flask API
-# ==============================================================================
+_cached_stock_at = responses.cached(_stock_at)
 
-# --- Imports ---
-from flask import Flask, jsonify, request
-import sqlite3
 
-# --- Application Setup ---
-app = Flask(__name__)
-DATABASE = 'trackwise.db'
+@api.route('/api/products/<int:product_id>/stock', methods=['GET'])
+def product_stock_at(product_id):
+    """Returns one product's stock at ?at= (default now) from its snapshot row and ledger tail."""
+    try:
+        moment = stock.parse_moment(request.args.get('at'))
+    except stock.StockError as e:
+        return jsonify({"error": str(e)}), e.status
 
+    conn = get_db_connection()
+    try:
+        with read_transaction(conn):
+            return jsonify(stock.product_stock_at(conn, product_id, moment))
+    except stock.StockError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        print(f"Database error: {e}")
+        return jsonify({"error": "An internal server error occurred"}), 500
+    finally:
+        release_db_connection(conn)
 
-# --- Database Utility Function ---
-def get_db_connection():
+
+@api.route('/api/products/<int:product_id>/movements', methods=['GET'])
+def product_movements(product_id):
     """
-    Creates and returns a connection to the SQLite database.
-    The connection is configured to return rows as dictionary-like objects.
+    Lists a product's stock movements, newest first. ?limit (max 500) and
+    ?before=<MovementID> page through the ledger.
     """
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        before = int(request.args['before']) if request.args.get('before') else None
+    except ValueError:
+        return jsonify({"error": "limit and before must be integers"}), 400
+
+    conn = get_db_connection()
+    try:
+        return jsonify({"productId": product_id, "movements": stock.movements(conn, product_id, limit, before)})
+    except Exception as e:
+        print(f"Database error: {e}")
+        return jsonify({"error": "An internal server error occurred"}), 500
+    finally:
+        release_db_connection(conn)
 
 
-# --- API ROUTES ---
+@api.route('/api/products/<int:product_id>/stock', methods=['POST'])
+@login_required
+def adjust_stock(product_id):
+    """
+    Records a goods receipt or a stock adjustment.
+    Expects {"quantity": n, "reason": "receipt"|"adjustment"}; receipts add
+    stock, adjustments (counts, shrinkage) may be negative.
+    """
+    # 1. Validate the movement.
+    try:
+        delta, reason = stock.movement_request(request.get_json(silent=True))
+    except stock.StockError as e:
+        return jsonify({"success": False, "message": str(e)}), e.status
 
-@app.route('/')
-def index():
-    """A simple route to confirm the server is running."""
-    return "TrackWise API is running!"
+    try:
+        # 2. Apply it on the group-commit writer; the ledger trigger records it.
+        quantity = write_queues.get().execute(lambda conn: stock.adjust_stock(conn, product_id, delta, reason))
+        return jsonify({"success": True, "productId": product_id, "quantityInStock": quantity}), 201
+
+    except WriteQueueFull:
+        return jsonify({"success": False, "message": "Server is busy, please retry"}), 503, {"Retry-After": "1"}
+    except WriteTimeout:
+        # Still queued: it may yet be applied, so this is not a failure.
+        return jsonify({"success": False, "message": "The write is taking longer than expected; "
+                                                     "check before retrying"}), 503, {"Retry-After": "5"}
+    except stock.StockError as e:
+        # Unknown product or stock would go below zero.
+        return jsonify({"success": False, "message": str(e)}), e.status
+    except Exception as e:
+        print(f"Database error: {e}")
+        return jsonify({"success": False, "message": "An internal server error occurred"}), 500
 
-# ... [Previous endpoints: /api/login, /api/products/lowstock, /api/sales/recent, /api/kpi/dashboard] ...
-# (Keeping them collapsed for brevity, they are still part of the file)
+
+@api.route('/api/stock/snapshots', methods=['POST'])
+@login_required
+def take_stock_snapshot():
+    """Takes a stock snapshot now, outside the periodic schedule."""
+    try:
+        snapshot_id = write_queues.get().execute(stock.take_snapshot)
+        return jsonify({"success": True, "snapshotId": snapshot_id}), 201
+    except WriteQueueFull:
+        return jsonify({"success": False, "message": "Server is busy, please retry"}), 503, {"Retry-After": "1"}
+    except WriteTimeout:
+        # Still queued: it may yet be applied, so this is not a failure.
+        return jsonify({"success": False, "message": "The write is taking longer than expected; "
+                                                     "check before retrying"}), 503, {"Retry-After": "5"}
+    except Exception as e:
+        print(f"Database error: {e}")
+        return jsonify({"success": False, "message": "An internal server error occurred"}), 500
 
 
 # ======================= Add New Product Endpoint =======================
-@app.route('/api/products', methods=['POST'])
+@api.route('/api/products', methods=['POST'])
+@login_required
 def add_product():
     """
     Adds a new product to the Product table.
@@ -629,38 +762,21 @@ def add_product():
     except:
         return jsonify({"success": False, "message": "Invalid request format"}), 400
 
-    # 2. Extract product details from the JSON data.
-    #    The form in the UI had more fields, but we only use what's in the DB schema.
-    product_name = data.get('productName')
-    description = data.get('description')
-    quantity = data.get('initialQuantity')
-    sale_price = data.get('salePrice')
-    purchase_price = data.get('purchasePrice')
-    supplier_id = data.get('supplierId') # Ensure the front-end sends this ID
-
-    # 3. Validate that all required fields are present.
-    required_fields = [product_name, quantity, sale_price, purchase_price]
-    if not all(field is not None for field in required_fields):
-        return jsonify({"success": False, "message": "Missing required product fields"}), 400
+    # 2. Extract and validate the product details from the JSON data.
+    #    The field mapping and required-field rules are shared with the bulk
+    #    import endpoint (see products.py). reorderLevel is optional.
+    try:
+        values = products.product_row(data)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
 
-    conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        # 4. Create the SQL INSERT statement with placeholders.
-        sql = """
-            INSERT INTO Product (ProductName, Description, QuantityInStock, SalePrice, PurchasePrice, SupplierID)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """
-        # 5. Execute the statement with the product data.
-        cursor.execute(sql, (product_name, description, quantity, sale_price, purchase_price, supplier_id))
-        
-        # 6. Commit the changes to the database.
-        conn.commit()
-        
-        # 7. Get the ID of the newly created product.
-        new_product_id = cursor.lastrowid
-
-        # 8. Return a success response with the new product's ID.
+        # 3. Queue the INSERT on the group-commit writer and wait for the ID of
+        #    the newly created product. The writer commits it in one
+        #    transaction with any other writes pending at the same time.
+        new_product_id = write_queues.get().execute(lambda conn: products.insert_product(conn, values))
+
+        # 4. Return a success response with the new product's ID.
         #    HTTP status 201 Created is appropriate for successful resource creation.
         return jsonify({
             "success": True,
@@ -668,6 +784,13 @@ def add_product():
             "productId": new_product_id
         }), 201
 
+    except WriteQueueFull:
+        # Backpressure: too many writes are already waiting.
+        return jsonify({"success": False, "message": "Server is busy, please retry"}), 503, {"Retry-After": "1"}
+    except WriteTimeout:
+        # Still queued: it may yet be applied, so this is not a failure.
+        return jsonify({"success": False, "message": "The write is taking longer than expected; "
+                                                     "check before retrying"}), 503, {"Retry-After": "5"}
     except sqlite3.IntegrityError as e:
         # This could happen if a foreign key (like SupplierID) is invalid.
         return jsonify({"success": False, "message": f"Database integrity error: {e}"}), 400
@@ -675,14 +798,286 @@ def add_product():
         # Handle other potential database errors.
         print(f"Database error: {e}")
         return jsonify({"success": False, "message": "An internal server error occurred"}), 500
+
+
+# ======================= Record Sale Endpoint =======================
+@api.route('/api/sales', methods=['POST'])
+@login_required
+def record_sale():
+    """
+    Records a sale and takes the sold quantity out of stock.
+    Expects a JSON payload with 'productId', 'quantity' and optionally 'employeeId'.
+    """
+    # 1. Get and validate the JSON data from the request body.
+    try:
+        product_id, quantity, employee_id = sales.sale_request(request.get_json(silent=True))
+    except sales.SaleError as e:
+        return jsonify({"success": False, "message": str(e)}), e.status
+
+    try:
+        # 2. Queue the sale on the group-commit writer and wait for its ID.
+        sale_id = write_queues.get().execute(
+            lambda conn: sales.record_sale(conn, product_id, quantity, employee_id)
+        )
+        return jsonify({
+            "success": True,
+            "message": "Sale recorded successfully",
+            "saleId": sale_id
+        }), 201
+
+    except WriteQueueFull:
+        # Backpressure: too many writes are already waiting.
+        return jsonify({"success": False, "message": "Server is busy, please retry"}), 503, {"Retry-After": "1"}
+    except WriteTimeout:
+        # Still queued: it may yet be applied, so this is not a failure.
+        return jsonify({"success": False, "message": "The write is taking longer than expected; "
+                                                     "check before retrying"}), 503, {"Retry-After": "5"}
+    except sales.SaleError as e:
+        # Unknown product or not enough stock.
+        return jsonify({"success": False, "message": str(e)}), e.status
+    except sqlite3.IntegrityError as e:
+        return jsonify({"success": False, "message": f"Database integrity error: {e}"}), 400
+    except Exception as e:
+        print(f"Database error: {e}")
+        return jsonify({"success": False, "message": "An internal server error occurred"}), 500
+
+
+# ======================= Bulk Product Import Endpoint =======================
+# Supported body formats, selected by the Content-Type header.
+IMPORT_PARSERS = {
+    'text/csv': products.iter_csv,
+    'application/x-ndjson': products.iter_ndjson,
+    'application/jsonl': products.iter_ndjson,
+}
+
+@api.route('/api/products/import', methods=['POST'])
+@login_required
+def import_products():
+    """
+    Bulk-imports products from a streamed CSV or NDJSON body.
+    Each row uses the same fields and validation as POST /api/products.
+    Valid rows are inserted in short batched transactions (see products.py);
+    invalid rows are skipped and listed (by line number) in the response.
+    """
+    # 1. Pick the parser from the Content-Type header.
+    parser = IMPORT_PARSERS.get(request.mimetype)
+    if parser is None:
+        supported = ', '.join(IMPORT_PARSERS)
+        return jsonify({"success": False, "message": f"Unsupported Content-Type; use one of: {supported}"}), 415
+
+    conn = get_db_connection()
+    try:
+        # 2. Parse and insert the body as it streams in.
+        report = products.import_products(conn, parser(request.stream))
+
+        # 3. Return the per-row report.
+        #    201 when anything was created, 400 when every row was rejected.
+        status = 201 if report.inserted else 400
+        return jsonify(report.to_dict()), status
+
+    except Exception as e:
+        # Rows from transactions committed before the error are kept.
+        print(f"Database error: {e}")
+        return jsonify({"success": False, "message": "An internal server error occurred"}), 500
+
     finally:
-        # Ensure the database connection is always closed.
-        conn.close()
+        # Hand the connection back to the pool.
+        release_db_connection(conn)
+
+
+# ======================= Streaming Export Endpoint =======================
+@api.route('/api/export/<dataset>', methods=['GET'])
+def export_dataset(dataset):
+    """
+    Streams a whole table (products or sales) as NDJSON (default) or CSV.
+    The sales export includes the archived months, in SaleID order.
+    Query parameters:
+      format - 'ndjson' or 'csv'
+      after  - only export rows whose ID is greater than this (for incremental pulls)
+    Memory use stays constant however large the table is (see export.py).
+    """
+    # 1. Validate the dataset, format and resume cursor.
+    if dataset not in export.DATASETS:
+        return jsonify({"error": f"Unknown dataset; use one of: {', '.join(export.DATASETS)}"}), 404
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in export.FORMATS:
+        return jsonify({"error": f"Unknown format; use one of: {', '.join(export.FORMATS)}"}), 400
+    try:
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        return jsonify({"error": "after must be an integer ID"}), 400
+
+    # 2. Stream the pages. The connection is held by the generator and handed
+    #    back to the pool when the body is finished (or the client goes away).
+    #    The body is generated after the view returns, so the store is
+    #    captured here.
+    store = g.store
+
+    def generate():
+        conn = get_db_connection(store, readonly=True)
+        try:
+            yield from export.stream_export(conn, dataset, fmt, after)
+        finally:
+            release_db_connection(conn)
+
+    filename = f"{dataset}.{fmt}"
+    return Response(
+        generate(),
+        mimetype=export.FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+# ======================= Database Backup Endpoints =======================
+@api.route('/api/backup/start', methods=['POST'])
+@login_required
+def start_backup():
+    """
+    Starts an online backup in the background and returns immediately.
+    Poll /api/backup/progress until the state is 'done' or 'failed'.
+    """
+    status = backups.get().start()
+    if status is None:
+        # Only one backup runs at a time.
+        return jsonify({"success": False, "message": "A backup is already running",
+                        "progress": backups.get().status()}), 409
+    return jsonify({"success": True, "progress": status}), 202
+
+
+@api.route('/api/backup/progress', methods=['GET'])
+def get_backup_progress():
+    """Returns the progress of the running (or most recent) backup."""
+    return jsonify(backups.get().status())
+
+
+@api.route('/api/backup/status', methods=['GET'])
+def get_backup_status():
+    """Returns the latest backup's status and the list of retained snapshots."""
+    return jsonify({
+        "lastBackup": backups.get().status(),
+        "snapshots": backups.get().snapshots()
+    })
+
+
+# ======================= Connection Pool Statistics Endpoint =======================
+@api.route('/api/db/pool', methods=['GET'])
+def get_pool_stats():
+    """
+    Returns the connection pool statistics (created, reused, idle, in use)
+    of the request's store, for the read-write and the read-only pool.
+    """
+    return jsonify({
+        "readWrite": pool_for(readonly=False).stats(),
+        "readOnly": pool_for(readonly=True).stats()
+    })
+
+
+# ======================= Write Queue Statistics Endpoint =======================
+@api.route('/api/db/writer', methods=['GET'])
+def get_writer_stats():
+    """
+    Returns the group-commit writer statistics (pending, batches, average
+    batch size) of the request's store.
+    """
+    return jsonify(write_queues.get().stats())
+
+
+@api.route('/api/db/cache', methods=['GET'])
+def get_cache_stats():
+    """
+    Returns the response cache statistics (hits, misses, coalesced misses, 304s, entries).
+    """
+    return jsonify(responses.stats())
+
+
+# ======================= Metrics Endpoint =======================
+def _summed_stats(stats_list):
+    """Adds up the numeric fields of several stats() snapshots."""
+    totals = {}
+    for stats in stats_list:
+        for name, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Returns request, SQL and component metrics in the Prometheus text format.
+    Per-store components (pools, writers, indexes, feeds) are summed over
+    every store.
+    """
+    pool_stats = _summed_stats(manager.stats() for manager in (*pools.values(), *read_pools.values()))
+    writer_stats = _summed_stats(writer.stats() for _, writer in write_queues.items())
+    cache_stats = responses.stats()
+    session_stats = auth.sessions.stats()
+    feed_stats = _summed_stats(feed.stats() for _, feed in events.broadcasters.items())
+    barcode_stats = _summed_stats(index.stats() for _, index in barcode_indexes.items())
+    gauges = [
+        ("trackwise_db_pool_idle_connections", "gauge", "Idle pooled connections.", pool_stats["idle"]),
+        ("trackwise_db_pool_in_use_connections", "gauge", "Checked-out connections.", pool_stats["inUse"]),
+        ("trackwise_db_pool_created_total", "counter", "Connections opened.", pool_stats["created"]),
+        ("trackwise_db_pool_reused_total", "counter", "Checkouts served by an idle connection.", pool_stats["reused"]),
+        ("trackwise_writer_pending", "gauge", "Writes waiting for the writer thread.", writer_stats["pending"]),
+        ("trackwise_writer_committed_total", "counter", "Writes committed.", writer_stats["committed"]),
+        ("trackwise_writer_failed_total", "counter", "Writes that failed.", writer_stats["failed"]),
+        ("trackwise_writer_rejected_total", "counter", "Writes rejected by backpressure.", writer_stats["rejected"]),
+        ("trackwise_writer_batches_total", "counter", "Group-commit transactions.", writer_stats["batches"]),
+        ("trackwise_response_cache_hits_total", "counter", "Responses served from the cache.", cache_stats["hits"]),
+        ("trackwise_response_cache_misses_total", "counter", "Responses built by the view.", cache_stats["misses"]),
+        ("trackwise_response_cache_coalesced_total", "counter", "Requests that shared another request's run.", cache_stats["coalesced"]),
+        ("trackwise_response_cache_not_modified_total", "counter", "304 responses.", cache_stats["notModified"]),
+        ("trackwise_response_cache_entries", "gauge", "Cached responses.", cache_stats["size"]),
+        ("trackwise_session_cache_entries", "gauge", "Cached session tokens.", session_stats["size"]),
+        ("trackwise_session_cache_hits_total", "counter", "Tokens verified from the cache.", session_stats["hits"]),
+        ("trackwise_barcode_index_entries", "gauge", "Barcodes in the in-memory index.", barcode_stats["size"]),
+        ("trackwise_barcode_index_hits_total", "counter", "Scans resolved from the index.", barcode_stats["hits"]),
+        ("trackwise_barcode_index_fallback_hits_total", "counter", "Scans resolved by the database fallback.",
+         barcode_stats["fallbackHits"]),
+        ("trackwise_barcode_index_misses_total", "counter", "Scans of unknown barcodes.", barcode_stats["misses"]),
+        ("trackwise_events_subscribers", "gauge", "Open dashboard event streams.", feed_stats["subscribers"]),
+        ("trackwise_events_dropped_total", "counter", "Event streams dropped for lagging.", feed_stats["dropped"]),
+    ]
+    return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+
+# ======================= Slow Query Endpoints =======================
+@api.route('/api/debug/slow-queries', methods=['GET'])
+@login_required
+def get_slow_queries():
+    """
+    Returns the slow-query digest: statements slower than the threshold,
+    collapsed by normalized SQL, with counts, timings and query plans.
+    """
+    return jsonify(slow_queries.digest())
+
+
+@api.route('/api/debug/slow-queries', methods=['DELETE'])
+@login_required
+def clear_slow_queries():
+    """Empties the slow-query digest (e.g. after adding an index)."""
+    slow_queries.clear()
+    return jsonify({"success": True})
+
+
+# --- Application Factory ---
+def create_app():
+    """
+    Builds the Flask application: migrates every store, warms the in-memory
+    indexes and registers the API routes. Call it once per process (the
+    prefork server calls it once, before forking its workers).
+    """
+    app = Flask(__name__)
+    bootstrap_database()
+    app.register_blueprint(api)
+    return app
 
 
 # --- Main Execution Block ---
+# The standard Python entry point.
+# This block runs the Flask development server when the script is executed directly.
+# debug=True enables auto-reloading on code changes and provides helpful error pages.
+# For production, run the prefork server instead: python server.py
 if __name__ == '__main__':
-    app.run(debug=True)
-    
-    
-    
\ No newline at end of file
+    create_app().run(debug=True)
@@ -0,0 +1,467 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Sale Archives (Hot/Cold Tiering)
+# ==============================================================================
+#
+# The Sale table only ever grows, and with it the hot database, its indexes
+# and every backup, while the API mostly reads recent sales. Closed months
+# are therefore moved out of the hot database, one archive file per month:
+#
+#   ARCHIVE_DIR/sales-YYYY-MM.db   (a subdirectory per store when there are several)
+#
+#   - A month is closed once it is older than the last HOT_MONTHS months (the
+#     current month counts as one). Archiving a month first copies its rows
+#     into the archive and commits there, then deletes from the hot table
+#     only the rows the archive now holds. A crash between the two steps
+#     leaves the rows in both places, never in neither, and running the
+#     archiver again finishes the job. SaleArchive lists the archived months.
+#   - The dashboard totals and the rollups (kpi.py, rollups.py) keep counting
+#     archived sales: their Sale delete triggers skip rows while the
+#     one-row ArchiveInProgress flag is set, which the archiver does only
+#     inside its own delete transaction, and their rebuilds read the
+#     archives too.
+#   - Recent sales, the dashboard and the reports only read hot tables.
+#     Queries over a date range (sales_between(), behind /api/sales/history)
+#     ATTACH the archives of the months they cover and merge them with the
+#     hot rows, reading both in one transaction. An archive stays attached to
+#     the pooled connection for the next query, up to MAX_ATTACHED_ARCHIVES
+#     per connection; beyond that the least recently used one is detached,
+#     and a page never spans more archives than that.
+#   - The sales export (iter_sales(), behind /api/export/sales) reads the hot
+#     table and every archive, merged by SaleID.
+#
+# Archives do not change once their month is archived, so they only need
+# backing up once; backup.py copies the hot database only. The pages freed
+# in the hot database are reused by new sales (VACUUM shrinks the file).
+#
+# Usage (from the backend directory):
+#   python archive.py run    - archive every closed month
+#   python archive.py list   - list the archived months
+
+import heapq
+import itertools
+import os
+import re
+import sqlite3
+import sys
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from urllib.request import pathname2url
+
+from catalog import decode_cursor, encode_cursor
+from db import BASE_DIR, STORES, read_transaction
+
+# --- Configuration ---
+ARCHIVE_DIR = os.path.join(BASE_DIR, os.environ.get('TRACKWISE_ARCHIVE_DIR', 'archives'))
+HOT_MONTHS = int(os.environ.get('TRACKWISE_HOT_MONTHS', '3'))
+MAX_ATTACHED_ARCHIVES = 6       # per connection; SQLite allows at most 10
+DEFAULT_HISTORY_DAYS = 30
+MAX_HISTORY_LIMIT = 1000
+
+SALE_COLUMNS = ('SaleID', 'ProductID', 'EmployeeID', 'Quantity', 'TotalAmount', 'SaleDate')
+_COLUMN_LIST = ', '.join(SALE_COLUMNS)
+_MONTH = re.compile(r'^\d{4}-\d{2}$')
+
+# --- Schema ---
+# In the hot database: one row per archived month.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS SaleArchive (
+    SaleMonth TEXT PRIMARY KEY,
+    FileName TEXT NOT NULL,
+    SaleCount INTEGER NOT NULL,
+    ArchivedAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+# In the hot database: set only inside the archiver's delete transaction, so
+# no other connection ever sees it. The Sale delete triggers check it.
+FLAG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ArchiveInProgress (
+    Id INTEGER PRIMARY KEY CHECK (Id = 1)
+);
+"""
+
+# In each archive file: the Sale columns, without the hot table's triggers.
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {schema}.Sale (
+    SaleID INTEGER PRIMARY KEY,
+    ProductID INTEGER,
+    EmployeeID INTEGER,
+    Quantity INTEGER NOT NULL DEFAULT 1,
+    TotalAmount REAL NOT NULL,
+    SaleDate TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS {schema}.idx_sale_date ON Sale (SaleDate);
+"""
+
+# One page of a date range from one table: the hot Sale or an archive's.
+HISTORY_SQL = (
+    f"SELECT {_COLUMN_LIST} FROM {{table}} "
+    "WHERE SaleDate >= ? AND SaleDate < ? AND (SaleDate, SaleID) > (?, ?) "
+    "ORDER BY SaleDate, SaleID LIMIT ?"
+)
+
+# One page of sales by SaleID, from the hot Sale or an archive's (the export).
+EXPORT_SQL = f"SELECT {_COLUMN_LIST} FROM {{table}} WHERE SaleID > ? ORDER BY SaleID LIMIT ?"
+
+ARCHIVED_MONTHS_SQL = (
+    "SELECT SaleMonth, FileName FROM SaleArchive "
+    "WHERE SaleMonth >= substr(?, 1, 7) AND SaleMonth || '-01' < ? ORDER BY SaleMonth"
+)
+
+
+class ArchiveError(ValueError):
+    """A bad history request (status 400) or a missing archive file (500)."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def install(conn):
+    """Creates the archived month registry if it is missing."""
+    conn.executescript(SCHEMA)
+
+
+def install_flag(conn):
+    """Creates the flag the Sale delete triggers check while rows are archived."""
+    conn.executescript(FLAG_SCHEMA)
+
+
+def archive_dir(store):
+    return os.path.join(ARCHIVE_DIR, store) if len(STORES) > 1 else ARCHIVE_DIR
+
+
+def _file_name(month):
+    return f"sales-{month}.db"
+
+
+def _month_range(month):
+    """'2024-12' -> ('2024-12-01', '2025-01-01'), the month's SaleDate bounds."""
+    year, number = int(month[:4]), int(month[5:])
+    year, number = (year + 1, 1) if number == 12 else (year, number + 1)
+    return f"{month}-01", f"{year:04d}-{number:02d}-01"
+
+
+# --- Archiving ---
+
+def closed_months(conn, hot_months=HOT_MONTHS):
+    """Lists the months, oldest first, that still have hot Sale rows but are closed."""
+    first = conn.execute("SELECT substr(MIN(SaleDate), 1, 7) FROM Sale").fetchone()[0]
+    first_hot = conn.execute(
+        "SELECT strftime('%Y-%m', 'now', 'start of month', ?)", (f"-{max(hot_months, 1) - 1} months",)
+    ).fetchone()[0]
+    months = []
+    month = first
+    while month is not None and _MONTH.match(month) and month < first_hot:
+        start, end = _month_range(month)
+        if conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM Sale WHERE SaleDate >= ? AND SaleDate < ?)", (start, end)
+        ).fetchone()[0]:
+            months.append(month)
+        month = end[:7]
+    return months
+
+
+def archive_month(conn, month):
+    """
+    Moves one month's Sale rows from the hot table into its archive file.
+    Returns the number of rows moved. conn must be a read-write connection
+    with no transaction open (ATTACH cannot run inside one).
+    """
+    start, end = _month_range(month)
+    directory = archive_dir(conn.store)
+    os.makedirs(directory, exist_ok=True)
+    conn.execute("ATTACH DATABASE ? AS archive_target", (os.path.join(directory, _file_name(month)),))
+    try:
+        conn.executescript(ARCHIVE_SCHEMA.format(schema='archive_target'))
+
+        # 1. Copy the month and commit it in the archive. Only the archive is
+        #    written, so this does not hold up writers of the hot database.
+        conn.execute("BEGIN")
+        try:
+            conn.execute(
+                f"INSERT OR REPLACE INTO archive_target.Sale ({_COLUMN_LIST}) "
+                f"SELECT {_COLUMN_LIST} FROM main.Sale WHERE SaleDate >= ? AND SaleDate < ?",
+                (start, end)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        # 2. Delete the rows the archive holds, unchanged, from the hot table.
+        #    The flag makes the delete triggers skip them, so the totals and
+        #    rollups still count them; it is cleared before the commit.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO main.ArchiveInProgress (Id) VALUES (1)")
+            moved = conn.execute("""
+                DELETE FROM main.Sale
+                WHERE SaleDate >= ? AND SaleDate < ? AND EXISTS (
+                    SELECT 1 FROM archive_target.Sale AS a
+                    WHERE a.SaleID = Sale.SaleID AND a.ProductID IS Sale.ProductID
+                      AND a.EmployeeID IS Sale.EmployeeID AND a.Quantity IS Sale.Quantity
+                      AND a.TotalAmount IS Sale.TotalAmount AND a.SaleDate IS Sale.SaleDate
+                )
+            """, (start, end)).rowcount
+            conn.execute("DELETE FROM main.ArchiveInProgress")
+            conn.execute(
+                "INSERT INTO main.SaleArchive (SaleMonth, FileName, SaleCount) "
+                "SELECT ?, ?, COUNT(*) FROM archive_target.Sale WHERE true "
+                "ON CONFLICT (SaleMonth) DO UPDATE "
+                "SET SaleCount = excluded.SaleCount, ArchivedAt = CURRENT_TIMESTAMP",
+                (month, _file_name(month))
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return moved
+    finally:
+        conn.execute("DETACH DATABASE archive_target")
+
+
+def run(conn, hot_months=HOT_MONTHS):
+    """Archives every closed month. Returns [(month, rows moved), ...]."""
+    return [(month, archive_month(conn, month)) for month in closed_months(conn, hot_months)]
+
+
+# --- Reading Archives ---
+
+def archived_months(conn, start=None, end=None):
+    """
+    Returns [(month, file name), ...], oldest first, of the archived months
+    overlapping [start, end). Empty before the registry is installed.
+    """
+    if conn.execute(
+        "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'SaleArchive'"
+    ).fetchone() is None:
+        return []
+    return [tuple(row) for row in conn.execute(ARCHIVED_MONTHS_SQL, (start or '', end or '9999'))]
+
+
+def _archive_path(store, file_name):
+    path = os.path.join(archive_dir(store), file_name)
+    if not os.path.exists(path):
+        raise ArchiveError(f"Archive {file_name} is missing", 500)
+    return path
+
+
+def query_archives(conn, sql, params=()):
+    """
+    Runs sql against every archive of conn's store and yields the rows.
+    Each archive is opened on its own read-only connection rather than
+    attached, so a rebuild can read any number of them, inside a transaction.
+    """
+    for _, file_name in archived_months(conn):
+        path = _archive_path(conn.store, file_name)
+        source = sqlite3.connect(f"file:{pathname2url(path)}?mode=ro", uri=True)
+        try:
+            yield from source.execute(sql, params)
+        finally:
+            source.close()
+
+
+def _iter_by_id(source, sql, after, page_size):
+    """Yields the rows of a keyset query (SaleID first) a page at a time."""
+    cursor = source.cursor()
+    cursor.row_factory = None
+    while True:
+        rows = cursor.execute(sql, (after, page_size)).fetchall()
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after = rows[-1][0]
+
+
+def iter_sales(conn, after, page_size):
+    """
+    Yields every sale with SaleID > after, hot and archived, in SaleID order,
+    as tuples of SALE_COLUMNS. Must run inside a read transaction on conn,
+    which fixes the hot rows and the archived months. Like query_archives(),
+    each archive is opened on its own read-only connection, so all of them
+    can be read at once. Archives only ever gain rows, and a sale found in
+    both places (its month is being archived) is yielded once.
+    """
+    sources, archives = [_iter_by_id(conn, EXPORT_SQL.format(table='main.Sale'), after, page_size)], []
+    try:
+        for _, file_name in archived_months(conn):
+            path = _archive_path(conn.store, file_name)
+            archives.append(sqlite3.connect(f"file:{pathname2url(path)}?mode=ro", uri=True))
+            sources.append(_iter_by_id(archives[-1], EXPORT_SQL.format(table='Sale'), after, page_size))
+        last_id = None
+        for row in heapq.merge(*sources, key=lambda row: row[0]):
+            if row[0] != last_id:
+                yield row
+                last_id = row[0]
+    finally:
+        for source in archives:
+            source.close()
+
+
+def attached_schema(conn, month):
+    """Returns the schema name of a month's archive if it is attached to conn, else None."""
+    attached = getattr(conn, 'archives', None)
+    schema = f"sales_{month.replace('-', '_')}"
+    if attached is None or schema not in attached:
+        return None
+    attached.move_to_end(schema)
+    return schema
+
+
+def attach(conn, month, file_name):
+    """
+    Returns the schema name of a month's archive on conn, attaching it
+    (read-only on read-only connections) when it is not attached yet.
+    Must be called outside a transaction.
+    """
+    schema = attached_schema(conn, month)
+    if schema is not None:
+        return schema
+    attached = getattr(conn, 'archives', None)
+    if attached is None:
+        attached = conn.archives = OrderedDict()
+    schema = f"sales_{month.replace('-', '_')}"
+
+    path = _archive_path(conn.store, file_name)
+    while len(attached) >= MAX_ATTACHED_ARCHIVES:
+        least_recent, _ = attached.popitem(last=False)
+        conn.execute(f"DETACH DATABASE {least_recent}")
+    if conn.manager.readonly:
+        path = f"file:{pathname2url(path)}?mode=ro"
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+    attached[schema] = month
+    return schema
+
+
+def history_request(args):
+    """
+    Validates the history parameters: from and to are dates (to inclusive,
+    default today in UTC; from defaults to DEFAULT_HISTORY_DAYS earlier), limit
+    (max MAX_HISTORY_LIMIT) and an optional after cursor (SaleDate, SaleID).
+    Returns (start, end, limit, after) with end exclusive.
+    """
+    try:
+        # SaleDate is stored in UTC (CURRENT_TIMESTAMP), so "today" is too.
+        last = date.fromisoformat(args['to']) if args.get('to') else datetime.now(timezone.utc).date()
+        first = (date.fromisoformat(args['from']) if args.get('from')
+                 else last - timedelta(days=DEFAULT_HISTORY_DAYS - 1))
+    except ValueError:
+        raise ArchiveError("from and to must be dates (YYYY-MM-DD)")
+    if first > last:
+        raise ArchiveError("from must not be after to")
+    try:
+        limit = min(max(int(args.get('limit', 100)), 1), MAX_HISTORY_LIMIT)
+    except ValueError:
+        raise ArchiveError("limit must be an integer")
+    try:
+        after = decode_cursor(args['after']) if args.get('after') else None
+    except ValueError as e:
+        raise ArchiveError(str(e))
+    if after is not None and not isinstance(after[0], str):
+        raise ArchiveError("Invalid cursor")
+    return first.isoformat(), (last + timedelta(days=1)).isoformat(), limit, after
+
+
+def _read_history(conn, start, end, limit, after_date, after_id):
+    """
+    Reads up to limit + 1 rows of a history page, hot and archived, merged
+    by (SaleDate, SaleID). Runs inside one read transaction. Returns
+    (rows, boundary, missing):
+      - boundary is set when the page stopped at an archived month because
+        it would need more archives than a connection keeps attached; the
+        rows are complete up to that date.
+      - missing is an archived (month, file name) the page needs that is not
+        attached; nothing is read and the caller attaches it and retries.
+    """
+    params = (start, end, after_date, after_id, limit + 1)
+    cursor = conn.cursor()
+    cursor.row_factory = None
+
+    # 1. Hot rows (recent months, and any sale recorded late for an old one).
+    hot = cursor.execute(HISTORY_SQL.format(table='main.Sale'), params).fetchall()
+
+    # 2. Archived months in order, as registered in this snapshot. They do
+    #    not overlap, so once a page's worth of archived rows is found,
+    #    later months cannot contribute.
+    archived, boundary = [], None
+    months = archived_months(conn, max(start, after_date[:10]), end)
+    for number, (month, file_name) in enumerate(months):
+        if len(archived) > limit:
+            break
+        if number == MAX_ATTACHED_ARCHIVES:
+            boundary = f"{month}-01"
+            hot = [row for row in hot if row[5] < boundary]
+            break
+        schema = attached_schema(conn, month)
+        if schema is None:
+            return None, None, (month, file_name)
+        archived.extend(cursor.execute(HISTORY_SQL.format(table=f'{schema}.Sale'), params).fetchall())
+
+    # 3. Merge, keeping one row more to see if there is a next page.
+    rows = list(itertools.islice(
+        heapq.merge(hot, archived, key=lambda row: (row[5], row[0])), limit + 1
+    ))
+    return rows, boundary, None
+
+
+def sales_between(conn, start, end, limit, after=None):
+    """
+    Returns the sales with start <= SaleDate < end, oldest first, one page
+    at a time: {"items": [...], "nextCursor": token or None, "limit": n}.
+    The hot table and the archives of the months in range are each read
+    with an indexed range query and merged, all in one read transaction so
+    that a month being archived meanwhile is seen exactly once. Archives are
+    only attached until the page is full.
+    """
+    after_date, after_id = after or ('', 0)
+
+    # ATTACH cannot run inside a transaction: attach what the page turns out
+    # to need between attempts. Attached archives stay for the next query.
+    while True:
+        with read_transaction(conn):
+            rows, boundary, missing = _read_history(conn, start, end, limit, after_date, after_id)
+        if missing is None:
+            break
+        attach(conn, *missing)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][5], rows[-1][0])
+    elif boundary is not None:
+        # Stopped early at an archived month: resume from there.
+        next_cursor = encode_cursor(rows[-1][5], rows[-1][0]) if rows else encode_cursor(boundary, 0)
+    return {
+        "items": [dict(zip(SALE_COLUMNS, row)) for row in rows],
+        "nextCursor": next_cursor,
+        "limit": limit,
+    }
+
+
+# --- Command Line Entry Point ---
+if __name__ == '__main__':
+    from db import get_db_connection, release_db_connection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ('run', 'list'):
+        print("Usage: python archive.py run|list")
+        sys.exit(2)
+
+    for store in STORES:
+        conn = get_db_connection(store, readonly=False)
+        try:
+            install(conn)
+            if command == 'run':
+                moved = run(conn)
+                for month, count in moved:
+                    print(f"[{store}] {month}: {count} sales archived")
+                if not moved:
+                    print(f"[{store}] No closed months to archive.")
+            else:
+                for month, file_name, count, archived_at in conn.execute(
+                    "SELECT SaleMonth, FileName, SaleCount, ArchivedAt FROM SaleArchive ORDER BY SaleMonth"
+                ):
+                    print(f"[{store}] {month}: {count} sales in {file_name} (archived {archived_at})")
+        finally:
+            release_db_connection(conn)
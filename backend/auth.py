@@ -0,0 +1,285 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Password Hashing and Sessions
+# ==============================================================================
+#
+# Login is the only place that touches the Employee table or verifies a
+# password. Everything after that is checked against a signed session token:
+#
+#   - Passwords are stored as salted PBKDF2-SHA256 hashes. Verifying one is
+#     deliberately slow, so it runs on a small, bounded worker pool: a burst
+#     of logins cannot occupy every request thread or every CPU core.
+#     Employees still stored with the old plain-text value are accepted once
+#     and re-hashed in the background.
+#   - A successful login returns a token signed with the server's secret
+#     (itsdangerous, which ships with Flask). It carries the employee's ID,
+#     username, role and store, so checking it needs no database access, and
+#     a token issued by one store is refused by the others.
+#   - Verified tokens are kept in a TTL/LRU cache. A request with a cached
+#     token is authenticated with one dictionary lookup; a cache miss costs
+#     one HMAC check and one indexed lookup in RevokedSession.
+#   - Logging out records the token's hash in the store's RevokedSession
+#     table until the token would have expired, so every worker process
+#     refuses it, even one that never cached it or has evicted it. A worker
+#     re-checks a cached session after at most REVOCATION_CHECK_SECONDS, so
+#     a token revoked elsewhere stops working within that time.
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from flask import g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from db import DEFAULT_STORE, STORES, current_store, get_db_connection, release_db_connection
+
+# --- Configuration ---
+# The signing key must be shared by every worker process; set it in
+# production so sessions survive restarts.
+SECRET_KEY = os.environ.get('TRACKWISE_SECRET_KEY') or secrets.token_hex(32)
+SESSION_TTL_SECONDS = 8 * 60 * 60   # one working shift
+MAX_CACHED_SESSIONS = 10000
+REVOCATION_CHECK_SECONDS = 30       # how long a worker trusts a cached session
+PBKDF2_ITERATIONS = 600000
+HASH_PREFIX = 'pbkdf2_sha256'
+HASH_WORKERS = max(2, (os.cpu_count() or 2) // 2)
+
+
+# --- Schema ---
+# One row per revoked, not yet expired token. The token itself is not kept.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS RevokedSession (
+    TokenHash TEXT PRIMARY KEY,
+    ExpiresAt REAL NOT NULL
+);
+"""
+
+
+def install(conn):
+    """Creates the revoked session table if it is missing."""
+    conn.executescript(SCHEMA)
+
+
+# --- Password Hashing ---
+
+def hash_password(password, iterations=PBKDF2_ITERATIONS):
+    """Returns 'pbkdf2_sha256$<iterations>$<salt>$<hash>' for a password."""
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    return '$'.join((
+        HASH_PREFIX,
+        str(iterations),
+        base64.b64encode(salt).decode(),
+        base64.b64encode(digest).decode(),
+    ))
+
+
+def is_hashed(stored):
+    """True if the stored value is a PBKDF2 hash rather than a legacy plain-text password."""
+    return isinstance(stored, str) and stored.startswith(HASH_PREFIX + '$')
+
+
+def verify_password(password, stored):
+    """Checks a password against a stored hash (or legacy plain-text value)."""
+    if not stored:
+        return False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    try:
+        _, iterations, salt, expected = stored.split('$')
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), base64.b64decode(salt), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest, base64.b64decode(expected))
+
+
+# hashlib releases the GIL while it hashes, so a thread pool runs these in
+# parallel; its size caps how many cores logins can take at once.
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix='trackwise-kdf')
+
+
+def verify_password_async(password, stored):
+    """Submits verify_password() to the hashing pool and returns a Future."""
+    return _hash_pool.submit(verify_password, password, stored)
+
+
+def rehash_in_background(employee_id, password):
+    """
+    Replaces a legacy plain-text password with a PBKDF2 hash. The hash is
+    computed on the hashing pool and stored through the group-commit writer;
+    if the writer is busy, the upgrade simply happens on a later login.
+    """
+    from writer import write_queues, WriteQueueFull
+
+    # The callback runs on a hashing thread, so the store is captured here.
+    writer = write_queues.get(current_store.get())
+
+    def save(future):
+        new_hash = future.result()
+        try:
+            writer.submit(lambda conn: conn.execute(
+                "UPDATE Employee SET PasswordHash = ? WHERE EmployeeID = ?", (new_hash, employee_id)
+            ))
+        except WriteQueueFull:
+            pass
+
+    _hash_pool.submit(hash_password, password).add_done_callback(save)
+
+
+# --- Session Tokens ---
+
+class SessionCache:
+    """
+    A thread-safe LRU cache of verified sessions with per-entry expiry.
+    Revoked tokens stay in the cache as tombstones until they would expire;
+    a tombstone that is evicted is found again in RevokedSession.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_SESSIONS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, token):
+        """Returns (session, found). session is None for a revoked token."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[token]
+                self._stats["misses"] += 1
+                return None, False
+            self._entries.move_to_end(token)
+            self._stats["hits"] += 1
+            return entry[1], True
+
+    def put(self, token, session, expires_at):
+        with self._lock:
+            self._entries[token] = (expires_at, session)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = len(self._entries)
+        return snapshot
+
+
+_serializer = URLSafeTimedSerializer(SECRET_KEY, salt='trackwise-session')
+sessions = SessionCache()
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _cache_until(expires_at):
+    return min(expires_at, time.time() + REVOCATION_CHECK_SECONDS)
+
+
+def issue_token(employee, store=None):
+    """
+    Creates a signed session token for an Employee row and caches it.
+    The token is only valid for the store the employee logged in to.
+    """
+    session = {
+        "employeeId": employee['EmployeeID'],
+        "username": employee['Username'],
+        "role": employee['Role'] if 'Role' in employee.keys() else None,
+        "store": store,
+    }
+    token = _serializer.dumps(session)
+    sessions.put(token, session, _cache_until(time.time() + SESSION_TTL_SECONDS))
+    return token
+
+
+def is_revoked(token, store):
+    """True if the token was revoked in the store's database."""
+    conn = get_db_connection(store, readonly=True)
+    try:
+        return conn.execute(
+            "SELECT 1 FROM RevokedSession WHERE TokenHash = ? AND ExpiresAt > ?", (_token_hash(token), time.time())
+        ).fetchone() is not None
+    finally:
+        release_db_connection(conn)
+
+
+def check_token(token):
+    """
+    Returns the session for a valid token, or None.
+    Cached tokens cost a dictionary lookup; others one signature check and
+    one revocation lookup.
+    """
+    session, found = sessions.get(token)
+    if found:
+        return session
+    try:
+        session, issued = _serializer.loads(token, max_age=SESSION_TTL_SECONDS, return_timestamp=True)
+    except (BadSignature, SignatureExpired):
+        return None
+    expires_at = issued.timestamp() + SESSION_TTL_SECONDS
+    store = session.get("store") or DEFAULT_STORE
+    if store not in STORES:
+        return None
+    if is_revoked(token, store):
+        sessions.put(token, None, expires_at)
+        return None
+    sessions.put(token, session, _cache_until(expires_at))
+    return session
+
+
+def revoke_token(token, session):
+    """
+    Invalidates a token in every process until it would have expired anyway.
+    The revocation is stored through the store's group-commit writer; this
+    raises WriteQueueFull or WriteTimeout if it could not be stored.
+    """
+    from writer import write_queues
+
+    expires_at = time.time() + SESSION_TTL_SECONDS
+    token_hash = _token_hash(token)
+
+    def store_revocation(conn):
+        conn.execute("DELETE FROM RevokedSession WHERE ExpiresAt <= ?", (time.time(),))
+        conn.execute("INSERT OR REPLACE INTO RevokedSession (TokenHash, ExpiresAt) VALUES (?, ?)",
+                     (token_hash, expires_at))
+
+    write_queues.get(session.get("store") or DEFAULT_STORE).execute(store_revocation)
+    sessions.put(token, None, expires_at)
+
+
+def bearer_token():
+    """Extracts the token from an 'Authorization: Bearer <token>' header."""
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' and token.strip() else None
+
+
+def login_required(view):
+    """
+    Route decorator: rejects requests without a valid session token for the
+    request's store (401).
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = bearer_token()
+        session = check_token(token) if token else None
+        # Tokens from before stores existed belong to the default store.
+        if session is not None and (session.get("store") or DEFAULT_STORE) != g.get("store", DEFAULT_STORE):
+            session = None
+        if session is None:
+            return jsonify({"success": False, "message": "Authentication required"}), 401
+        g.session = session
+        return view(*args, **kwargs)
+    return wrapper
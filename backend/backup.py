@@ -0,0 +1,197 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Online Database Backups
+# ==============================================================================
+#
+# Copying trackwise.db while the API writes to it can produce a corrupt copy,
+# and locking the database for the copy would stall every request. Backups
+# therefore use SQLite's online backup API from a background thread:
+#
+#   1. The database is copied PAGES_PER_STEP pages at a time into a temporary
+#      file. Each step only holds a short read transaction, and under WAL
+#      readers never block writers, so the API keeps serving requests
+#      throughout. A step that finds the database busy is retried after
+#      BUSY_RETRY_SECONDS.
+#   2. The finished copy is gzip-compressed into BACKUP_DIR with a timestamped
+#      name (to the microsecond, so backups started by two worker processes
+#      in the same second do not overwrite each other), and the temporary
+#      file is removed.
+#   3. Only the newest RETAIN_SNAPSHOTS snapshots are kept.
+#
+# Each store is backed up on its own. With more than one store configured,
+# a store's snapshots go to a subdirectory of BACKUP_DIR named after it.
+#
+# A snapshot holds the hot database only. Sales in archived months live in
+# the archive files (see archive.py), which never change once written: back
+# up ARCHIVE_DIR after each archiving run, and restore it next to a snapshot.
+#
+# If the database is written between two steps, SQLite restarts the copy.
+# After MAX_RESTARTS restarts the engine copies the rest in a single step,
+# which under WAL is a consistent snapshot that still does not block writers.
+
+import gzip
+import os
+import shutil
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from db import BASE_DIR, STORES, PerStore, pool_for
+
+# --- Configuration ---
+BACKUP_DIR = os.path.join(BASE_DIR, os.environ.get('TRACKWISE_BACKUP_DIR', 'backups'))
+PAGES_PER_STEP = 1024       # pages copied per backup step
+BUSY_RETRY_SECONDS = 0.05   # wait before retrying a step that found the DB busy
+MAX_RESTARTS = 3
+RETAIN_SNAPSHOTS = 7
+SNAPSHOT_PREFIX = 'trackwise-'
+SNAPSHOT_SUFFIX = '.db.gz'
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class BackupManager:
+    """
+    Runs at most one backup at a time on a background thread and keeps its
+    progress in a status dictionary that the API can poll. Archived sale
+    months are not included (see above).
+    """
+
+    def __init__(self, store=None, backup_dir=None):
+        self.store = store
+        if backup_dir is None:
+            backup_dir = os.path.join(BACKUP_DIR, store) if len(STORES) > 1 else BACKUP_DIR
+        self.backup_dir = backup_dir
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = {"state": "idle"}
+
+    # --- Public API ---
+
+    def start(self):
+        """
+        Starts a backup in the background.
+        Returns the initial status, or None if a backup is already running.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return None
+            self._status = {
+                "state": "running",
+                "startedAt": _utc_now(),
+                "finishedAt": None,
+                "pagesTotal": None,
+                "pagesRemaining": None,
+                "percent": 0.0,
+                "restarts": 0,
+                "file": None,
+                "sizeBytes": None,
+                "error": None,
+            }
+            self._thread = threading.Thread(target=self._run, name="trackwise-backup", daemon=True)
+            self._thread.start()
+            return dict(self._status)
+
+    def status(self):
+        """Returns a copy of the current (or last) backup's status."""
+        with self._lock:
+            return dict(self._status)
+
+    def snapshots(self):
+        """Lists the retained snapshots, newest first."""
+        if not os.path.isdir(self.backup_dir):
+            return []
+        names = sorted(
+            (name for name in os.listdir(self.backup_dir)
+             if name.startswith(SNAPSHOT_PREFIX) and name.endswith(SNAPSHOT_SUFFIX)),
+            reverse=True
+        )
+        return [
+            {"file": name, "sizeBytes": os.path.getsize(os.path.join(self.backup_dir, name))}
+            for name in names
+        ]
+
+    # --- Background Work ---
+
+    def _update(self, **changes):
+        with self._lock:
+            self._status.update(changes)
+
+    def _progress(self, status, remaining, total):
+        """Progress callback from sqlite3.Connection.backup()."""
+        with self._lock:
+            previous = self._status["pagesRemaining"]
+            # The remaining count only goes up when SQLite restarted the copy.
+            if previous is not None and remaining > previous:
+                self._status["restarts"] += 1
+            self._status["pagesTotal"] = total
+            self._status["pagesRemaining"] = remaining
+            self._status["percent"] = round(100.0 * (total - remaining) / total, 1) if total else 100.0
+            restarts = self._status["restarts"]
+        if restarts > MAX_RESTARTS:
+            # Abort this stepped copy; _copy() finishes it in one step.
+            raise _TooManyRestarts()
+
+    def _copy(self, target_path):
+        """Copies the live database into target_path with the online backup API."""
+        source = sqlite3.connect(pool_for(self.store).database)
+        target = sqlite3.connect(target_path)
+        try:
+            try:
+                source.backup(target, pages=PAGES_PER_STEP, progress=self._progress,
+                              sleep=BUSY_RETRY_SECONDS)
+            except _TooManyRestarts:
+                # One step = one read transaction: a consistent WAL snapshot.
+                source.backup(target, pages=-1)
+                self._update(pagesRemaining=0, percent=100.0)
+        finally:
+            target.close()
+            source.close()
+
+    def _compress(self, source_path, target_path):
+        """Gzips the raw copy into its final location."""
+        with open(source_path, 'rb') as raw, gzip.open(target_path, 'wb', compresslevel=6) as packed:
+            shutil.copyfileobj(raw, packed, length=1024 * 1024)
+
+    def _rotate(self):
+        """Deletes all but the newest RETAIN_SNAPSHOTS snapshots."""
+        for snapshot in self.snapshots()[RETAIN_SNAPSHOTS:]:
+            os.remove(os.path.join(self.backup_dir, snapshot["file"]))
+
+    def _run(self):
+        os.makedirs(self.backup_dir, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S-%f')
+        name = f"{SNAPSHOT_PREFIX}{stamp}{SNAPSHOT_SUFFIX}"
+        raw_path = os.path.join(self.backup_dir, f".{SNAPSHOT_PREFIX}{stamp}.db.partial")
+        final_path = os.path.join(self.backup_dir, name)
+        try:
+            # 1. Stepped online copy.
+            self._copy(raw_path)
+
+            # 2. Compress; write under a temporary name so a half-written
+            #    archive is never listed as a snapshot.
+            self._update(state="compressing")
+            self._compress(raw_path, final_path + '.partial')
+            os.replace(final_path + '.partial', final_path)
+
+            # 3. Rotate old snapshots.
+            self._rotate()
+            self._update(state="done", finishedAt=_utc_now(), file=name,
+                         sizeBytes=os.path.getsize(final_path))
+        except Exception as e:
+            print(f"Backup error: {e}")
+            self._update(state="failed", finishedAt=_utc_now(), error=str(e))
+        finally:
+            for leftover in (raw_path, final_path + '.partial'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+
+class _TooManyRestarts(Exception):
+    """Raised from the progress callback to abandon a stepped copy."""
+
+
+# --- Shared Instances ---
+# One manager per store; backups.get() is the current store's.
+backups = PerStore(BackupManager)
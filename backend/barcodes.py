@@ -0,0 +1,262 @@
+# ==============================================================================
+# TrackWise Inventory Management System - In-Memory Barcode Index
+# ==============================================================================
+#
+# Point-of-sale lanes resolve every scan to a product, so the lookup has to
+# cost next to nothing even with many lanes scanning at once. Each process
+# keeps a hash index of barcode -> product (ID, name, price, stock):
+#
+#   - The index is loaded once at startup with one query over the barcode
+#     index.
+#   - Before a lookup, the index checks `PRAGMA data_version` on its own
+#     watcher connection. If anything was committed since the last check, it
+#     reads the new ChangeFeed rows (see events.py) and reloads only the
+#     products they name. Triggers installed here add product edits and
+#     deletes to the feed, next to the inserts and stock changes already
+#     there. If the feed was pruned past the index's position, the whole
+#     index is reloaded.
+#   - A barcode missing from the index falls back to an indexed query
+#     (idx_product_barcode), and the result is added to the index.
+#
+# A basket of barcodes resolves in one request with a single version check.
+# Each store has its own index (barcode_indexes.get()).
+
+import os
+import sqlite3
+import threading
+
+from db import PerStore, get_db_connection, pool_for, release_db_connection
+
+# --- Configuration ---
+MAX_BATCH_SIZE = 500        # barcodes per lookup request
+RELOAD_CHUNK_SIZE = 500     # product IDs per refresh query
+FEED_PAGE_SIZE = 1000       # ChangeFeed rows read per query while syncing
+
+LOOKUP_COLUMNS = ('ProductID', 'ProductName', 'Barcode', 'SalePrice', 'QuantityInStock')
+
+# --- Schema ---
+# Inserts and stock changes are already in the feed (events.py); these add
+# the edits that change what a scan resolves to, and deletions.
+SCHEMA = """
+CREATE TRIGGER IF NOT EXISTS trg_feed_product_update
+AFTER UPDATE OF ProductName, SalePrice, Barcode ON Product
+WHEN OLD.ProductName IS NOT NEW.ProductName OR OLD.SalePrice IS NOT NEW.SalePrice
+     OR OLD.Barcode IS NOT NEW.Barcode
+BEGIN
+    INSERT INTO ChangeFeed (Kind, EntityID) VALUES ('product.updated', NEW.ProductID);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_feed_product_delete AFTER DELETE ON Product
+BEGIN
+    INSERT INTO ChangeFeed (Kind, EntityID) VALUES ('product.deleted', OLD.ProductID);
+END;
+"""
+
+_SELECT = f"SELECT {', '.join(LOOKUP_COLUMNS)} FROM Product"
+
+
+def install(conn):
+    """Creates the product edit and delete feed triggers if they are missing."""
+    conn.executescript(SCHEMA)
+
+
+class BarcodeIndex:
+    """A per-process barcode -> product map of one store, kept current through the change feed."""
+
+    def __init__(self, store=None):
+        self.store = store
+        self._by_barcode = {}
+        self._by_id = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._watcher_pid = None
+        self._data_version = None
+        self._last_change_id = None   # None until the index is loaded
+        self._stats = {"hits": 0, "fallbackHits": 0, "misses": 0, "reloads": 0, "refreshedProducts": 0}
+
+    # --- Public API ---
+
+    def load(self):
+        """Loads (or reloads) the whole index; called at startup."""
+        with self._lock:
+            conn = self._connection()
+            self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            self._load(conn)
+
+    def lookup_many(self, barcodes):
+        """
+        Resolves a list of barcodes. Returns (found, missing): a dict of
+        barcode -> product and the list of barcodes with no product.
+        """
+        self._sync()
+        found, pending = {}, []
+        for barcode in barcodes:
+            entry = self._by_barcode.get(barcode)
+            if entry is not None:
+                found[barcode] = dict(zip(LOOKUP_COLUMNS, entry))
+            else:
+                pending.append(barcode)
+        hits = len(found)
+
+        # Fall back to the database for anything the index does not have.
+        if pending:
+            for entry in self._fetch(pending):
+                self._store(entry)
+                found[entry[2]] = dict(zip(LOOKUP_COLUMNS, entry))
+        missing = [barcode for barcode in pending if barcode not in found]
+
+        with self._lock:
+            self._stats["hits"] += hits
+            self._stats["fallbackHits"] += len(pending) - len(missing)
+            self._stats["misses"] += len(missing)
+        return found, missing
+
+    def lookup(self, barcode):
+        """Resolves one barcode to a product dict, or None."""
+        found, _ = self.lookup_many([barcode])
+        return found.get(barcode)
+
+    def close(self):
+        """
+        Closes the watcher connection and keeps the index. The prefork
+        server calls this before forking; each worker opens its own watcher.
+        """
+        with self._lock:
+            if self._watcher is not None and self._watcher_pid == os.getpid():
+                self._watcher.close()
+            self._watcher = None
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = len(self._by_barcode)
+            snapshot["lastChangeId"] = self._last_change_id
+        return snapshot
+
+    # --- Maintenance ---
+
+    def _connection(self):
+        # Opened lazily, and again after a fork: SQLite connections must not
+        # be shared between processes. The caller holds the lock.
+        if self._watcher is None or self._watcher_pid != os.getpid():
+            self._watcher = sqlite3.connect(pool_for(self.store).database, check_same_thread=False)
+            self._watcher_pid = os.getpid()
+        return self._watcher
+
+    def _load(self, conn):
+        # Read the feed position first: a change committed between the two
+        # reads is applied again on the next sync, which is harmless. The
+        # AUTOINCREMENT sequence is the last ID ever used, even when the feed
+        # has been emptied.
+        last_change_id = conn.execute(
+            "SELECT IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'ChangeFeed'), 0)"
+        ).fetchone()[0]
+        by_barcode, by_id = {}, {}
+        # Descending, so that for a duplicated barcode the oldest product wins.
+        for entry in conn.execute(f"{_SELECT} WHERE Barcode IS NOT NULL ORDER BY ProductID DESC"):
+            by_barcode[entry[2]] = entry
+            by_id[entry[0]] = entry
+        self._by_barcode, self._by_id = by_barcode, by_id
+        self._last_change_id = last_change_id
+        self._stats["reloads"] += 1
+
+    def _sync(self):
+        """Brings the index up to date if the database changed since the last check."""
+        with self._lock:
+            conn = self._connection()
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if self._last_change_id is None:
+                self._data_version = version
+                self._load(conn)
+                return
+            if version == self._data_version:
+                return
+            self._data_version = version
+
+            # One snapshot for the checks and every page, so a prune
+            # committed meanwhile cannot remove rows between two pages.
+            conn.execute("BEGIN")
+            try:
+                self._catch_up(conn)
+            finally:
+                conn.rollback()
+
+    def _catch_up(self, conn):
+        """Applies the feed since the last sync. The caller holds the lock and a read transaction."""
+        # 1. Reload everything if the feed was pruned past our position.
+        first = conn.execute("SELECT MIN(ChangeID) FROM ChangeFeed").fetchone()[0]
+        if first is not None and first > self._last_change_id + 1:
+            self._load(conn)
+            return
+
+        # 2. Otherwise reload just the products named by new changes, a
+        #    page at a time. Sales do not change what a scan resolves to,
+        #    but the position still moves past them.
+        newest = conn.execute("SELECT MAX(ChangeID) FROM ChangeFeed").fetchone()[0]
+        if newest is None or newest <= self._last_change_id:
+            return
+        position = self._last_change_id
+        while True:
+            rows = conn.execute(
+                "SELECT ChangeID, EntityID FROM ChangeFeed "
+                "WHERE ChangeID > ? AND ChangeID <= ? AND Kind != 'sale.recorded' "
+                "ORDER BY ChangeID LIMIT ?",
+                (position, newest, FEED_PAGE_SIZE)
+            ).fetchall()
+            if not rows:
+                break
+            self._reload(conn, sorted({entity for _, entity in rows}))
+            position = rows[-1][0]
+            if len(rows) < FEED_PAGE_SIZE:
+                break
+        self._last_change_id = newest
+
+    def _reload(self, conn, product_ids):
+        """Re-reads the given products into the index. The caller holds the lock."""
+        for start in range(0, len(product_ids), RELOAD_CHUNK_SIZE):
+            chunk = product_ids[start:start + RELOAD_CHUNK_SIZE]
+            entries = conn.execute(
+                f"{_SELECT} WHERE ProductID IN ({', '.join('?' for _ in chunk)})", chunk
+            ).fetchall()
+            for product_id in chunk:
+                self._remove(product_id)
+            for entry in entries:
+                if entry[2] is not None:
+                    self._add(entry)
+        self._stats["refreshedProducts"] += len(product_ids)
+
+    def _add(self, entry):
+        self._by_id[entry[0]] = entry
+        self._by_barcode.setdefault(entry[2], entry)
+        if self._by_barcode[entry[2]][0] == entry[0]:
+            self._by_barcode[entry[2]] = entry
+
+    def _remove(self, product_id):
+        entry = self._by_id.pop(product_id, None)
+        if entry is not None and self._by_barcode.get(entry[2], (None,))[0] == product_id:
+            del self._by_barcode[entry[2]]
+
+    def _store(self, entry):
+        with self._lock:
+            self._remove(entry[0])
+            self._add(entry)
+
+    def _fetch(self, barcodes):
+        """Indexed fallback lookups (idx_product_barcode) on a pooled connection."""
+        conn = get_db_connection(self.store, readonly=True)
+        try:
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            entries = []
+            for barcode in barcodes:
+                entry = cursor.execute(f"{_SELECT} WHERE Barcode = ? ORDER BY ProductID LIMIT 1", (barcode,)).fetchone()
+                if entry is not None:
+                    entries.append(entry)
+            return entries
+        finally:
+            release_db_connection(conn)
+
+
+# --- Shared Instances ---
+# One index per store; barcode_indexes.get() is the current store's.
+barcode_indexes = PerStore(BarcodeIndex)
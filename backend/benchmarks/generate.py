@@ -0,0 +1,161 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Benchmark Dataset Generator
+# ==============================================================================
+#
+# Builds a synthetic TrackWise database at a chosen scale so that API
+# performance can be measured on realistic volumes (see loadtest.py).
+#
+#   - Employees, products and sales are bulk-loaded into the bare base tables
+#     first, with no indexes or triggers, which is far faster than inserting
+#     through them.
+#   - The regular schema migrations then run on the loaded data: indexes are
+#     built once and the KPI and rollup tables are backfilled, exactly as for
+#     an existing production database.
+#   - Sales are spread evenly over the last --days days with skewed product
+#     popularity, so a few products sell far more often than the rest.
+#   - Every employee shares the password BENCH_PASSWORD; the load driver logs
+#     in as BENCH_USERNAME.
+#
+# The output is deterministic for a given --seed.
+#
+# Usage (from the backend directory):
+#   python benchmarks/generate.py bench.db --products 100000 --sales 10000000
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# --- Configuration ---
+BENCH_USERNAME = 'bench001'
+BENCH_PASSWORD = 'bench'
+CHUNK_SIZE = 100000   # rows per executemany() call
+LOW_STOCK_SHARE = 0.05
+
+
+def _employees(count, password_hash):
+    for i in range(1, count + 1):
+        yield (f"Bench Employee {i}", f"bench{i:03d}", password_hash, 'admin' if i == 1 else 'staff')
+
+
+def _products(rng, count, suppliers):
+    for i in range(1, count + 1):
+        purchase = round(rng.uniform(1, 100), 2)
+        if rng.random() < LOW_STOCK_SHARE:
+            quantity = rng.randint(0, 10)
+        else:
+            quantity = rng.randint(11, 500)
+        yield (f"Product {i:06d}", f"Synthetic product {i}", quantity,
+               round(purchase * rng.uniform(1.2, 1.8), 2), purchase, rng.randint(1, suppliers))
+
+
+def _sales(rng, count, products, employees, prices, days):
+    """Yields sales in date order, so SaleID follows SaleDate as in production."""
+    end = datetime.now(timezone.utc).replace(microsecond=0)
+    start = end - timedelta(days=days)
+    step = (end - start).total_seconds() / max(count, 1)
+    for i in range(count):
+        # Squaring a uniform value skews popularity towards low product IDs.
+        product_id = int(products * rng.random() ** 2) + 1
+        quantity = rng.randint(1, 5)
+        sale_date = start + timedelta(seconds=i * step)
+        yield (product_id, rng.randint(1, employees), quantity,
+               round(prices[product_id] * quantity, 2), sale_date.strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def _load(conn, label, sql, rows, total):
+    loaded = 0
+    started = time.perf_counter()
+    while loaded < total:
+        batch = [row for _, row in zip(range(CHUNK_SIZE), rows)]
+        if not batch:
+            break
+        conn.executemany(sql, batch)
+        loaded += len(batch)
+        elapsed = time.perf_counter() - started
+        print(f"\r  {label}: {loaded:,}/{total:,} ({loaded / elapsed:,.0f} rows/s)", end='', flush=True)
+    print()
+
+
+def generate(path, products, sales, employees, suppliers, days, seed):
+    # Imported here: importing them loads db.py, which fixes the database
+    # path, and loadtest.py imports this module before choosing its database.
+    import auth
+    import schema
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        # Fast, unsafe settings for the bulk load only; the API sets its own.
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        schema._create_base_tables(conn)
+
+        # 1. Bulk-load the base tables.
+        print(f"Loading {employees:,} employees, {products:,} products and {sales:,} sales...")
+        _load(conn, "Employee", "INSERT INTO Employee (Name, Username, PasswordHash, Role) VALUES (?, ?, ?, ?)",
+              _employees(employees, auth.hash_password(BENCH_PASSWORD)), employees)
+        _load(conn, "Product",
+              "INSERT INTO Product (ProductName, Description, QuantityInStock, SalePrice, PurchasePrice, SupplierID)"
+              " VALUES (?, ?, ?, ?, ?, ?)",
+              _products(rng, products, suppliers), products)
+        conn.commit()
+
+        prices = [0.0] * (products + 1)
+        for product_id, price in conn.execute("SELECT ProductID, SalePrice FROM Product"):
+            prices[product_id] = price
+        _load(conn, "Sale", "INSERT INTO Sale (ProductID, EmployeeID, Quantity, TotalAmount, SaleDate) VALUES (?, ?, ?, ?, ?)",
+              _sales(rng, sales, products, employees, prices, days), sales)
+        conn.commit()
+
+        # 2. Build indexes and backfill the summary tables.
+        print("Running migrations (indexes, KPI and rollup backfill)...")
+        started = time.perf_counter()
+        applied = schema.migrate(conn)
+        print(f"  applied {applied} in {time.perf_counter() - started:.1f}s")
+
+        # 3. Vary the reorder levels, add EAN-13 style barcodes (this also
+        #    fills the search index); the change feed should start empty.
+        conn.execute("UPDATE Product SET ReorderLevel = 5 + abs(random()) % 16, "
+                     "Barcode = printf('400%010d', ProductID)")
+        conn.execute("DELETE FROM ChangeFeed")
+        conn.commit()
+
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# --- Command Line Entry Point ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate a synthetic TrackWise database.")
+    parser.add_argument('output', help="path of the database to create")
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--sales', type=int, default=1000000)
+    parser.add_argument('--employees', type=int, default=50)
+    parser.add_argument('--suppliers', type=int, default=200)
+    parser.add_argument('--days', type=int, default=730, help="spread sales over this many days")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--force', action='store_true', help="overwrite an existing output file")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        if not args.force:
+            print(f"{args.output} already exists; pass --force to overwrite it.")
+            sys.exit(2)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.output + suffix):
+                os.remove(args.output + suffix)
+
+    started = time.perf_counter()
+    generate(args.output, args.products, args.sales, args.employees, args.suppliers, args.days, args.seed)
+    size = os.path.getsize(args.output) / (1024 * 1024)
+    print(f"Wrote {args.output} ({size:,.1f} MiB) in {time.perf_counter() - started:.1f}s")
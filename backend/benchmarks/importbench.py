@@ -0,0 +1,106 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Bulk Import Throughput Check
+# ==============================================================================
+#
+# Bulk import (products.import_products()) is meant to sustain tens of
+# thousands of rows per second, and every trigger on Product adds to its cost
+# per row. This script imports a synthetic CSV catalog into a copy of a
+# database and fails when the rate drops below --min-rate, so a change that
+# slows imports down is caught when it is made rather than in production.
+#
+#   - The database is copied first (--database, e.g. one made by generate.py,
+#     or a fresh empty one), so the check never changes its input.
+#   - Rows go through the same parser and import path as
+#     POST /api/products/import, on a pooled read-write connection.
+#   - Afterwards every imported row must be found by a catalog search, so a
+#     fast import that skipped the search index also fails.
+#
+# The default --min-rate leaves headroom on a typical laptop; raise it on
+# faster hardware to tighten the check.
+#
+# Usage (from the backend directory):
+#   python benchmarks/importbench.py                             - fresh database
+#   python benchmarks/importbench.py --database bench.db --rows 50000
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# --- Configuration ---
+DEFAULT_ROWS = 50000
+DEFAULT_MIN_RATE = 10000      # rows per second
+CSV_HEADER = "productName,description,initialQuantity,salePrice,purchasePrice,supplierId,barcode\n"
+
+
+def catalog_csv(rows):
+    """Returns a CSV body of `rows` distinct products, as bytes."""
+    lines = (
+        f"Imported widget {i},Bulk catalog item {i},{i % 300},{i % 90 + 1.5},{i % 50 + 1.0},"
+        f"{i % 40 + 1},59{i:011d}\n"
+        for i in range(rows)
+    )
+    return (CSV_HEADER + ''.join(lines)).encode()
+
+
+def _copy_database(source, target):
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(source + suffix):
+            shutil.copyfile(source + suffix, target + suffix)
+
+
+def run(args):
+    workdir = tempfile.mkdtemp(prefix='trackwise-importbench-')
+    try:
+        database = os.path.join(workdir, 'import.db')
+        if args.database:
+            _copy_database(args.database, database)
+        # db.py reads the path when it is first imported.
+        os.environ['TRACKWISE_DATABASE'] = database
+        import products
+        import schema
+        from db import get_db_connection, release_db_connection
+
+        body = catalog_csv(args.rows)
+        conn = get_db_connection(readonly=False)
+        try:
+            schema.migrate(conn)
+            started = time.perf_counter()
+            report = products.import_products(conn, products.iter_csv(io.BytesIO(body)))
+            elapsed = time.perf_counter() - started
+            indexed = conn.execute(
+                "SELECT COUNT(*) FROM ProductSearch WHERE ProductSearch MATCH '\"widget\"*'"
+            ).fetchone()[0]
+        finally:
+            release_db_connection(conn)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    rate = report.inserted / elapsed if elapsed > 0 else float('inf')
+    print(f"Imported {report.inserted} of {args.rows} rows in {elapsed:.2f}s: {rate:,.0f} rows/s "
+          f"(minimum {args.min_rate:,})")
+    failures = []
+    if report.inserted != args.rows:
+        failures.append(f"{args.rows - report.inserted} rows were rejected: {report.errors[:3]}")
+    if indexed != report.inserted:
+        failures.append(f"only {indexed} of {report.inserted} imported rows are in the search index")
+    if rate < args.min_rate:
+        failures.append(f"throughput {rate:,.0f} rows/s is below {args.min_rate:,}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+# --- Command Line Entry Point ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Check bulk product import throughput.")
+    parser.add_argument('--database', help="database to import into (copied first; default: a fresh one)")
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS)
+    parser.add_argument('--min-rate', type=int, default=DEFAULT_MIN_RATE, help="minimum rows per second")
+    sys.exit(run(parser.parse_args()))
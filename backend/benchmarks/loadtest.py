@@ -0,0 +1,293 @@
+# ==============================================================================
+# TrackWise Inventory Management System - API Load Driver
+# ==============================================================================
+#
+# Drives the main API routes at a fixed concurrency and reports latency
+# percentiles and throughput, so performance can be compared between commits.
+#
+#   - Each scenario (one route) runs for --duration seconds with --concurrency
+#     worker threads, after a short warm-up whose requests are not counted.
+#   - Requests go either in-process through the Flask test client (--database,
+#     no network or server overhead) or to a running server (--url).
+#   - Results are written as JSON to benchmarks/results/ (or --output) with
+#     the git commit they were measured on. `compare` prints two result files
+#     side by side.
+#
+# Usage (from the backend directory):
+#   python benchmarks/loadtest.py run --database bench.db --concurrency 8
+#   python benchmarks/loadtest.py run --url http://127.0.0.1:5000 --scenarios lowstock,kpi
+#   python benchmarks/loadtest.py compare results/old.json results/new.json
+
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BACKEND_DIR)
+
+from generate import BENCH_PASSWORD, BENCH_USERNAME
+
+# --- Configuration ---
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+WARMUP_SECONDS = 1.0
+
+
+# --- Scenarios ---
+# name -> (method, path, body factory or None, needs a session token)
+
+def _new_product(worker, sequence):
+    return {
+        "productName": f"Load test product {worker}-{sequence}",
+        "initialQuantity": 100,
+        "salePrice": 9.99,
+        "purchasePrice": 5.5,
+        "supplierId": 1,
+    }
+
+
+SCENARIOS = {
+    'login': ('POST', '/api/login',
+              lambda worker, sequence: {"username": BENCH_USERNAME, "password": BENCH_PASSWORD}, False),
+    'lowstock': ('GET', '/api/products/lowstock', None, False),
+    'recent': ('GET', '/api/sales/recent', None, False),
+    'kpi': ('GET', '/api/kpi/dashboard', None, False),
+    'search': ('GET', '/api/products?q=00012&sort=name', None, False),
+    'create_product': ('POST', '/api/products', _new_product, True),
+}
+
+
+# --- Targets ---
+
+class ClientTarget:
+    """Sends requests in-process through the Flask test client (one per thread)."""
+
+    def __init__(self, database):
+        os.environ['TRACKWISE_DATABASE'] = os.path.abspath(database)
+        from app import create_app
+        self.app = create_app()
+        self.description = f"test-client:{os.path.abspath(database)}"
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers=headers or {})
+        return response.status_code, response.get_data()
+
+
+class HttpTarget:
+    """Sends requests to a running server, one keep-alive connection per thread."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.description = url
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            # Drop the broken connection; the next request opens a new one.
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+# --- Measurement ---
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values), max(1, math.ceil(fraction * len(sorted_values)))) - 1
+    return sorted_values[index]
+
+
+def login(target):
+    status, body = target.request('POST', '/api/login', {"username": BENCH_USERNAME, "password": BENCH_PASSWORD})
+    if status != 200:
+        raise RuntimeError(f"Login as {BENCH_USERNAME} failed ({status}); was the database made by generate.py?")
+    return json.loads(body)['token']
+
+
+def run_scenario(target, name, concurrency, duration, token):
+    """Runs one scenario and returns its latency and throughput summary."""
+    method, path, body_factory, needs_token = SCENARIOS[name]
+    headers = {'Authorization': f'Bearer {token}'} if needs_token else {}
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    phase = {"measuring": False, "stop": False}
+
+    def worker(index):
+        sequence = 0
+        while not phase["stop"]:
+            sequence += 1
+            body = body_factory(index, sequence) if body_factory else None
+            started = time.perf_counter()
+            try:
+                status, _ = target.request(method, path, body, headers)
+                failed = status >= 400
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - started
+            if phase["measuring"]:
+                latencies[index].append(elapsed)
+                if failed:
+                    errors[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    time.sleep(WARMUP_SECONDS)
+    phase["measuring"] = True
+    started = time.perf_counter()
+    time.sleep(duration)
+    phase["measuring"] = False
+    elapsed = time.perf_counter() - started
+    phase["stop"] = True
+    for thread in threads:
+        thread.join()
+
+    samples = sorted(value * 1000 for values in latencies for value in values)
+    count = len(samples)
+    return {
+        "requests": count,
+        "errors": sum(errors),
+        "throughputRps": round(count / elapsed, 1),
+        "latencyMs": {
+            "p50": round(percentile(samples, 0.50), 3) if count else None,
+            "p95": round(percentile(samples, 0.95), 3) if count else None,
+            "p99": round(percentile(samples, 0.99), 3) if count else None,
+            "mean": round(sum(samples) / count, 3) if count else None,
+            "max": round(samples[-1], 3) if count else None,
+        },
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _dataset(database):
+    """Row counts of a local benchmark database."""
+    conn = sqlite3.connect(database)
+    try:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                for table in ('Employee', 'Product', 'Sale')}
+    finally:
+        conn.close()
+
+
+def run(args):
+    target = ClientTarget(args.database) if args.database else HttpTarget(args.url)
+    names = args.scenarios.split(',') if args.scenarios else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(SCENARIOS)})")
+        sys.exit(2)
+
+    token = login(target)
+    results = {
+        "startedAt": datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        "commit": _git_commit(),
+        "target": target.description,
+        "dataset": _dataset(args.database) if args.database else None,
+        "concurrency": args.concurrency,
+        "durationSeconds": args.duration,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "scenarios": {},
+    }
+    print(f"{'scenario':<16}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name in names:
+        summary = run_scenario(target, name, args.concurrency, args.duration, token)
+        results["scenarios"][name] = summary
+        latency = summary["latencyMs"]
+        print(f"{name:<16}{summary['throughputRps']:>10}{latency['p50']:>10}{latency['p95']:>10}"
+              f"{latency['p99']:>10}{summary['errors']:>8}")
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{results['commit'] or 'unknown'}.json")
+    with open(output, 'w') as handle:
+        json.dump(results, handle, indent=2)
+    print(f"Results written to {output}")
+
+
+def compare(args):
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    with open(args.candidate) as handle:
+        candidate = json.load(handle)
+
+    def change(old, new):
+        if old in (None, 0) or new is None:
+            return '     n/a'
+        return f"{100.0 * (new - old) / old:+7.1f}%"
+
+    print(f"baseline  {baseline['commit']} ({baseline['startedAt']})")
+    print(f"candidate {candidate['commit']} ({candidate['startedAt']})\n")
+    print(f"{'scenario':<16}{'metric':<8}{'baseline':>12}{'candidate':>12}{'change':>10}")
+    for name, new in candidate["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            continue
+        rows = [('req/s', old["throughputRps"], new["throughputRps"])]
+        rows += [(key, old["latencyMs"][key], new["latencyMs"][key]) for key in ('p50', 'p95', 'p99')]
+        for metric, old_value, new_value in rows:
+            print(f"{name:<16}{metric:<8}{old_value!s:>12}{new_value!s:>12}{change(old_value, new_value):>10}")
+
+
+# --- Command Line Entry Point ---
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load-test the TrackWise API.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the scenarios and save the results")
+    where = run_parser.add_mutually_exclusive_group(required=True)
+    where.add_argument('--database', help="benchmark database, driven in-process via the test client")
+    where.add_argument('--url', help="base URL of a running server, e.g. http://127.0.0.1:5000")
+    run_parser.add_argument('--scenarios', help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--duration', type=float, default=10.0, help="measured seconds per scenario")
+    run_parser.add_argument('--output', help="results file (default: benchmarks/results/<time>-<commit>.json)")
+
+    compare_parser = commands.add_parser('compare', help="compare two results files")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        compare(args)
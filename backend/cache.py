@@ -0,0 +1,213 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Response Cache and Conditional GET
+# ==============================================================================
+#
+# The dashboard read endpoints (low stock, recent sales, KPIs) are read far
+# more often than the data behind them changes, yet every hit used to run its
+# SQL and serialize the result again. Those views are now cached:
+#
+#   - A cached response is stored per route and query string, together with
+#     the database version it was built from. The version is the
+#     `PRAGMA data_version` of a dedicated watcher connection, which moves
+#     whenever any other connection commits (the writer thread, a CLI script,
+#     another worker process), plus today's UTC date, because "sales today"
+#     rolls over at midnight without any write.
+#   - While the version is unchanged, the stored body is returned as-is:
+#     no query and no JSON serialization.
+#   - Every cached response carries an ETag derived from its body, and a
+#     request whose If-None-Match matches gets an empty 304. Because the ETag
+#     depends only on the content, it stays valid across worker processes.
+#
+# Entries are kept per store, each versioned by its own shard; a cross-store
+# view (store=all) is versioned by every shard at once.
+#
+# Concurrent misses for the same entry (many dashboards refreshing at the
+# same moment) are coalesced: the first request runs the view, the others
+# wait for it and share its body (SingleFlight), so one query per version is
+# run rather than one per client.
+#
+# The version is read before the view runs. If a write commits while the
+# view is running, the entry is stored under the older version and is simply
+# rebuilt on the next request; a stale body is never served as current.
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import Response, g, make_response, request
+
+from db import ALL_STORES, DEFAULT_STORE, STORES, pool_for
+
+# --- Configuration ---
+MAX_CACHED_RESPONSES = 256   # distinct route + query string combinations
+
+
+class _Entry:
+    __slots__ = ('version', 'body', 'mimetype', 'etag')
+
+    def __init__(self, version, body, mimetype):
+        self.version = version
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function, callers arriving while it runs wait and get the same result
+    (or exception). A call arriving after it finished runs again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        """Returns (result, shared): shared is True for a caller that waited on another's call."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = Future()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = function()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class ResponseCache:
+    """An LRU cache of rendered GET responses, invalidated by data_version."""
+
+    def __init__(self, max_entries=MAX_CACHED_RESPONSES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._watchers = {}
+        self._watcher_pid = None
+        self._flights = SingleFlight()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "notModified": 0, "evictions": 0}
+
+    # --- Versioning ---
+
+    def version(self, store=DEFAULT_STORE):
+        """
+        Returns the current (data_version, UTC date) pair of a store, or of
+        every store (a tuple of data_versions) for ALL_STORES.
+        """
+        stores = tuple(STORES) if store == ALL_STORES else (store,)
+        with self._lock:
+            # Opened lazily, and again after a fork: SQLite connections must
+            # not be shared between processes.
+            if self._watcher_pid != os.getpid():
+                self._watchers = {}
+                self._watcher_pid = os.getpid()
+                self._entries.clear()
+                self._flights = SingleFlight()
+            data_versions = []
+            for key in stores:
+                watcher = self._watchers.get(key)
+                if watcher is None:
+                    watcher = self._watchers[key] = sqlite3.connect(pool_for(key).database, check_same_thread=False)
+                data_versions.append(watcher.execute("PRAGMA data_version").fetchone()[0])
+        data_version = data_versions[0] if len(data_versions) == 1 else tuple(data_versions)
+        return data_version, datetime.now(timezone.utc).date().isoformat()
+
+    # --- Entries ---
+
+    def get(self, key, version):
+        """Returns the entry for key if it was built at this version, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != version:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry
+
+    def put(self, key, version, body, mimetype):
+        entry = _Entry(version, body, mimetype)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["size"] = len(self._entries)
+        return snapshot
+
+    # --- Route Decorator ---
+
+    def cached(self, view):
+        """
+        Caches a GET view's successful responses and answers conditional
+        requests. Error responses are passed through and never cached.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            store = g.get('store', DEFAULT_STORE)
+            key = (store, request.path, tuple(sorted(request.args.items(multi=True))))
+            version = self.version(store)
+            entry = self.get(key, version)
+            if entry is None:
+                # Identical requests missing at the same version share one run.
+                entry, shared = self._flights.do(
+                    (key, version), lambda: self._render(view, args, kwargs, key, version)
+                )
+                if shared:
+                    with self._lock:
+                        self._stats["coalesced"] += 1
+                if not isinstance(entry, _Entry):
+                    # An error response; every waiter gets its own copy.
+                    return entry if not shared else Response(
+                        entry.get_data(), status=entry.status_code, mimetype=entry.mimetype
+                    )
+
+            response = Response(entry.body, mimetype=entry.mimetype)
+            response.set_etag(entry.etag)
+            # Browsers may keep the body but must revalidate it every time.
+            response.headers['Cache-Control'] = 'no-cache'
+            response = response.make_conditional(request)
+            if response.status_code == 304:
+                with self._lock:
+                    self._stats["notModified"] += 1
+            return response
+        return wrapper
+
+    def _render(self, view, args, kwargs, key, version):
+        """Runs the view; stores and returns its entry, or returns an error response as-is."""
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200:
+            return response
+        return self.put(key, version, response.get_data(), response.mimetype)
+
+
+# --- Shared Instance ---
+responses = ResponseCache()
@@ -0,0 +1,324 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Product Catalog Listing and Search
+# ==============================================================================
+#
+# GET /api/products lists the catalog a page at a time, with sorting,
+# filters and full-text search:
+#
+#   - Search uses an FTS5 index (ProductSearch) over the product name,
+#     description and barcode. It is an external-content index: the text
+#     stays in Product, and triggers keep the index in sync on every insert,
+#     update and delete, whichever code path makes the write. Bulk imports
+#     pause the insert trigger and index each batch with one statement
+#     instead (bulk_indexing()), which is about twice as fast. Every search
+#     term is matched as a prefix, so "choc bar" finds "Chocolate Bar" and a
+#     partial barcode finds the product.
+#   - Pages use keyset pagination. Each page ends with an opaque cursor that
+#     holds the last row's sort value and ProductID, and the next page starts
+#     strictly after it. Page 1000 therefore costs the same index seek as
+#     page 1, where OFFSET would walk past every earlier row.
+#
+# Usage (from the backend directory):
+#   python catalog.py rebuild    - rebuild the search index from Product
+#   python catalog.py optimize   - merge the index segments
+
+import base64
+import json
+import re
+import sys
+from contextlib import contextmanager
+
+# --- Configuration ---
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+QUANTITY_RANGE_LIKELIHOOD = 0.01   # planner hint: share of products a quantity bound keeps
+
+# Sort key -> Product column. Every one is backed by an index (see schema.py).
+SORT_COLUMNS = {
+    'id': 'Product.ProductID',
+    'name': 'Product.ProductName',
+    'quantity': 'Product.QuantityInStock',
+    'price': 'Product.SalePrice',
+}
+
+LIST_COLUMNS = (
+    'ProductID', 'ProductName', 'Barcode', 'Description', 'QuantityInStock',
+    'ReorderLevel', 'SalePrice', 'PurchasePrice', 'SupplierID',
+)
+
+# --- Schema ---
+# prefix='2 3' adds prefix indexes for two- and three-character terms, the
+# most expensive prefixes to expand; longer ones are short range scans.
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS ProductSearch USING fts5(
+    ProductName, Description, Barcode,
+    content='Product', content_rowid='ProductID',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_search_product_insert AFTER INSERT ON Product
+BEGIN
+    INSERT INTO ProductSearch (rowid, ProductName, Description, Barcode)
+    VALUES (NEW.ProductID, NEW.ProductName, NEW.Description, NEW.Barcode);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_search_product_delete AFTER DELETE ON Product
+BEGIN
+    INSERT INTO ProductSearch (ProductSearch, rowid, ProductName, Description, Barcode)
+    VALUES ('delete', OLD.ProductID, OLD.ProductName, OLD.Description, OLD.Barcode);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_search_product_update
+AFTER UPDATE OF ProductName, Description, Barcode ON Product
+BEGIN
+    INSERT INTO ProductSearch (ProductSearch, rowid, ProductName, Description, Barcode)
+    VALUES ('delete', OLD.ProductID, OLD.ProductName, OLD.Description, OLD.Barcode);
+    INSERT INTO ProductSearch (rowid, ProductName, Description, Barcode)
+    VALUES (NEW.ProductID, NEW.ProductName, NEW.Description, NEW.Barcode);
+END;
+"""
+
+
+# Replaces the insert trigger with one that is skipped while SearchIndexPause
+# holds a row. Only bulk_indexing() writes that row, inside its caller's
+# transaction, so no other connection ever sees the trigger paused.
+BULK_INDEXING_SCHEMA = """
+CREATE TABLE IF NOT EXISTS SearchIndexPause (
+    Id INTEGER PRIMARY KEY CHECK (Id = 1)
+);
+
+DROP TRIGGER IF EXISTS trg_search_product_insert;
+
+CREATE TRIGGER trg_search_product_insert AFTER INSERT ON Product
+WHEN NOT EXISTS (SELECT 1 FROM SearchIndexPause)
+BEGIN
+    INSERT INTO ProductSearch (rowid, ProductName, Description, Barcode)
+    VALUES (NEW.ProductID, NEW.ProductName, NEW.Description, NEW.Barcode);
+END;
+"""
+
+INDEX_NEW_PRODUCTS_SQL = """
+    INSERT INTO ProductSearch (rowid, ProductName, Description, Barcode)
+    SELECT ProductID, ProductName, Description, Barcode FROM Product WHERE ProductID > ?
+"""
+
+
+def install(conn):
+    """
+    Creates the search index and its triggers if they are missing.
+    The first install indexes the existing products.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ProductSearch'"
+    ).fetchone()
+    conn.executescript(SCHEMA)
+    if exists is None:
+        rebuild(conn)
+
+
+def install_bulk_indexing(conn):
+    """Adds the pause switch to the search index's insert trigger."""
+    conn.executescript(BULK_INDEXING_SCHEMA)
+
+
+@contextmanager
+def bulk_indexing(conn):
+    """
+    Indexes the products inserted inside the block with one statement at its
+    end instead of one trigger run per row. Use it inside a write transaction;
+    if the block raises, the caller must roll back, which also lifts the pause.
+    """
+    last_id = conn.execute("SELECT IFNULL(MAX(ProductID), 0) FROM Product").fetchone()[0]
+    conn.execute("INSERT INTO SearchIndexPause (Id) VALUES (1)")
+    yield
+    conn.execute("DELETE FROM SearchIndexPause")
+    conn.execute(INDEX_NEW_PRODUCTS_SQL, (last_id,))
+
+
+def rebuild(conn):
+    """Rebuilds the whole search index from the Product table."""
+    conn.execute("INSERT INTO ProductSearch (ProductSearch) VALUES ('rebuild')")
+    conn.commit()
+
+
+def optimize(conn):
+    """Merges the index's segments into one (worth doing after a large import)."""
+    conn.execute("INSERT INTO ProductSearch (ProductSearch) VALUES ('optimize')")
+    conn.commit()
+
+
+# --- Query Building ---
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def match_expression(text):
+    """
+    Turns free text into a safe FTS5 query: every word becomes a quoted
+    prefix term, and all of them must match. FTS5 operators and punctuation
+    in the input are never interpreted.
+    """
+    terms = _TERM.findall(text)
+    if not terms:
+        raise ValueError("q must contain at least one letter or digit")
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def encode_cursor(sort_value, product_id):
+    raw = json.dumps([sort_value, product_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        sort_value, product_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(product_id, int):
+        raise ValueError("Invalid cursor")
+    return sort_value, product_id
+
+
+def _int_arg(args, name, minimum=None, maximum=None):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ValueError(f"{name} must be between {minimum} and {maximum}")
+    return value
+
+
+def parse_options(args):
+    """
+    Validates the listing query string. Raises ValueError with a
+    client-facing message when something is invalid.
+    """
+    sort = args.get('sort', 'id')
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_COLUMNS)}")
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be asc or desc")
+    q = args.get('q', '').strip()
+    return {
+        "q": match_expression(q) if q else None,
+        "sort": sort,
+        "order": order,
+        "limit": _int_arg(args, 'limit', 1, MAX_PAGE_SIZE) or DEFAULT_PAGE_SIZE,
+        "after": decode_cursor(args['after']) if args.get('after') else None,
+        "supplierId": _int_arg(args, 'supplierId'),
+        "lowStock": args.get('lowStock') in ('1', 'true'),
+        "minQuantity": _int_arg(args, 'minQuantity'),
+        "maxQuantity": _int_arg(args, 'maxQuantity'),
+    }
+
+
+def build_query(options):
+    """Returns (sql, params) for one page; it fetches one extra row to detect a next page."""
+    column = SORT_COLUMNS[options["sort"]]
+    if options["q"] and options["sort"] == 'id':
+        # FTS5 yields matches in rowid order, so LIMIT can stop early
+        # instead of sorting every match.
+        column = "ProductSearch.rowid"
+    direction = 'DESC' if options["order"] == 'desc' else 'ASC'
+    comparison = '<' if options["order"] == 'desc' else '>'
+
+    source = "Product"
+    clauses, params = [], []
+    if options["q"]:
+        source = "ProductSearch JOIN Product ON Product.ProductID = ProductSearch.rowid"
+        clauses.append("ProductSearch MATCH ?")
+        params.append(options["q"])
+    if options["supplierId"] is not None:
+        clauses.append("Product.SupplierID = ?")
+        params.append(options["supplierId"])
+    if options["lowStock"]:
+        # Same condition as the partial index idx_product_low_stock.
+        clauses.append("Product.QuantityInStock <= Product.ReorderLevel")
+    # Quantity bounds are range lookups on idx_product_quantity. Without the
+    # likelihood() hint SQLite scans the whole table in ProductID order for a
+    # one-sided bound, hoping LIMIT stops it early.
+    if options["minQuantity"] is not None:
+        clauses.append(f"likelihood(Product.QuantityInStock >= ?, {QUANTITY_RANGE_LIKELIHOOD})")
+        params.append(options["minQuantity"])
+    if options["maxQuantity"] is not None:
+        clauses.append(f"likelihood(Product.QuantityInStock <= ?, {QUANTITY_RANGE_LIKELIHOOD})")
+        params.append(options["maxQuantity"])
+
+    # Keyset: continue strictly after the (sort value, ProductID) of the last row.
+    if options["after"] is not None:
+        sort_value, product_id = options["after"]
+        if options["sort"] == 'id':
+            clauses.append(f"{column} {comparison} ?")
+            params.append(product_id)
+        else:
+            clauses.append(f"({column}, Product.ProductID) {comparison} (?, ?)")
+            params.extend((sort_value, product_id))
+
+    order_by = f"{column} {direction}"
+    if options["sort"] != 'id':
+        order_by += f", Product.ProductID {direction}"
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"""
+        SELECT {', '.join(f'Product.{name}' for name in LIST_COLUMNS)}
+        FROM {source}
+        {where}
+        ORDER BY {order_by}
+        LIMIT ?
+    """
+    params.append(options["limit"] + 1)
+    return sql, params
+
+
+def list_products(conn, options, fmt='rows'):
+    """
+    Returns one page: {"items": ..., "nextCursor": token or None, "limit": n}.
+    items is a list of objects, or columns plus arrays for fmt='columnar'
+    (see payload.py).
+    """
+    sql, params = build_query(options)
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    rows = cursor.execute(sql, params).fetchall()
+
+    limit = options["limit"]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        sort_index = LIST_COLUMNS.index(SORT_COLUMNS[options["sort"]].split('.')[1])
+        next_cursor = encode_cursor(last[sort_index], last[0])
+
+    if fmt == 'columnar':
+        items = {"columns": list(LIST_COLUMNS), "rows": rows, "count": len(rows)}
+    else:
+        items = [dict(zip(LIST_COLUMNS, row)) for row in rows]
+    return {"items": items, "nextCursor": next_cursor, "limit": limit}
+
+
+# --- Command Line Entry Point ---
+if __name__ == '__main__':
+    from db import STORES, get_db_connection, release_db_connection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ('rebuild', 'optimize'):
+        print("Usage: python catalog.py rebuild|optimize")
+        sys.exit(2)
+
+    for store in STORES:
+        conn = get_db_connection(store, readonly=False)
+        try:
+            if command == 'rebuild':
+                rebuild(conn)
+                print(f"[{store}] Search index rebuilt.")
+            else:
+                optimize(conn)
+                print(f"[{store}] Search index optimized.")
+        finally:
+            release_db_connection(conn)
@@ -0,0 +1,39 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Dashboard Bundle
+# ==============================================================================
+#
+# The dashboard used to make three requests per page view (recent sales, low
+# stock and KPIs): three pooled connections, five queries, and three lists
+# that could each describe a different moment if a sale committed between
+# them. /api/dashboard returns all three in one response instead:
+#
+#   - Every dashboard query runs on one connection inside one read
+#     transaction, so the KPIs, the low stock list and the recent sales come
+#     from the same WAL snapshot.
+#   - The response is cached like the individual endpoints (see cache.py),
+#     and concurrent identical requests are coalesced into one run.
+#   - With store=all, each shard is read the same way in parallel and the
+#     results are summed and merged (see shards.py).
+
+import kpi
+import payload
+from db import read_transaction
+
+# --- Queries ---
+# The same queries as the individual endpoints in app.py.
+LOW_STOCK_SQL = "SELECT * FROM Product WHERE QuantityInStock <= ReorderLevel ORDER BY QuantityInStock ASC"
+RECENT_SALES_SQL = "SELECT * FROM Sale ORDER BY SaleDate DESC LIMIT 5"
+RECENT_SALES_LIMIT = 5
+
+
+def read_bundle(conn, fmt='rows'):
+    """
+    Returns {"kpis", "lowStock", "recentSales"} read in one transaction.
+    The lists are row objects, or columns plus arrays for fmt='columnar'.
+    """
+    with read_transaction(conn):
+        return {
+            "kpis": kpi.read_dashboard(conn),
+            "lowStock": payload.fetch_list(conn, LOW_STOCK_SQL, fmt=fmt),
+            "recentSales": payload.fetch_list(conn, RECENT_SALES_SQL, fmt=fmt),
+        }
@@ -0,0 +1,404 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Database Connection Layer
+# ==============================================================================
+#
+# Every API route used to open a brand new sqlite3 connection and close it
+# again in its `finally` block. That pays for the file open, the schema parse
+# and a cold page cache on every single request.
+#
+# This module keeps a small pool of already-configured connections instead.
+# A route checks a connection out, uses it on its own thread for the length
+# of the request and hands it back. The pragmas and the statement cache are
+# applied once, when the connection is created, so warm connections keep
+# their page cache and their prepared statements between requests.
+#
+# Connections are instrumented: every statement's duration, row count and
+# errors, and (through SQLite's progress handler) the VM work it does, are
+# recorded per statement for the /api/metrics endpoint (see metrics.py), and
+# statements slower than the slow-query threshold are logged with their query
+# plan (see slowlog.py).
+#
+# Each store has its own database file (a shard), with its own pool, so one
+# store's writes never queue behind another's. The store a request works on
+# is held in a context variable that the API sets from the request, and
+# get_db_connection() hands out connections for that store (see shards.py
+# for the cross-store reads).
+#
+# Reads and writes use separate pools. GET requests are routed to read-only
+# connections (opened with mode=ro and query_only), which under WAL read a
+# snapshot and never take a write lock, so a report neither waits for an
+# insert nor holds one up. Writes go through each store's single writer
+# connection (see writer.py).
+
+import contextvars
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from urllib.request import pathname2url
+import threading
+import time
+
+import metrics
+from slowlog import slow_queries
+
+# --- Configuration ---
+# 1. The one database path used by the whole API. It can be overridden with
+#    the TRACKWISE_DATABASE environment variable; relative paths are resolved
+#    against the backend directory so the app works from any working directory.
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE = os.path.join(BASE_DIR, os.environ.get('TRACKWISE_DATABASE', 'trackwise.db'))
+
+# 2. Pragmas applied to every new connection.
+#    - WAL lets readers keep going while a writer commits.
+#    - synchronous=NORMAL is durable with WAL and avoids an fsync per commit.
+#    - cache_size is negative, so it is in KiB (64 MiB here).
+#    - mmap_size lets SQLite read pages straight from the OS page cache.
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('cache_size', -64000),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+)
+
+#    Read-only connections cannot change the journal mode (the database is
+#    already in WAL), and query_only makes any write fail immediately.
+READ_ONLY_PRAGMAS = tuple(p for p in PRAGMAS if p[0] != 'journal_mode') + (('query_only', 'ON'),)
+
+# 3. Number of prepared statements each connection keeps cached.
+STATEMENT_CACHE_SIZE = 256
+
+# 4. Maximum number of idle connections kept around for reuse.
+MAX_IDLE_CONNECTIONS = 16
+
+# 5. Store shards. TRACKWISE_STORES lists the store keys, each optionally
+#    with its database path: "north,south" or "north=/data/north.db,south".
+#    A store without a path lives in STORE_DIR as <key>.db. Without the
+#    variable there is one store, 'main', at DATABASE. TRACKWISE_STORE picks
+#    the store used when a request (or a command-line tool) names none.
+STORE_DIR = os.path.join(BASE_DIR, os.environ.get('TRACKWISE_STORE_DIR', 'stores'))
+ALL_STORES = 'all'   # reserved key: the cross-store views fan out to every store
+_STORE_KEY = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+
+
+def _parse_stores(spec):
+    """Parses TRACKWISE_STORES into an ordered {store key: database path} dict."""
+    stores = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        key, _, path = item.partition('=')
+        key = key.strip()
+        if not _STORE_KEY.match(key) or key == ALL_STORES:
+            raise ValueError(f"Invalid store key in TRACKWISE_STORES: {key!r}")
+        stores[key] = os.path.join(BASE_DIR, path.strip()) if path.strip() else os.path.join(STORE_DIR, f"{key}.db")
+    return stores or {'main': DATABASE}
+
+
+STORES = _parse_stores(os.environ.get('TRACKWISE_STORES', ''))
+DEFAULT_STORE = os.environ.get('TRACKWISE_STORE') or next(iter(STORES))
+if DEFAULT_STORE not in STORES:
+    raise ValueError(f"TRACKWISE_STORE {DEFAULT_STORE!r} is not one of TRACKWISE_STORES")
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    A cursor that records each statement's duration, rows and errors, and
+    reports statements slower than the slow-query threshold (see slowlog.py).
+    """
+
+    statement = None
+    _elapsed = 0.0
+    _rows = 0
+    _slow = None
+
+    def _observe(self, method, sql, parameters):
+        label = metrics.statement_label(sql)
+        self.statement = self.connection.statement = label
+        started = time.perf_counter()
+        try:
+            method(sql, parameters)
+        except Exception:
+            metrics.observe_sql(label, time.perf_counter() - started, 0, failed=True)
+            raise
+        elapsed = time.perf_counter() - started
+        # rowcount is the number of changed rows for writes, -1 for queries.
+        metrics.observe_sql(label, elapsed, self.rowcount)
+
+        self._sql, self._parameters, self._elapsed, self._rows, self._slow = sql, parameters, 0.0, 0, None
+        self._track(elapsed, max(self.rowcount, 0))
+        return self
+
+    def _track(self, seconds, rows):
+        """Adds execute/fetch time to the current statement's slow-query check."""
+        self._elapsed += seconds
+        self._rows += rows
+        if self._slow is not None:
+            slow_queries.extend(self._slow, seconds, rows)
+        elif self._elapsed >= slow_queries.threshold:
+            self._slow = slow_queries.record(self.connection, self.statement, self._sql,
+                                             self._parameters, self._elapsed, self._rows)
+
+    def execute(self, sql, parameters=()):
+        return self._observe(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        # Always an iterator, so the slow-query log describes it as 'many'
+        # rather than listing one shape per parameter set.
+        return self._observe(super().executemany, sql, iter(seq_of_parameters))
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        rows = 0 if row is None else 1
+        metrics.observe_rows(self.statement, rows)
+        if self.statement is not None:
+            self._track(time.perf_counter() - started, rows)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        metrics.observe_rows(self.statement, len(rows))
+        if self.statement is not None:
+            self._track(time.perf_counter() - started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        metrics.observe_rows(self.statement, len(rows))
+        if self.statement is not None:
+            self._track(time.perf_counter() - started, len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    A connection whose cursors (including the ones behind the execute()
+    shortcuts) are InstrumentedCursors.
+    """
+
+    statement = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def _progress(self):
+        # Called every metrics.PROGRESS_OPCODES VM instructions; 0 = carry on.
+        metrics.observe_vm_progress(self.statement)
+        return 0
+
+
+class ConnectionManager:
+    """
+    A thread-safe pool of tuned SQLite connections.
+
+    A connection is only ever used by one thread at a time: it is bound to
+    the thread that checked it out until it is released. Released connections
+    are kept (most recently used first) so the next request gets a warm one.
+    """
+
+    def __init__(self, database=DATABASE, max_idle=MAX_IDLE_CONNECTIONS, store=None, readonly=False):
+        self.database = database
+        self.store = store
+        self.readonly = readonly
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._pid = os.getpid()
+        self._inherited = []
+        self._stats = {
+            "created": 0,
+            "reused": 0,
+            "released": 0,
+            "discarded": 0,
+        }
+
+    def _create_connection(self):
+        """Opens a new connection and applies the pragmas and row factory."""
+        if self.readonly:
+            # A URI, so SQLite itself refuses to write through it.
+            target, pragmas = f"file:{pathname2url(self.database)}?mode=ro", READ_ONLY_PRAGMAS
+        else:
+            # A new store's shard is created on first use.
+            os.makedirs(os.path.dirname(self.database), exist_ok=True)
+            target, pragmas = self.database, PRAGMAS
+        conn = sqlite3.connect(
+            target,
+            uri=self.readonly,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            # The pool hands connections across threads, but never shares one
+            # between two threads at the same time.
+            check_same_thread=False,
+            factory=InstrumentedConnection,
+        )
+        conn.row_factory = sqlite3.Row
+        # Remember where the connection belongs, for release and per-store state.
+        conn.manager = self
+        conn.store = self.store
+        conn.set_progress_handler(conn._progress, metrics.PROGRESS_OPCODES)
+        for name, value in pragmas:
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _forget_inherited(self):
+        # After a fork, the idle connections belong to the parent. They are
+        # kept but never used or closed: closing one here could checkpoint
+        # or remove the parent's WAL and drop its locks. The caller holds
+        # the lock.
+        self._inherited.extend(self._idle)
+        self._idle = []
+        self._in_use = 0
+        self._pid = os.getpid()
+
+    def acquire(self):
+        """Checks out a connection, reusing an idle one when available."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._forget_inherited()
+            self._in_use += 1
+            if self._idle:
+                self._stats["reused"] += 1
+                return self._idle.pop()
+            self._stats["created"] += 1
+        try:
+            return self._create_connection()
+        except Exception:
+            with self._lock:
+                self._in_use -= 1
+            raise
+
+    def release(self, conn):
+        """
+        Returns a connection to the pool.
+        Any transaction left open by the caller is rolled back first, so the
+        next user always starts from a clean state.
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # A broken connection is not worth keeping.
+            with self._lock:
+                self._in_use -= 1
+                self._stats["discarded"] += 1
+            conn.close()
+            return
+
+        with self._lock:
+            self._in_use -= 1
+            self._stats["released"] += 1
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+            self._stats["discarded"] += 1
+        conn.close()
+
+    def close_all(self):
+        """Closes every idle connection (used at shutdown and in tools)."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        """Returns a snapshot of the pool statistics."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["idle"] = len(self._idle)
+            snapshot["inUse"] = self._in_use
+        snapshot["database"] = self.database
+        snapshot["readOnly"] = self.readonly
+        snapshot["maxIdle"] = self.max_idle
+        return snapshot
+
+
+class PerStore:
+    """
+    One instance of a per-store service (writer, index, broadcaster, ...)
+    for each store, created by factory(store) on first use.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._instances = {}
+        self._lock = threading.Lock()
+
+    def get(self, store=None):
+        """Returns the instance for a store (default: the current store)."""
+        store = store or current_store.get()
+        instance = self._instances.get(store)
+        if instance is None:
+            if store not in STORES:
+                raise KeyError(f"Unknown store: {store}")
+            with self._lock:
+                instance = self._instances.get(store)
+                if instance is None:
+                    instance = self._instances[store] = self.factory(store)
+        return instance
+
+    def items(self):
+        """Returns (store, instance) for every configured store."""
+        return [(store, self.get(store)) for store in STORES]
+
+
+# --- Shared Instances ---
+# Two managers per store, one read-write and one read-only; `pool` is the
+# default store's read-write manager.
+pools = {store: ConnectionManager(path, store=store) for store, path in STORES.items()}
+read_pools = {store: ConnectionManager(path, store=store, readonly=True) for store, path in STORES.items()}
+pool = pools[DEFAULT_STORE]
+
+# The store the current request works on. The API sets it per request; in
+# threads that never set it (tools, background workers) it is DEFAULT_STORE.
+current_store = contextvars.ContextVar('trackwise_store', default=DEFAULT_STORE)
+
+# Whether the current request only reads. The API sets it for GET requests;
+# everywhere else connections are read-write unless asked otherwise.
+read_only = contextvars.ContextVar('trackwise_read_only', default=False)
+
+
+def pool_for(store=None, readonly=None):
+    """
+    Returns a store's connection manager (default: the current store), the
+    read-only one for read-only requests or when readonly=True.
+    """
+    if readonly is None:
+        readonly = read_only.get()
+    return (read_pools if readonly else pools)[store or current_store.get()]
+
+
+def get_db_connection(store=None, readonly=None):
+    """
+    Checks a tuned connection out of a store's pool (default: the current
+    store; read-only for GET requests). Rows are returned as sqlite3.Row
+    objects, so columns can be accessed by name. Always hand the connection
+    back with release_db_connection().
+    """
+    return pool_for(store, readonly).acquire()
+
+
+def release_db_connection(conn):
+    """Returns a connection obtained from get_db_connection() to its pool."""
+    conn.manager.release(conn)
+
+
+@contextmanager
+def read_transaction(conn):
+    """
+    Runs several reads in one transaction, so they all see the same WAL
+    snapshot however many writes commit in between.
+    """
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.rollback()
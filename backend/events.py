@@ -0,0 +1,259 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Dashboard Change Feed (SSE)
+# ==============================================================================
+#
+# Open dashboards used to poll three endpoints to stay fresh, so the database
+# work grew with the number of open browser tabs. Instead, dashboards can
+# subscribe to a Server-Sent Events stream that pushes deltas:
+#
+#   - Triggers append a row to the ChangeFeed table whenever a sale is
+#     recorded, a product is added or a product's stock changes, whichever
+#     code path (or process) made the write.
+#   - One broadcaster thread watches `PRAGMA data_version` (a per-connection
+#     counter that moves when another connection commits), reads the new
+#     ChangeFeed rows, builds one delta for the whole batch and puts it on
+#     every subscriber's queue.
+#
+# The database work per change is therefore the same for one dashboard or a
+# hundred; subscribers only cost a queue each.
+#
+# The feed keeps the newest RETAIN_CHANGES rows, which is plenty for the
+# broadcasters and the barcode indexes (barcodes.py) to catch up. The writer
+# thread (writer.py) prunes it every PRUNE_EVERY_WRITES writes, so it stays
+# short whether or not any dashboard is open. Each store has its own
+# broadcaster, and a dashboard subscribes to its store's.
+
+import json
+import queue
+import threading
+import time
+
+import kpi
+from db import PerStore, get_db_connection, release_db_connection
+
+# --- Configuration ---
+POLL_INTERVAL_SECONDS = 0.25  # how often the broadcaster checks data_version
+HEARTBEAT_SECONDS = 15        # comment line sent to idle subscribers
+SUBSCRIBER_QUEUE_SIZE = 100   # a subscriber this far behind is disconnected
+MAX_CHANGES_PER_BATCH = 1000
+RETAIN_CHANGES = 10000        # older ChangeFeed rows are pruned
+PRUNE_EVERY_WRITES = 1000     # how often the writer prunes the feed
+
+# --- Schema ---
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ChangeFeed (
+    ChangeID INTEGER PRIMARY KEY AUTOINCREMENT,
+    Kind TEXT NOT NULL,
+    EntityID INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_feed_sale_insert AFTER INSERT ON Sale
+BEGIN
+    INSERT INTO ChangeFeed (Kind, EntityID) VALUES ('sale.recorded', NEW.SaleID);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_feed_product_insert AFTER INSERT ON Product
+BEGIN
+    INSERT INTO ChangeFeed (Kind, EntityID) VALUES ('product.added', NEW.ProductID);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_feed_product_stock
+AFTER UPDATE OF QuantityInStock, ReorderLevel ON Product
+WHEN OLD.QuantityInStock IS NOT NEW.QuantityInStock OR OLD.ReorderLevel IS NOT NEW.ReorderLevel
+BEGIN
+    INSERT INTO ChangeFeed (Kind, EntityID) VALUES ('stock.changed', NEW.ProductID);
+END;
+"""
+
+
+def install(conn):
+    """Creates the ChangeFeed table and its triggers if they are missing."""
+    conn.executescript(SCHEMA)
+
+
+def prune(conn):
+    """
+    Deletes the ChangeFeed rows older than the newest RETAIN_CHANGES.
+    Returns the number of rows deleted; the caller commits.
+    """
+    return conn.execute(
+        "DELETE FROM ChangeFeed WHERE ChangeID <= "
+        "IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'ChangeFeed'), 0) - ?",
+        (RETAIN_CHANGES,)
+    ).rowcount
+
+
+def _placeholders(values):
+    return ', '.join('?' for _ in values)
+
+
+def build_delta(conn, changes):
+    """
+    Turns a batch of ChangeFeed rows into one delta for the dashboards:
+    the new sales, the added or changed products (with their low-stock state)
+    and the current KPI totals.
+    """
+    sale_ids = sorted({entity for kind, entity in changes if kind == 'sale.recorded'})
+    product_ids = sorted({entity for kind, entity in changes if kind != 'sale.recorded'})
+
+    delta = {"kinds": sorted({kind for kind, _ in changes})}
+    if sale_ids:
+        rows = conn.execute(
+            f"SELECT * FROM Sale WHERE SaleID IN ({_placeholders(sale_ids)}) ORDER BY SaleID",
+            sale_ids
+        )
+        delta["sales"] = [dict(row) for row in rows]
+    if product_ids:
+        rows = conn.execute(
+            f"""SELECT ProductID, ProductName, QuantityInStock, ReorderLevel,
+                       QuantityInStock <= ReorderLevel AS LowStock
+                FROM Product WHERE ProductID IN ({_placeholders(product_ids)})""",
+            product_ids
+        )
+        delta["products"] = [dict(row, LowStock=bool(row['LowStock'])) for row in rows]
+    delta["kpis"] = kpi.read_dashboard(conn)
+    return delta
+
+
+class ChangeBroadcaster:
+    """
+    Reads the change feed on a single thread and fans each delta out to all
+    subscribers. The thread starts with the first subscriber.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._last_change_id = None
+        self._stats = {"batches": 0, "changes": 0, "dropped": 0}
+
+    # --- Subscriptions ---
+
+    def subscribe(self):
+        """Registers a new subscriber and returns its queue."""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"trackwise-events-{self.store}",
+                                                daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["subscribers"] = len(self._subscribers)
+            snapshot["lastChangeId"] = self._last_change_id
+        return snapshot
+
+    def _publish(self, message):
+        """Puts a message on every subscriber's queue, dropping any that lag."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # The client stopped reading; it will reconnect and reload.
+                self.unsubscribe(subscriber)
+                # Make room for the sentinel that wakes the stream so it can end.
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(None)
+                with self._lock:
+                    self._stats["dropped"] += 1
+
+    # --- Broadcaster Thread ---
+
+    def _run(self):
+        conn = get_db_connection(self.store, readonly=True)
+        try:
+            # Start from the current end of the feed: subscribers get changes
+            # made after they connected, and load the current state normally.
+            self._last_change_id = conn.execute("SELECT IFNULL(MAX(ChangeID), 0) FROM ChangeFeed").fetchone()[0]
+            data_version = None
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+
+                # 1. data_version only moves when another connection commits.
+                current = conn.execute("PRAGMA data_version").fetchone()[0]
+                if current != data_version:
+                    data_version = current
+                    self._drain(conn)
+
+                time.sleep(POLL_INTERVAL_SECONDS)
+        except Exception as e:
+            print(f"Change feed error: {e}")
+            with self._lock:
+                self._thread = None
+        finally:
+            release_db_connection(conn)
+
+    def _drain(self, conn):
+        """Publishes every change after the last one seen, one batch at a time."""
+        while True:
+            rows = conn.execute(
+                "SELECT ChangeID, Kind, EntityID FROM ChangeFeed WHERE ChangeID > ? ORDER BY ChangeID LIMIT ?",
+                (self._last_change_id, MAX_CHANGES_PER_BATCH)
+            ).fetchall()
+            if not rows:
+                return
+
+            # 2. One delta (one set of queries) per batch, whatever the audience.
+            delta = build_delta(conn, [(row['Kind'], row['EntityID']) for row in rows])
+            self._last_change_id = rows[-1]['ChangeID']
+            self._publish(format_event("delta", delta, event_id=self._last_change_id))
+            with self._lock:
+                self._stats["batches"] += 1
+                self._stats["changes"] += len(rows)
+
+            if len(rows) < MAX_CHANGES_PER_BATCH:
+                return
+
+
+def format_event(event, data, event_id=None):
+    """Formats one Server-Sent Event."""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def stream(broadcaster):
+    """
+    Generator for one SSE response: yields queued deltas, plus a heartbeat
+    comment when nothing has happened for HEARTBEAT_SECONDS.
+    """
+    subscriber = broadcaster.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                message = subscriber.get(timeout=HEARTBEAT_SECONDS)
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                return
+            yield message
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+# --- Shared Instances ---
+# One feed reader per store; broadcasters.get() is the current store's.
+broadcasters = PerStore(ChangeBroadcaster)
@@ -0,0 +1,118 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Streaming Table Export
+# ==============================================================================
+#
+# The list endpoints fetch every row with fetchall() and build one big JSON
+# document, which keeps the whole result set in memory twice. The export
+# endpoints are meant for full-table pulls (e.g. the nightly warehouse load),
+# so they stream instead:
+#
+#   - rows are read with keyset pagination (`WHERE id > ? ORDER BY id LIMIT ?`),
+#     which stays fast however deep into the table the export is;
+#   - every page is serialized to NDJSON or CSV and yielded straight to the
+#     client, so memory use is bounded by the page size, not the table size;
+#   - the pages are read inside one read transaction, so the export is a
+#     consistent snapshot. Under WAL this never blocks writers;
+#   - the sales export includes the months moved to archive files: the hot
+#     table and every archive are read by SaleID and merged (see archive.py).
+
+import csv
+import io
+import itertools
+import json
+
+import archive
+
+# --- Exportable Tables ---
+# Public dataset name -> (table, integer primary key used as the keyset cursor).
+DATASETS = {
+    'products': ('Product', 'ProductID'),
+    'sales': ('Sale', 'SaleID'),
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+PAGE_SIZE = 1000
+
+
+def page_sql(dataset):
+    """Returns the keyset pagination query for a dataset."""
+    table, key = DATASETS[dataset]
+    return f"SELECT * FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?"
+
+
+def iter_pages(conn, dataset, after=0, page_size=PAGE_SIZE):
+    """
+    Yields (column names, rows) one page at a time, starting after the given key.
+    Rows are plain tuples; the keyset cursor is taken from each page's last row.
+    """
+    conn.execute("BEGIN")
+    try:
+        if dataset == 'sales':
+            yield from _sales_pages(conn, after, page_size)
+        else:
+            yield from _table_pages(conn, dataset, after, page_size)
+    finally:
+        conn.rollback()
+
+
+def _sales_pages(conn, after, page_size):
+    """Pages of the hot and archived sales, merged in SaleID order."""
+    columns = list(archive.SALE_COLUMNS)
+    rows = archive.iter_sales(conn, after, page_size)
+    while True:
+        page = list(itertools.islice(rows, page_size))
+        if not page:
+            break
+        yield columns, page
+
+
+def _table_pages(conn, dataset, after, page_size):
+    """Pages of one table, read with the keyset query."""
+    sql = page_sql(dataset)
+    key_index = None
+    while True:
+        cursor = conn.cursor()
+        cursor.row_factory = None  # tuples are cheaper than sqlite3.Row here
+        rows = cursor.execute(sql, (after, page_size)).fetchall()
+        if not rows:
+            break
+
+        columns = [description[0] for description in cursor.description]
+        if key_index is None:
+            key_index = columns.index(DATASETS[dataset][1])
+        yield columns, rows
+
+        after = rows[-1][key_index]
+        if len(rows) < page_size:
+            break
+
+
+def stream_ndjson(pages):
+    """Serializes pages as newline-delimited JSON objects."""
+    for columns, rows in pages:
+        yield ''.join(json.dumps(dict(zip(columns, row))) + '\n' for row in rows)
+
+
+def stream_csv(pages):
+    """Serializes pages as CSV, with a header row before the first page."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    header_written = False
+    for columns, rows in pages:
+        if not header_written:
+            writer.writerow(columns)
+            header_written = True
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def stream_export(conn, dataset, fmt, after=0):
+    """Returns a generator of response chunks for the requested dataset and format."""
+    pages = iter_pages(conn, dataset, after)
+    return stream_ndjson(pages) if fmt == 'ndjson' else stream_csv(pages)
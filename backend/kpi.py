@@ -0,0 +1,274 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Materialized Dashboard KPIs
+# ==============================================================================
+#
+# The dashboard KPIs used to be three aggregates over the full Sale and
+# Product tables on every request. Instead, the totals are now kept in two
+# small summary tables that SQLite triggers update whenever Product or Sale
+# rows change, whichever code path writes them:
+#
+#   KpiTotals  - a single row with the stock quantity and inventory value.
+#   SalesDaily - one bucket per calendar day with the sale count, items sold
+#                and revenue.
+#
+# Reading the dashboard is then two primary-key lookups.
+#
+# Sales moved to the monthly archives (see archive.py) stay counted, and the
+# from-scratch aggregates below read the archives as well as the hot table.
+#
+# Usage (from the backend directory):
+#   python kpi.py rebuild   - recompute every total from scratch
+#   python kpi.py verify    - compare the stored totals with a fresh computation
+
+import sys
+
+import archive
+
+# Money totals are REAL sums maintained incrementally; allow for float drift.
+TOLERANCE = 0.005
+
+# --- Schema ---
+# Every statement is idempotent so install() can run on every startup.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS KpiTotals (
+    Id INTEGER PRIMARY KEY CHECK (Id = 1),
+    TotalItemsInStock INTEGER NOT NULL DEFAULT 0,
+    TotalInventoryValue REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS SalesDaily (
+    SaleDay TEXT PRIMARY KEY,
+    SaleCount INTEGER NOT NULL DEFAULT 0,
+    ItemsSold INTEGER NOT NULL DEFAULT 0,
+    TotalAmount REAL NOT NULL DEFAULT 0
+);
+
+-- Product triggers keep the stock quantity and inventory value current.
+CREATE TRIGGER IF NOT EXISTS trg_kpi_product_insert AFTER INSERT ON Product
+BEGIN
+    UPDATE KpiTotals
+    SET TotalItemsInStock = TotalItemsInStock + IFNULL(NEW.QuantityInStock, 0),
+        TotalInventoryValue = TotalInventoryValue + IFNULL(NEW.PurchasePrice * NEW.QuantityInStock, 0)
+    WHERE Id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_kpi_product_update
+AFTER UPDATE OF QuantityInStock, PurchasePrice ON Product
+BEGIN
+    UPDATE KpiTotals
+    SET TotalItemsInStock = TotalItemsInStock
+            - IFNULL(OLD.QuantityInStock, 0) + IFNULL(NEW.QuantityInStock, 0),
+        TotalInventoryValue = TotalInventoryValue
+            - IFNULL(OLD.PurchasePrice * OLD.QuantityInStock, 0)
+            + IFNULL(NEW.PurchasePrice * NEW.QuantityInStock, 0)
+    WHERE Id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_kpi_product_delete AFTER DELETE ON Product
+BEGIN
+    UPDATE KpiTotals
+    SET TotalItemsInStock = TotalItemsInStock - IFNULL(OLD.QuantityInStock, 0),
+        TotalInventoryValue = TotalInventoryValue - IFNULL(OLD.PurchasePrice * OLD.QuantityInStock, 0)
+    WHERE Id = 1;
+END;
+
+-- Sale triggers keep one revenue bucket per day.
+CREATE TRIGGER IF NOT EXISTS trg_kpi_sale_insert AFTER INSERT ON Sale
+WHEN date(NEW.SaleDate) IS NOT NULL
+BEGIN
+    INSERT INTO SalesDaily (SaleDay, SaleCount, ItemsSold, TotalAmount)
+    VALUES (date(NEW.SaleDate), 1, IFNULL(NEW.Quantity, 0), IFNULL(NEW.TotalAmount, 0))
+    ON CONFLICT (SaleDay) DO UPDATE
+    SET SaleCount = SaleCount + 1,
+        ItemsSold = ItemsSold + excluded.ItemsSold,
+        TotalAmount = TotalAmount + excluded.TotalAmount;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_kpi_sale_update
+AFTER UPDATE OF SaleDate, Quantity, TotalAmount ON Sale
+BEGIN
+    UPDATE SalesDaily
+    SET SaleCount = SaleCount - 1,
+        ItemsSold = ItemsSold - IFNULL(OLD.Quantity, 0),
+        TotalAmount = TotalAmount - IFNULL(OLD.TotalAmount, 0)
+    WHERE SaleDay = date(OLD.SaleDate);
+
+    INSERT INTO SalesDaily (SaleDay, SaleCount, ItemsSold, TotalAmount)
+    SELECT date(NEW.SaleDate), 1, IFNULL(NEW.Quantity, 0), IFNULL(NEW.TotalAmount, 0)
+    WHERE date(NEW.SaleDate) IS NOT NULL
+    ON CONFLICT (SaleDay) DO UPDATE
+    SET SaleCount = SaleCount + 1,
+        ItemsSold = ItemsSold + excluded.ItemsSold,
+        TotalAmount = TotalAmount + excluded.TotalAmount;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_kpi_sale_delete AFTER DELETE ON Sale
+BEGIN
+    UPDATE SalesDaily
+    SET SaleCount = SaleCount - 1,
+        ItemsSold = ItemsSold - IFNULL(OLD.Quantity, 0),
+        TotalAmount = TotalAmount - IFNULL(OLD.TotalAmount, 0)
+    WHERE SaleDay = date(OLD.SaleDate);
+END;
+"""
+
+# Sales moved to an archive stay counted: the archiver sets ArchiveInProgress
+# (see archive.py) for the duration of its delete.
+ARCHIVE_GUARD_SCHEMA = """
+DROP TRIGGER IF EXISTS trg_kpi_sale_delete;
+CREATE TRIGGER trg_kpi_sale_delete AFTER DELETE ON Sale
+WHEN NOT EXISTS (SELECT 1 FROM ArchiveInProgress)
+BEGIN
+    UPDATE SalesDaily
+    SET SaleCount = SaleCount - 1,
+        ItemsSold = ItemsSold - IFNULL(OLD.Quantity, 0),
+        TotalAmount = TotalAmount - IFNULL(OLD.TotalAmount, 0)
+    WHERE SaleDay = date(OLD.SaleDate);
+END;
+"""
+
+# --- From-scratch aggregates (used by rebuild and verify) ---
+TOTALS_SQL = """
+    SELECT IFNULL(SUM(QuantityInStock), 0), IFNULL(SUM(PurchasePrice * QuantityInStock), 0)
+    FROM Product
+"""
+
+DAILY_SQL = """
+    SELECT date(SaleDate) AS SaleDay, COUNT(*), IFNULL(SUM(Quantity), 0), IFNULL(SUM(TotalAmount), 0)
+    FROM Sale
+    WHERE date(SaleDate) IS NOT NULL
+    GROUP BY SaleDay
+"""
+
+# Adds an archive's buckets to those already computed from the hot table.
+MERGE_DAILY_SQL = """
+    INSERT INTO SalesDaily (SaleDay, SaleCount, ItemsSold, TotalAmount) VALUES (?, ?, ?, ?)
+    ON CONFLICT (SaleDay) DO UPDATE
+    SET SaleCount = SaleCount + excluded.SaleCount,
+        ItemsSold = ItemsSold + excluded.ItemsSold,
+        TotalAmount = TotalAmount + excluded.TotalAmount
+"""
+
+
+def install(conn):
+    """
+    Creates the summary tables and triggers if they are missing.
+    The first install backfills the totals from the existing data.
+    """
+    conn.executescript(SCHEMA)
+    if conn.execute("SELECT 1 FROM KpiTotals WHERE Id = 1").fetchone() is None:
+        rebuild(conn)
+
+
+def install_archive_guard(conn):
+    """Makes the Sale delete trigger skip rows the archiver is moving."""
+    conn.executescript(ARCHIVE_GUARD_SCHEMA)
+
+
+def rebuild(conn):
+    """
+    Recomputes every KPI total from the Product and Sale tables and the
+    archived sales. Runs in a single write transaction so readers never see
+    a half-built state.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        items, value = conn.execute(TOTALS_SQL).fetchone()
+        conn.execute(
+            "INSERT OR REPLACE INTO KpiTotals (Id, TotalItemsInStock, TotalInventoryValue) VALUES (1, ?, ?)",
+            (items, value)
+        )
+        conn.execute("DELETE FROM SalesDaily")
+        conn.execute(f"INSERT INTO SalesDaily (SaleDay, SaleCount, ItemsSold, TotalAmount) {DAILY_SQL}")
+        conn.executemany(MERGE_DAILY_SQL, archive.query_archives(conn, DAILY_SQL))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def verify(conn):
+    """
+    Compares the stored totals against a fresh computation.
+    Returns a list of human-readable mismatches (empty when everything agrees).
+    """
+    problems = []
+
+    # 1. Stock quantity and inventory value.
+    items, value = conn.execute(TOTALS_SQL).fetchone()
+    stored = conn.execute(
+        "SELECT TotalItemsInStock, TotalInventoryValue FROM KpiTotals WHERE Id = 1"
+    ).fetchone()
+    if stored is None:
+        return ["KpiTotals row is missing"]
+    if stored[0] != items:
+        problems.append(f"TotalItemsInStock: stored {stored[0]}, actual {items}")
+    if abs(stored[1] - value) > TOLERANCE:
+        problems.append(f"TotalInventoryValue: stored {stored[1]}, actual {value}")
+
+    # 2. Daily sales buckets. Buckets emptied by deletes are stored as zeros.
+    actual = {day: (count, items, amount) for day, count, items, amount in conn.execute(DAILY_SQL)}
+    for day, count, items, amount in archive.query_archives(conn, DAILY_SQL):
+        hot_count, hot_items, hot_amount = actual.get(day, (0, 0, 0.0))
+        actual[day] = (hot_count + count, hot_items + items, hot_amount + amount)
+    stored_rows = conn.execute("SELECT SaleDay, SaleCount, ItemsSold, TotalAmount FROM SalesDaily")
+    for day, count, items, amount in stored_rows:
+        expected_count, expected_items, expected_amount = actual.pop(day, (0, 0, 0.0))
+        if (count, items) != (expected_count, expected_items) or abs(amount - expected_amount) > TOLERANCE:
+            problems.append(
+                f"SalesDaily {day}: stored ({count}, {items}, {amount}), "
+                f"actual ({expected_count}, {expected_items}, {expected_amount})"
+            )
+    for day, (count, items, amount) in actual.items():
+        problems.append(f"SalesDaily {day}: missing, actual ({count}, {items}, {amount})")
+
+    return problems
+
+
+def read_dashboard(conn):
+    """
+    Returns the dashboard KPIs from the summary tables (two key lookups).
+    """
+    totals = conn.execute(
+        "SELECT TotalItemsInStock, TotalInventoryValue FROM KpiTotals WHERE Id = 1"
+    ).fetchone()
+    today = conn.execute(
+        "SELECT TotalAmount FROM SalesDaily WHERE SaleDay = date('now')"
+    ).fetchone()
+
+    total_items_in_stock, total_inventory_value = totals if totals else (0, 0.0)
+    total_sales_today = today[0] if today else 0.0
+    return {
+        "totalSalesToday": round(total_sales_today, 2),
+        "totalItemsInStock": total_items_in_stock,
+        "totalInventoryValue": round(total_inventory_value, 2)
+    }
+
+
+# --- Command Line Entry Point ---
+if __name__ == '__main__':
+    from db import STORES, get_db_connection, release_db_connection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ('rebuild', 'verify'):
+        print("Usage: python kpi.py rebuild|verify")
+        sys.exit(2)
+
+    failed = False
+    for store in STORES:
+        conn = get_db_connection(store, readonly=False)
+        try:
+            install(conn)
+            if command == 'rebuild':
+                rebuild(conn)
+                print(f"[{store}] KPI totals rebuilt.")
+            else:
+                mismatches = verify(conn)
+                for line in mismatches:
+                    print(f"[{store}] {line}")
+                print(f"[{store}] KPI totals OK." if not mismatches
+                      else f"[{store}] {len(mismatches)} mismatch(es) found.")
+                failed = failed or bool(mismatches)
+        finally:
+            release_db_connection(conn)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,203 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Metrics (Prometheus Text Format)
+# ==============================================================================
+#
+# Until now the only signal from production was `print(f"Database error: ...")`.
+# This module records where the time goes and exposes it at /api/metrics in
+# the Prometheus text exposition format:
+#
+#   - HTTP: a latency histogram and a request counter per route, method and
+#     status, recorded by request hooks in app.py.
+#   - SQL: a latency histogram, row counts, errors and VM instruction counts
+#     per normalized statement, recorded by the instrumented connections in
+#     db.py. The VM count comes from SQLite's progress handler and shows
+#     which statements do the most work, whatever their wall time.
+#   - Gauges (pool, writer queue, caches, subscribers) are read from the
+#     existing stats() methods at scrape time.
+#
+# There is no client library dependency; the handful of metric types needed
+# are implemented here.
+
+import re
+import threading
+
+# --- Configuration ---
+# Bucket upper bounds in seconds. SQL statements are usually far faster
+# than whole requests, so their buckets start lower.
+HTTP_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0, 5.0)
+STATEMENT_LABEL_CACHE_SIZE = 1000   # SQL texts whose label is remembered
+MAX_STATEMENT_LENGTH = 200
+PROGRESS_OPCODES = 5000             # SQLite VM instructions between progress callbacks
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# --- Metric Types ---
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative bucket counts, a sum and a count per label combination."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=HTTP_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # [per-bucket counts..., +Inf count, sum]
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state[:-1]):
+                cumulative += count
+                label_text = _format_labels(self.labelnames, labels, (('le', _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+# --- Metrics ---
+
+http_request_duration = Histogram(
+    'trackwise_http_request_duration_seconds', "Time to produce a response, by route.",
+    ('method', 'route'), HTTP_BUCKETS)
+http_requests = Counter(
+    'trackwise_http_requests_total', "Requests handled, by route and status code.",
+    ('method', 'route', 'status'))
+sql_duration = Histogram(
+    'trackwise_sql_duration_seconds', "Time spent executing a statement (execute/executemany).",
+    ('statement',), SQL_BUCKETS)
+sql_rows = Counter(
+    'trackwise_sql_rows_total', "Rows fetched by queries or changed by writes, by statement.",
+    ('statement',))
+sql_errors = Counter(
+    'trackwise_sql_errors_total', "Statements that raised an error.", ('statement',))
+sql_vm_instructions = Counter(
+    'trackwise_sql_vm_instructions_total',
+    f"SQLite VM instructions executed, sampled every {PROGRESS_OPCODES}, by statement.",
+    ('statement',))
+
+ALL_METRICS = (http_request_duration, http_requests, sql_duration, sql_rows, sql_errors, sql_vm_instructions)
+
+
+# --- SQL Statement Labels ---
+
+_PLACEHOLDER_LIST = re.compile(r'\?(?:\s*,\s*\?)+')
+_NUMBER = re.compile(r'\b\d+\b')
+_labels = {}
+_labels_lock = threading.Lock()
+
+
+def statement_label(sql):
+    """
+    Normalizes SQL text into a bounded metric label: whitespace collapsed,
+    IN (?, ?, ...) lists and numeric literals folded, long text truncated.
+    """
+    label = _labels.get(sql)
+    if label is not None:
+        return label
+    label = ' '.join(sql.split())
+    label = _PLACEHOLDER_LIST.sub('?, ...', label)
+    label = _NUMBER.sub('N', label)[:MAX_STATEMENT_LENGTH]
+    with _labels_lock:
+        if len(_labels) < STATEMENT_LABEL_CACHE_SIZE:
+            _labels[sql] = label
+    return label
+
+
+def observe_sql(label, seconds, rows, failed=False):
+    sql_duration.observe((label,), seconds)
+    if rows > 0:
+        sql_rows.inc((label,), rows)
+    if failed:
+        sql_errors.inc((label,))
+
+
+def observe_rows(label, rows):
+    if rows > 0:
+        sql_rows.inc((label,), rows)
+
+
+def observe_vm_progress(label):
+    sql_vm_instructions.inc((label,), PROGRESS_OPCODES)
+
+
+def observe_request(method, route, status, seconds):
+    http_request_duration.observe((method, route), seconds)
+    http_requests.inc((method, route, str(status)))
+
+
+# --- Exposition ---
+
+def render(gauges=()):
+    """
+    Renders every metric, plus scrape-time values given as
+    (name, type, help, value) tuples, in the Prometheus text format.
+    """
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    for name, kind, documentation, value in gauges:
+        if value is None:
+            continue
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
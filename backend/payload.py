@@ -0,0 +1,76 @@
+# ==============================================================================
+# TrackWise Inventory Management System - List Payloads and Compression
+# ==============================================================================
+#
+# List endpoints return one JSON object per row by default, which repeats
+# every column name in every object and builds a dict per row before it is
+# serialized. For large lists most of the CPU time and bytes go to that.
+#
+#   - `?format=columnar` returns the column names once and the rows as plain
+#     arrays: {"columns": [...], "rows": [[...], ...], "count": n}. The rows
+#     come straight from cursor tuples, with no per-row dict.
+#   - Responses of at least GZIP_MIN_BYTES are gzip-compressed for clients
+#     that accept it (including the /api/metrics text). Streamed responses
+#     (exports, SSE) are left alone.
+
+import gzip
+
+from flask import request
+
+# --- Configuration ---
+LIST_FORMATS = ('rows', 'columnar')
+GZIP_MIN_BYTES = 1024   # smaller bodies fit in a packet anyway
+GZIP_LEVEL = 6
+COMPRESSIBLE_TYPES = ('application/json', 'text/csv', 'application/x-ndjson', 'text/plain')
+
+
+def list_format():
+    """Returns the requested list format. Raises ValueError for an unknown one."""
+    fmt = request.args.get('format', 'rows')
+    if fmt not in LIST_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(LIST_FORMATS)}")
+    return fmt
+
+
+def fetch_list(conn, sql, params=(), fmt='rows'):
+    """
+    Runs a query and returns its rows in the requested format, ready for
+    jsonify(): a list of dicts ('rows') or columns plus value arrays ('columnar').
+    """
+    cursor = conn.cursor()
+    if fmt == 'columnar':
+        # Plain tuples: no sqlite3.Row or dict is built per row.
+        cursor.row_factory = None
+        cursor.execute(sql, params)
+        columns = [description[0] for description in cursor.description]
+        rows = cursor.fetchall()
+        return {"columns": columns, "rows": rows, "count": len(rows)}
+
+    cursor.execute(sql, params)
+    return [dict(row) for row in cursor.fetchall()]
+
+
+def gzip_response(response):
+    """Compresses a finished response if the client accepts gzip and it is worth it."""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings['gzip']:
+        return response
+    body = response.get_data()
+    if len(body) < GZIP_MIN_BYTES:
+        return response
+
+    response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    # The compressed body is a different representation of the same content,
+    # so a strong ETag becomes weak (If-None-Match compares weakly).
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
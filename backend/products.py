@@ -0,0 +1,264 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Product Writes and Bulk Import
+# ==============================================================================
+#
+# add_product() and the bulk import endpoint share the same field mapping and
+# required-field rules, defined once here.
+#
+# A bulk import streams the request body (CSV or NDJSON) one line at a time,
+# so a 50k-SKU supplier catalog never has to sit in memory. Valid rows are
+# inserted with executemany() in batches of BATCH_SIZE, each committed in its
+# own short transaction:
+#
+#   - The write lock is held for a fraction of a second per batch, far less
+#     than busy_timeout, and the next batch is parsed with no lock held, so
+#     the writer thread (writer.py) and other requests get in between batches
+#     instead of timing out behind a long import.
+#   - No savepoints: a savepoint makes SQLite journal every page the batch
+#     touches, which cost several times the insert itself. A batch that
+#     violates a constraint is rolled back and retried row by row instead.
+#   - Each batch is added to the search index with one statement rather
+#     than a trigger run per row (see catalog.bulk_indexing()).
+
+import csv
+import io
+import json
+import re
+import sqlite3
+import time
+
+import catalog
+
+# --- Field Mapping ---
+# Request field name -> Product column, in INSERT order.
+PRODUCT_FIELDS = (
+    ('productName', 'ProductName'),
+    ('description', 'Description'),
+    ('initialQuantity', 'QuantityInStock'),
+    ('salePrice', 'SalePrice'),
+    ('purchasePrice', 'PurchasePrice'),
+    ('supplierId', 'SupplierID'),
+    ('reorderLevel', 'ReorderLevel'),
+    ('barcode', 'Barcode'),
+)
+
+REQUIRED_FIELDS = ('productName', 'initialQuantity', 'salePrice', 'purchasePrice')
+
+# Numeric fields and the type they are converted to (CSV values arrive as text).
+NUMERIC_FIELDS = {
+    'initialQuantity': int,
+    'salePrice': float,
+    'purchasePrice': float,
+    'supplierId': int,
+    'reorderLevel': int,
+}
+
+# Used when a product is added without a reorder level (the old fixed threshold).
+DEFAULT_REORDER_LEVEL = 10
+
+INSERT_PRODUCT_SQL = f"""
+    INSERT INTO Product ({', '.join(column for _, column in PRODUCT_FIELDS)})
+    VALUES ({', '.join('?' for _ in PRODUCT_FIELDS)})
+"""
+
+# --- Bulk Import Tuning ---
+BATCH_SIZE = 2000          # rows per executemany() call and per transaction
+MAX_REPORTED_ERRORS = 1000 # per-row errors included in the response
+READ_BUFFER_SIZE = 64 * 1024
+
+# What surrogateescape decodes invalid UTF-8 bytes to.
+_UNDECODABLE = re.compile('[\udc80-\udcff]')
+
+
+def product_row(data):
+    """
+    Validates one product record and returns the values for INSERT_PRODUCT_SQL.
+    Raises ValueError with a client-facing message when the record is invalid.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Invalid request format")
+
+    # 1. Treat empty strings (blank CSV cells) as missing values.
+    values = {field: data.get(field) for field, _ in PRODUCT_FIELDS}
+    for field, value in values.items():
+        if isinstance(value, str) and value.strip() == '':
+            values[field] = None
+
+    # 2. All required fields must be present.
+    if not all(values[field] is not None for field in REQUIRED_FIELDS):
+        raise ValueError("Missing required product fields")
+
+    # 3. Numbers must really be numbers.
+    for field, kind in NUMERIC_FIELDS.items():
+        if values[field] is not None:
+            try:
+                values[field] = kind(values[field])
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid value for {field}: {values[field]!r}")
+
+    # 4. Optional fields with a default.
+    if values['reorderLevel'] is None:
+        values['reorderLevel'] = DEFAULT_REORDER_LEVEL
+
+    # 5. Barcodes are stored as text so leading zeros survive.
+    if values['barcode'] is not None:
+        values['barcode'] = str(values['barcode']).strip()
+
+    return tuple(values[field] for field, _ in PRODUCT_FIELDS)
+
+
+def insert_product(conn, values):
+    """Inserts one validated product row and returns its new ProductID."""
+    return conn.execute(INSERT_PRODUCT_SQL, values).lastrowid
+
+
+# --- Streaming Parsers ---
+# Both yield (line number, record) pairs; a record that cannot be parsed is
+# yielded as an Exception so the caller can report it and carry on.
+
+def _decoded_lines(stream):
+    """
+    Decodes a raw byte stream line by line (dropping a UTF-8 BOM if present).
+    The WSGI input stream is unbuffered, so reading lines from it directly
+    would cost a call per byte; it is wrapped in a large read buffer first.
+    Bytes that are not valid UTF-8 are kept as lone surrogates, so a bad line
+    is reported on its own (see _has_undecodable) instead of ending the body.
+    """
+    buffered = io.BufferedReader(stream, buffer_size=READ_BUFFER_SIZE)
+    return io.TextIOWrapper(buffered, encoding='utf-8-sig', errors='surrogateescape', newline='')
+
+
+def _has_undecodable(text):
+    return isinstance(text, str) and _UNDECODABLE.search(text) is not None
+
+
+def iter_csv(stream):
+    """Parses a CSV stream whose header row uses the JSON field names."""
+    reader = csv.DictReader(_decoded_lines(stream))
+    while True:
+        try:
+            record = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # A malformed row (e.g. an oversized field): the reader carries
+            # on after it. DictReader only updates its line_num on success.
+            yield reader.reader.line_num, ValueError(f"Invalid CSV: {e}")
+            continue
+        # The header is line 1, so data rows start at line 2.
+        if any(_has_undecodable(value) for value in record.values()):
+            yield reader.line_num, ValueError("Invalid UTF-8")
+        else:
+            yield reader.line_num, record
+
+
+def iter_ndjson(stream):
+    """Parses newline-delimited JSON, one product object per line."""
+    for line_number, line in enumerate(_decoded_lines(stream), start=1):
+        if not line.strip():
+            continue
+        if _has_undecodable(line):
+            yield line_number, ValueError("Invalid UTF-8")
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, ValueError(f"Invalid JSON: {e}")
+
+
+# --- Bulk Import ---
+
+def _insert_batch(conn, batch, report):
+    """
+    Inserts one batch with executemany() in its own transaction, indexing it
+    for search in one statement (catalog.bulk_indexing()). If any row
+    violates a constraint, the transaction is rolled back and the batch is
+    inserted again row by row so that only the offending rows are reported.
+    """
+    # 1. The whole batch at once.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        with catalog.bulk_indexing(conn):
+            conn.executemany(INSERT_PRODUCT_SQL, [values for _, values in batch])
+        conn.commit()
+        report.inserted += len(batch)
+        return
+    except sqlite3.IntegrityError:
+        conn.rollback()
+    except Exception:
+        conn.rollback()
+        raise
+
+    # 2. Row by row; a failed INSERT only undoes its own row.
+    inserted = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        with catalog.bulk_indexing(conn):
+            for line_number, values in batch:
+                try:
+                    conn.execute(INSERT_PRODUCT_SQL, values)
+                    inserted += 1
+                except sqlite3.IntegrityError as e:
+                    report.add_error(line_number, f"Database integrity error: {e}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    report.inserted += inserted
+
+
+class ImportReport:
+    """Counts inserted and failed rows and keeps the first few errors."""
+
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    def add_error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "error": message})
+
+    def to_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "success": self.failed == 0,
+            "inserted": self.inserted,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errorsTruncated": self.failed > len(self.errors),
+            "elapsedSeconds": round(elapsed, 3),
+            "rowsPerSecond": round(self.inserted / elapsed) if elapsed > 0 else None
+        }
+
+
+def import_products(conn, records):
+    """
+    Validates and inserts a stream of (line number, record) pairs, one
+    transaction per batch. Returns an ImportReport. Batches committed before
+    a fatal database error stay committed; the error is re-raised.
+    """
+    report = ImportReport()
+    batch = []
+
+    for line_number, record in records:
+        # 1. Validate the row with the same rules as add_product().
+        try:
+            if isinstance(record, Exception):
+                raise record
+            batch.append((line_number, product_row(record)))
+        except ValueError as e:
+            report.add_error(line_number, str(e))
+            continue
+
+        # 2. Insert and commit each full batch.
+        if len(batch) >= BATCH_SIZE:
+            _insert_batch(conn, batch, report)
+            batch = []
+
+    # 3. Insert whatever is left.
+    if batch:
+        _insert_batch(conn, batch, report)
+    return report
@@ -0,0 +1,231 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Reorder Suggestions
+# ==============================================================================
+#
+# The low-stock list only says which products are at or below their reorder
+# level. Reorder suggestions say how much to order, from how fast each
+# product actually sells and how long its supplier takes to deliver:
+#
+#   - Demand is read from the per-product daily rollups (see rollups.py) for
+#     the last LONG_WINDOW_DAYS, in one query, into NumPy arrays. Daily
+#     demand is the higher of the short (SHORT_WINDOW_DAYS) and the long
+#     moving average, so a product that has just started selling faster is
+#     reordered for its new pace, and a quiet week does not hide a steady
+#     seller.
+#   - Days of cover is stock divided by daily demand.
+#   - The target stock covers the supplier's lead time plus REVIEW_PERIOD_DAYS
+#     (until the next order run) of demand, on top of the product's reorder
+#     level as safety stock. The suggested quantity is whatever is missing.
+#
+# Every product is computed at once with array arithmetic, so 100k products
+# cost a few array passes rather than a Python loop per product.
+#
+# Supplier lead times are kept in SupplierLeadTime; suppliers without an
+# entry use DEFAULT_LEAD_TIME_DAYS.
+#
+# NumPy is optional: without it the rest of the API works and the
+# suggestions endpoint answers 503.
+#
+# Usage (from the backend directory):
+#   python reorder.py suggest                      - summary per supplier
+#   python reorder.py lead-time SupplierID DAYS    - set a supplier's lead time
+
+import sys
+from datetime import date, timedelta
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# --- Configuration ---
+SHORT_WINDOW_DAYS = 7
+LONG_WINDOW_DAYS = 28
+REVIEW_PERIOD_DAYS = 7         # days between two order runs
+DEFAULT_LEAD_TIME_DAYS = 7
+
+# --- Schema ---
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS SupplierLeadTime (
+    SupplierID INTEGER PRIMARY KEY,
+    LeadTimeDays INTEGER NOT NULL CHECK (LeadTimeDays >= 0)
+);
+"""
+
+
+def install(conn):
+    """Creates the supplier lead time table if it is missing."""
+    conn.executescript(SCHEMA)
+
+
+def available():
+    """True when NumPy is installed."""
+    return np is not None
+
+
+def set_lead_time(conn, supplier_id, days):
+    conn.execute(
+        "INSERT INTO SupplierLeadTime (SupplierID, LeadTimeDays) VALUES (?, ?) "
+        "ON CONFLICT (SupplierID) DO UPDATE SET LeadTimeDays = excluded.LeadTimeDays",
+        (supplier_id, days)
+    )
+
+
+# --- Loading ---
+
+def _load(conn):
+    """
+    Reads products, their recent daily sales and the supplier lead times
+    into arrays. Products come back sorted by ProductID.
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+
+    # 1. Products: one row each.
+    products = cursor.execute(
+        "SELECT ProductID, QuantityInStock, ReorderLevel, IFNULL(SupplierID, -1), ProductName "
+        "FROM Product ORDER BY ProductID"
+    ).fetchall()
+    names = [row[4] for row in products]
+    numbers = np.array([row[:4] for row in products], dtype=np.int64).reshape(-1, 4)
+
+    # 2. Sales: one row per product and day in the long window, with the
+    #    day's age (0 = today) so both averages come from the same rows.
+    today = date.fromisoformat(cursor.execute("SELECT date('now')").fetchone()[0])
+    start = today - timedelta(days=LONG_WINDOW_DAYS - 1)
+    sales = np.array(cursor.execute(
+        "SELECT ProductID, CAST(julianday(?) - julianday(SaleDay) AS INTEGER), ItemsSold "
+        "FROM ProductSalesDaily WHERE SaleDay BETWEEN ? AND ?",
+        (today.isoformat(), start.isoformat(), today.isoformat())
+    ).fetchall(), dtype=np.int64).reshape(-1, 3)
+
+    # 3. Lead times, sorted by SupplierID for searchsorted().
+    lead_times = np.array(cursor.execute(
+        "SELECT SupplierID, LeadTimeDays FROM SupplierLeadTime ORDER BY SupplierID"
+    ).fetchall(), dtype=np.int64).reshape(-1, 2)
+    return numbers, names, sales, lead_times
+
+
+def _lookup_lead_times(supplier_ids, lead_times):
+    """Maps each product's supplier to its lead time, or the default."""
+    result = np.full(len(supplier_ids), DEFAULT_LEAD_TIME_DAYS, dtype=np.int64)
+    if len(lead_times):
+        position = np.searchsorted(lead_times[:, 0], supplier_ids)
+        position = np.minimum(position, len(lead_times) - 1)
+        known = lead_times[position, 0] == supplier_ids
+        result[known] = lead_times[position[known], 1]
+    return result
+
+
+# --- Engine ---
+
+def compute(conn):
+    """
+    Computes demand, days of cover and the suggested order for every
+    product. Returns a dict of equal-length arrays (plus product names).
+    """
+    numbers, names, sales, lead_times = _load(conn)
+    product_ids, stock, reorder_level, supplier_ids = numbers.T
+    count = len(product_ids)
+
+    # 1. Moving averages: sum each window's items per product in one pass.
+    #    Rollup rows of deleted products are skipped.
+    position = np.searchsorted(product_ids, sales[:, 0])
+    known = position < count
+    known[known] = product_ids[position[known]] == sales[known, 0]
+    position, ages, items = position[known], sales[known, 1], sales[known, 2]
+    long_total = np.bincount(position, weights=items, minlength=count)
+    short_total = np.bincount(position, weights=items * (ages < SHORT_WINDOW_DAYS), minlength=count)
+    daily_demand = np.maximum(short_total / SHORT_WINDOW_DAYS, long_total / LONG_WINDOW_DAYS)
+
+    # 2. Days of cover; NaN where nothing sells.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(daily_demand > 0, stock / daily_demand, np.nan)
+
+    # 3. Order up to lead time + review period of demand, plus safety stock.
+    lead_time = _lookup_lead_times(supplier_ids, lead_times)
+    target = daily_demand * (lead_time + REVIEW_PERIOD_DAYS) + reorder_level
+    suggested = np.maximum(np.ceil(target - stock), 0).astype(np.int64)
+
+    return {
+        "productId": product_ids,
+        "productName": names,
+        "supplierId": supplier_ids,
+        "quantityInStock": stock,
+        "reorderLevel": reorder_level,
+        "dailyDemand": daily_demand,
+        "daysOfCover": days_of_cover,
+        "leadTimeDays": lead_time,
+        "suggestedQuantity": suggested,
+    }
+
+
+def suggestions(conn, supplier_id=None):
+    """
+    Returns the products that need ordering, grouped by supplier:
+    [{"supplierId", "leadTimeDays", "totalQuantity", "items": [...]}, ...].
+    Items are most urgent (fewest days of cover) first.
+    """
+    result = compute(conn)
+    selected = result["suggestedQuantity"] > 0
+    if supplier_id is not None:
+        selected &= result["supplierId"] == supplier_id
+    indexes = np.flatnonzero(selected)
+
+    # Group by supplier, most urgent first within each (NaN cover sorts last).
+    cover = np.nan_to_num(result["daysOfCover"][indexes], nan=np.inf)
+    indexes = indexes[np.lexsort((cover, result["supplierId"][indexes]))]
+
+    groups = []
+    for index in indexes.tolist():
+        supplier = int(result["supplierId"][index])
+        supplier = supplier if supplier >= 0 else None   # -1 = no supplier
+        if not groups or groups[-1]["supplierId"] != supplier:
+            groups.append({
+                "supplierId": supplier,
+                "leadTimeDays": int(result["leadTimeDays"][index]),
+                "totalQuantity": 0,
+                "items": [],
+            })
+        cover = result["daysOfCover"][index]
+        quantity = int(result["suggestedQuantity"][index])
+        groups[-1]["items"].append({
+            "productId": int(result["productId"][index]),
+            "productName": result["productName"][index],
+            "quantityInStock": int(result["quantityInStock"][index]),
+            "reorderLevel": int(result["reorderLevel"][index]),
+            "dailyDemand": round(float(result["dailyDemand"][index]), 3),
+            "daysOfCover": None if np.isnan(cover) else round(float(cover), 1),
+            "suggestedQuantity": quantity,
+        })
+        groups[-1]["totalQuantity"] += quantity
+    return groups
+
+
+# --- Command Line Entry Point ---
+if __name__ == '__main__':
+    from db import STORES, get_db_connection, release_db_connection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ('suggest', 'lead-time') or (command == 'lead-time' and len(sys.argv) != 4):
+        print("Usage: python reorder.py suggest | python reorder.py lead-time SupplierID DAYS")
+        sys.exit(2)
+
+    if command == 'suggest' and not available():
+        print("NumPy is required for reorder suggestions (pip install numpy).")
+        sys.exit(1)
+
+    # Suppliers are shared by the stores, so a lead time is set in every shard.
+    for store in STORES:
+        conn = get_db_connection(store, readonly=False)
+        try:
+            if command == 'lead-time':
+                set_lead_time(conn, int(sys.argv[2]), int(sys.argv[3]))
+                conn.commit()
+                print(f"[{store}] Lead time of supplier {sys.argv[2]} set to {sys.argv[3]} days.")
+            else:
+                for group in suggestions(conn):
+                    print(f"[{store}] Supplier {group['supplierId']}: {len(group['items'])} products, "
+                          f"{group['totalQuantity']} units (lead time {group['leadTimeDays']} days)")
+        finally:
+            release_db_connection(conn)
@@ -0,0 +1,296 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Sales Rollups for Reports
+# ==============================================================================
+#
+# The reports page asks for a sales-volume series and a top-N product ranking
+# over the last 7/30/90/365 days. Computing those from raw Sale rows would scan
+# up to a year of sales on every click, so per-product rollups are kept next
+# to the daily buckets from kpi.py:
+#
+#   SalesDaily          - (kpi.py) one row per day: count, items and revenue.
+#   ProductSalesDaily   - one row per (day, product) with items sold and revenue.
+#   ProductSalesMonthly - one row per (month, product), used for the whole
+#                         months inside a long window.
+#
+# Triggers keep all of them current as sales land. A report over N days reads
+# at most N daily buckets for the chart, and at most two partial months of
+# daily product rows plus whole months for the ranking, however many raw
+# Sale rows there are. Archived sales (see archive.py) stay in the rollups.
+#
+# Usage (from the backend directory):
+#   python rollups.py rebuild   - recompute the product rollups from scratch
+
+import sys
+from datetime import date, timedelta
+
+import archive
+
+# --- Schema ---
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ProductSalesDaily (
+    SaleDay TEXT NOT NULL,
+    ProductID INTEGER NOT NULL,
+    ItemsSold INTEGER NOT NULL DEFAULT 0,
+    Revenue REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (SaleDay, ProductID)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS ProductSalesMonthly (
+    SaleMonth TEXT NOT NULL,
+    ProductID INTEGER NOT NULL,
+    ItemsSold INTEGER NOT NULL DEFAULT 0,
+    Revenue REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (SaleMonth, ProductID)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_sale_insert AFTER INSERT ON Sale
+WHEN date(NEW.SaleDate) IS NOT NULL AND NEW.ProductID IS NOT NULL
+BEGIN
+    INSERT INTO ProductSalesDaily (SaleDay, ProductID, ItemsSold, Revenue)
+    VALUES (date(NEW.SaleDate), NEW.ProductID, IFNULL(NEW.Quantity, 0), IFNULL(NEW.TotalAmount, 0))
+    ON CONFLICT (SaleDay, ProductID) DO UPDATE
+    SET ItemsSold = ItemsSold + excluded.ItemsSold,
+        Revenue = Revenue + excluded.Revenue;
+
+    INSERT INTO ProductSalesMonthly (SaleMonth, ProductID, ItemsSold, Revenue)
+    VALUES (strftime('%Y-%m', NEW.SaleDate), NEW.ProductID, IFNULL(NEW.Quantity, 0), IFNULL(NEW.TotalAmount, 0))
+    ON CONFLICT (SaleMonth, ProductID) DO UPDATE
+    SET ItemsSold = ItemsSold + excluded.ItemsSold,
+        Revenue = Revenue + excluded.Revenue;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_sale_update
+AFTER UPDATE OF SaleDate, ProductID, Quantity, TotalAmount ON Sale
+BEGIN
+    UPDATE ProductSalesDaily
+    SET ItemsSold = ItemsSold - IFNULL(OLD.Quantity, 0),
+        Revenue = Revenue - IFNULL(OLD.TotalAmount, 0)
+    WHERE SaleDay = date(OLD.SaleDate) AND ProductID = OLD.ProductID;
+
+    UPDATE ProductSalesMonthly
+    SET ItemsSold = ItemsSold - IFNULL(OLD.Quantity, 0),
+        Revenue = Revenue - IFNULL(OLD.TotalAmount, 0)
+    WHERE SaleMonth = strftime('%Y-%m', OLD.SaleDate) AND ProductID = OLD.ProductID;
+
+    INSERT INTO ProductSalesDaily (SaleDay, ProductID, ItemsSold, Revenue)
+    SELECT date(NEW.SaleDate), NEW.ProductID, IFNULL(NEW.Quantity, 0), IFNULL(NEW.TotalAmount, 0)
+    WHERE date(NEW.SaleDate) IS NOT NULL AND NEW.ProductID IS NOT NULL
+    ON CONFLICT (SaleDay, ProductID) DO UPDATE
+    SET ItemsSold = ItemsSold + excluded.ItemsSold,
+        Revenue = Revenue + excluded.Revenue;
+
+    INSERT INTO ProductSalesMonthly (SaleMonth, ProductID, ItemsSold, Revenue)
+    SELECT strftime('%Y-%m', NEW.SaleDate), NEW.ProductID, IFNULL(NEW.Quantity, 0), IFNULL(NEW.TotalAmount, 0)
+    WHERE date(NEW.SaleDate) IS NOT NULL AND NEW.ProductID IS NOT NULL
+    ON CONFLICT (SaleMonth, ProductID) DO UPDATE
+    SET ItemsSold = ItemsSold + excluded.ItemsSold,
+        Revenue = Revenue + excluded.Revenue;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_rollup_sale_delete AFTER DELETE ON Sale
+BEGIN
+    UPDATE ProductSalesDaily
+    SET ItemsSold = ItemsSold - IFNULL(OLD.Quantity, 0),
+        Revenue = Revenue - IFNULL(OLD.TotalAmount, 0)
+    WHERE SaleDay = date(OLD.SaleDate) AND ProductID = OLD.ProductID;
+
+    UPDATE ProductSalesMonthly
+    SET ItemsSold = ItemsSold - IFNULL(OLD.Quantity, 0),
+        Revenue = Revenue - IFNULL(OLD.TotalAmount, 0)
+    WHERE SaleMonth = strftime('%Y-%m', OLD.SaleDate) AND ProductID = OLD.ProductID;
+END;
+"""
+
+# Archived sales stay in the rollups: the archiver sets ArchiveInProgress
+# (see archive.py) for the duration of its delete.
+ARCHIVE_GUARD_SCHEMA = """
+DROP TRIGGER IF EXISTS trg_rollup_sale_delete;
+CREATE TRIGGER trg_rollup_sale_delete AFTER DELETE ON Sale
+WHEN NOT EXISTS (SELECT 1 FROM ArchiveInProgress)
+BEGIN
+    UPDATE ProductSalesDaily
+    SET ItemsSold = ItemsSold - IFNULL(OLD.Quantity, 0),
+        Revenue = Revenue - IFNULL(OLD.TotalAmount, 0)
+    WHERE SaleDay = date(OLD.SaleDate) AND ProductID = OLD.ProductID;
+
+    UPDATE ProductSalesMonthly
+    SET ItemsSold = ItemsSold - IFNULL(OLD.Quantity, 0),
+        Revenue = Revenue - IFNULL(OLD.TotalAmount, 0)
+    WHERE SaleMonth = strftime('%Y-%m', OLD.SaleDate) AND ProductID = OLD.ProductID;
+END;
+"""
+
+# --- From-scratch aggregates (used by rebuild) ---
+PRODUCT_DAILY_SQL = """
+    SELECT date(SaleDate) AS SaleDay, ProductID, IFNULL(SUM(Quantity), 0), IFNULL(SUM(TotalAmount), 0)
+    FROM Sale
+    WHERE date(SaleDate) IS NOT NULL AND ProductID IS NOT NULL
+    GROUP BY SaleDay, ProductID
+"""
+
+# Adds an archive's rows to those already computed from the hot table.
+MERGE_PRODUCT_DAILY_SQL = """
+    INSERT INTO ProductSalesDaily (SaleDay, ProductID, ItemsSold, Revenue) VALUES (?, ?, ?, ?)
+    ON CONFLICT (SaleDay, ProductID) DO UPDATE
+    SET ItemsSold = ItemsSold + excluded.ItemsSold,
+        Revenue = Revenue + excluded.Revenue
+"""
+
+# --- Top-N over a window ---
+# The window is split into up to three parts: the days of the first month,
+# the whole months in between and the days of the current month.
+TOP_PRODUCTS_SQL = """
+    SELECT r.ProductID, p.ProductName, SUM(r.ItemsSold) AS ItemsSold, SUM(r.Revenue) AS Revenue
+    FROM (
+        SELECT ProductID, ItemsSold, Revenue FROM ProductSalesDaily
+        WHERE SaleDay BETWEEN ? AND ?
+        UNION ALL
+        SELECT ProductID, ItemsSold, Revenue FROM ProductSalesMonthly
+        WHERE SaleMonth BETWEEN ? AND ?
+        UNION ALL
+        SELECT ProductID, ItemsSold, Revenue FROM ProductSalesDaily
+        WHERE SaleDay BETWEEN ? AND ?
+    ) AS r
+    LEFT JOIN Product AS p ON p.ProductID = r.ProductID
+    GROUP BY r.ProductID
+    HAVING SUM(r.ItemsSold) > 0
+    ORDER BY ItemsSold DESC, Revenue DESC
+    LIMIT ?
+"""
+
+# An empty BETWEEN range, used when a part of the window does not apply.
+EMPTY_RANGE = ('1', '0')
+
+
+def install(conn):
+    """
+    Creates the rollup tables and triggers if they are missing.
+    The first install backfills the rollups from existing sales.
+    """
+    conn.executescript(SCHEMA)
+    has_rollups = conn.execute("SELECT EXISTS (SELECT 1 FROM ProductSalesMonthly)").fetchone()[0]
+    has_sales = conn.execute("SELECT EXISTS (SELECT 1 FROM Sale)").fetchone()[0]
+    if has_sales and not has_rollups:
+        rebuild(conn)
+
+
+def install_archive_guard(conn):
+    """Makes the Sale delete trigger skip rows the archiver is moving."""
+    conn.executescript(ARCHIVE_GUARD_SCHEMA)
+
+
+def rebuild(conn):
+    """Recomputes the per-product rollups from the Sale table and the archives in one transaction."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM ProductSalesDaily")
+        conn.execute("DELETE FROM ProductSalesMonthly")
+        conn.execute(f"INSERT INTO ProductSalesDaily (SaleDay, ProductID, ItemsSold, Revenue) {PRODUCT_DAILY_SQL}")
+        conn.executemany(MERGE_PRODUCT_DAILY_SQL, archive.query_archives(conn, PRODUCT_DAILY_SQL))
+        conn.execute("""
+            INSERT INTO ProductSalesMonthly (SaleMonth, ProductID, ItemsSold, Revenue)
+            SELECT substr(SaleDay, 1, 7) AS SaleMonth, ProductID, SUM(ItemsSold), SUM(Revenue)
+            FROM ProductSalesDaily
+            GROUP BY SaleMonth, ProductID
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _window_parts(start, end):
+    """
+    Splits [start, end] into (head days, whole months, tail days) ranges,
+    each as an inclusive (low, high) pair of ISO strings.
+    """
+    if (start.year, start.month) == (end.year, end.month):
+        return (start.isoformat(), end.isoformat()), EMPTY_RANGE, EMPTY_RANGE
+
+    # 1. Days from the start date to the end of its month.
+    first_of_next = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    head = (start.isoformat(), (first_of_next - timedelta(days=1)).isoformat())
+
+    # 2. Whole months strictly between the start month and the current month.
+    last_whole = end.replace(day=1) - timedelta(days=1)
+    if first_of_next <= last_whole:
+        months = (first_of_next.strftime('%Y-%m'), last_whole.strftime('%Y-%m'))
+    else:
+        months = EMPTY_RANGE
+
+    # 3. Days of the current month up to the end date.
+    tail = (end.replace(day=1).isoformat(), end.isoformat())
+    return head, months, tail
+
+
+def sales_report(conn, days, top=10):
+    """
+    Builds the sales report for the last `days` days (today included):
+    a per-day series for the chart and the top-N products by items sold.
+    """
+    # 1. Resolve the window with SQLite's clock so it matches the triggers.
+    end = date.fromisoformat(conn.execute("SELECT date('now')").fetchone()[0])
+    start = end - timedelta(days=days - 1)
+
+    # 2. Daily series from the SalesDaily buckets; days without sales are zeros.
+    buckets = {
+        row['SaleDay']: row for row in conn.execute(
+            "SELECT SaleDay, SaleCount, ItemsSold, TotalAmount FROM SalesDaily WHERE SaleDay BETWEEN ? AND ?",
+            (start.isoformat(), end.isoformat())
+        )
+    }
+    series = []
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).isoformat()
+        row = buckets.get(day)
+        series.append({
+            "date": day,
+            "saleCount": row['SaleCount'] if row else 0,
+            "itemsSold": row['ItemsSold'] if row else 0,
+            "revenue": round(row['TotalAmount'], 2) if row else 0.0
+        })
+
+    # 3. Top-N ranking from the product rollups.
+    head, months, tail = _window_parts(start, end)
+    rows = conn.execute(TOP_PRODUCTS_SQL, (*head, *months, *tail, top)).fetchall()
+    top_products = [
+        {
+            "rank": rank,
+            "productId": row['ProductID'],
+            "productName": row['ProductName'],
+            "itemsSold": row['ItemsSold'],
+            "totalRevenue": round(row['Revenue'], 2)
+        }
+        for rank, row in enumerate(rows, start=1)
+    ]
+
+    return {
+        "days": days,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "totals": {
+            "saleCount": sum(point["saleCount"] for point in series),
+            "itemsSold": sum(point["itemsSold"] for point in series),
+            "revenue": round(sum(point["revenue"] for point in series), 2)
+        },
+        "series": series,
+        "topProducts": top_products
+    }
+
+
+# --- Command Line Entry Point ---
+if __name__ == '__main__':
+    from db import STORES, get_db_connection, release_db_connection
+
+    if sys.argv[1:] != ['rebuild']:
+        print("Usage: python rollups.py rebuild")
+        sys.exit(2)
+
+    for store in STORES:
+        conn = get_db_connection(store, readonly=False)
+        try:
+            install(conn)
+            rebuild(conn)
+            print(f"[{store}] Sales rollups rebuilt.")
+        finally:
+            release_db_connection(conn)
@@ -0,0 +1,69 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Sale Recording
+# ==============================================================================
+#
+# Recording a sale inserts a Sale row and takes the sold quantity out of the
+# product's stock, in the same transaction. The KPI, rollup and change-feed
+# triggers pick both writes up from there, and the stock ledger records the
+# decrement as a sale movement (see stock.py).
+
+import stock
+
+
+class SaleError(ValueError):
+    """A sale that cannot be recorded; `status` is the HTTP status to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def sale_request(data):
+    """
+    Validates a sale payload ({productId, quantity, employeeId?}) and returns
+    (product_id, quantity, employee_id). Raises SaleError when it is invalid.
+    """
+    if not isinstance(data, dict):
+        raise SaleError("Invalid request format")
+    if data.get('productId') is None or data.get('quantity') is None:
+        raise SaleError("Missing required sale fields")
+    try:
+        product_id = int(data['productId'])
+        quantity = int(data['quantity'])
+        employee_id = int(data['employeeId']) if data.get('employeeId') is not None else None
+    except (TypeError, ValueError):
+        raise SaleError("productId, quantity and employeeId must be integers")
+    if quantity <= 0:
+        raise SaleError("quantity must be positive")
+    return product_id, quantity, employee_id
+
+
+def record_sale(conn, product_id, quantity, employee_id=None):
+    """
+    Inserts the sale and decrements stock. Runs on the writer's connection
+    inside its transaction; returns the new SaleID.
+    """
+    # 1. Price the sale and check the stock.
+    product = conn.execute(
+        "SELECT SalePrice, QuantityInStock FROM Product WHERE ProductID = ?", (product_id,)
+    ).fetchone()
+    if product is None:
+        raise SaleError("Product not found", status=404)
+    if product['QuantityInStock'] < quantity:
+        raise SaleError("Insufficient stock", status=409)
+
+    # 2. Record the sale (SaleDate defaults to the current UTC time).
+    cursor = conn.execute(
+        "INSERT INTO Sale (ProductID, EmployeeID, Quantity, TotalAmount) VALUES (?, ?, ?, ?)",
+        (product_id, employee_id, quantity, round(product['SalePrice'] * quantity, 2))
+    )
+
+    # 3. Take the sold items out of stock.
+    conn.execute(
+        "UPDATE Product SET QuantityInStock = QuantityInStock - ? WHERE ProductID = ?",
+        (quantity, product_id)
+    )
+
+    # 4. Label the ledger movement the update just wrote.
+    stock.label_last_movement(conn, 'sale', cursor.lastrowid)
+    return cursor.lastrowid
@@ -0,0 +1,312 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Schema Migrations
+# ==============================================================================
+#
+# The API used to assume that Product, Sale and Employee already existed,
+# with whatever indexes someone had created by hand. This module owns the
+# schema instead:
+#
+#   - MIGRATIONS is an ordered list of numbered steps. The number of the last
+#     applied step is stored in SQLite's `PRAGMA user_version`, so each step
+#     runs exactly once per database.
+#   - ROUTE_QUERIES lists every query the API routes issue. The check mode
+#     runs EXPLAIN QUERY PLAN on each of them and fails if any falls back to
+#     a full table scan, so a missing index is caught before it ships.
+#
+# Usage (from the backend directory):
+#   python schema.py migrate   - apply any pending migrations
+#   python schema.py status    - print the current schema version
+#   python schema.py check     - migrate, then verify every route query plan
+
+import re
+import sys
+
+import archive
+import auth
+import barcodes
+import catalog
+import events
+import export
+import kpi
+import reorder
+import rollups
+import stock
+
+
+# --- Migration Steps ---
+# Each step receives an open connection. Never edit a step that has shipped;
+# append a new one instead.
+
+def _create_base_tables(conn):
+    """Creates the core tables (no-op for databases that already have them)."""
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS Employee (
+            EmployeeID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Name TEXT,
+            Username TEXT NOT NULL UNIQUE,
+            PasswordHash TEXT NOT NULL,
+            Role TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS Product (
+            ProductID INTEGER PRIMARY KEY AUTOINCREMENT,
+            ProductName TEXT NOT NULL,
+            Description TEXT,
+            QuantityInStock INTEGER NOT NULL DEFAULT 0,
+            SalePrice REAL NOT NULL,
+            PurchasePrice REAL NOT NULL,
+            SupplierID INTEGER
+        );
+
+        CREATE TABLE IF NOT EXISTS Sale (
+            SaleID INTEGER PRIMARY KEY AUTOINCREMENT,
+            ProductID INTEGER REFERENCES Product (ProductID),
+            EmployeeID INTEGER REFERENCES Employee (EmployeeID),
+            Quantity INTEGER NOT NULL DEFAULT 1,
+            TotalAmount REAL NOT NULL,
+            SaleDate TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+
+def _create_route_indexes(conn):
+    """Adds the indexes the API routes rely on."""
+    conn.executescript("""
+        CREATE INDEX IF NOT EXISTS idx_product_quantity ON Product (QuantityInStock);
+        CREATE INDEX IF NOT EXISTS idx_sale_date ON Sale (SaleDate);
+        CREATE INDEX IF NOT EXISTS idx_employee_username ON Employee (Username);
+    """)
+
+
+def _column_exists(conn, table, column):
+    """Returns True if the table already has the column."""
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def _add_reorder_levels(conn):
+    """
+    Adds a per-product ReorderLevel (existing products keep the old threshold
+    of 10) and a partial index that holds only the products at or below it.
+    SQLite keeps the partial index current on every stock change, so the
+    low-stock list reads just the handful of rows that are actually low.
+    """
+    if not _column_exists(conn, 'Product', 'ReorderLevel'):
+        conn.execute("ALTER TABLE Product ADD COLUMN ReorderLevel INTEGER NOT NULL DEFAULT 10")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_product_low_stock ON Product (QuantityInStock)
+        WHERE QuantityInStock <= ReorderLevel
+    """)
+
+
+def _add_barcodes_and_sort_indexes(conn):
+    """
+    Adds the Barcode column captured by the add-product form, a partial index
+    for exact barcode lookups and the indexes behind the catalog sort orders.
+    """
+    if not _column_exists(conn, 'Product', 'Barcode'):
+        conn.execute("ALTER TABLE Product ADD COLUMN Barcode TEXT")
+    conn.executescript("""
+        CREATE INDEX IF NOT EXISTS idx_product_barcode ON Product (Barcode) WHERE Barcode IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_product_name ON Product (ProductName);
+        CREATE INDEX IF NOT EXISTS idx_product_price ON Product (SalePrice);
+    """)
+
+
+def _add_supplier_index(conn):
+    """Adds the index behind the catalog's supplierId filter."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_product_supplier ON Product (SupplierID)")
+
+
+def _guard_sale_delete_triggers(conn):
+    """
+    Lets the archiver move sales without the delete triggers uncounting
+    them, instead of dropping and recreating the triggers on every run.
+    """
+    archive.install_flag(conn)
+    kpi.install_archive_guard(conn)
+    rollups.install_archive_guard(conn)
+
+
+MIGRATIONS = [
+    (1, "Create Employee, Product and Sale tables", _create_base_tables),
+    (2, "Add indexes for low stock, recent sales and login", _create_route_indexes),
+    (3, "Install trigger-maintained dashboard KPIs", kpi.install),
+    (4, "Install per-product sales rollups", rollups.install),
+    (5, "Add per-product reorder levels and the low-stock partial index", _add_reorder_levels),
+    (6, "Install the dashboard change feed", events.install),
+    (7, "Add product barcodes and the catalog sort indexes", _add_barcodes_and_sort_indexes),
+    (8, "Install the FTS5 product search index", catalog.install),
+    (9, "Feed product edits and deletes to the change feed", barcodes.install),
+    (10, "Install the stock movement ledger and snapshots", stock.install),
+    (11, "Add supplier lead times for reorder suggestions", reorder.install),
+    (12, "Add the registry of archived sale months", archive.install),
+    (13, "Add the table of revoked session tokens", auth.install),
+    (14, "Let bulk imports index the product search in batches", catalog.install_bulk_indexing),
+    (15, "Add the index behind the catalog supplier filter", _add_supplier_index),
+    (16, "Let the archiver pause the Sale delete triggers with a flag", _guard_sale_delete_triggers),
+]
+
+
+def current_version(conn):
+    """Returns the schema version recorded in the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn):
+    """
+    Applies every migration newer than the database's schema version.
+    Returns the list of versions that were applied.
+    """
+    applied = []
+    version = current_version(conn)
+    for number, description, step in MIGRATIONS:
+        if number <= version:
+            continue
+        step(conn)
+        # PRAGMA statements cannot take bound parameters; `number` is an int.
+        conn.execute(f"PRAGMA user_version = {int(number)}")
+        conn.commit()
+        applied.append(number)
+    return applied
+
+
+# --- Query Plan Regression Check ---
+# Every query the API routes issue, with representative parameters.
+# Keep this list in sync with the SQL in app.py and the modules it calls.
+ROUTE_QUERIES = [
+    ("POST /api/login",
+     "SELECT * FROM Employee WHERE Username = ?",
+     ("user",)),
+    ("GET /api/products/lowstock",
+     "SELECT * FROM Product WHERE QuantityInStock <= ReorderLevel ORDER BY QuantityInStock ASC",
+     ()),
+    ("GET /api/sales/recent",
+     "SELECT * FROM Sale ORDER BY SaleDate DESC LIMIT 5",
+     ()),
+    ("GET /api/kpi/dashboard",
+     "SELECT TotalItemsInStock, TotalInventoryValue FROM KpiTotals WHERE Id = 1",
+     ()),
+    ("GET /api/kpi/dashboard",
+     "SELECT TotalAmount FROM SalesDaily WHERE SaleDay = date('now')",
+     ()),
+    ("GET /api/reports/sales",
+     "SELECT SaleDay, SaleCount, ItemsSold, TotalAmount FROM SalesDaily WHERE SaleDay BETWEEN ? AND ?",
+     ("2024-01-01", "2024-01-31")),
+    ("GET /api/reports/sales",
+     rollups.TOP_PRODUCTS_SQL,
+     ("2024-01-10", "2024-01-31", "2024-02", "2024-11", "2024-12-01", "2024-12-15", 10)),
+    ("GET /api/events/dashboard",
+     "SELECT ChangeID, Kind, EntityID FROM ChangeFeed WHERE ChangeID > ? ORDER BY ChangeID LIMIT ?",
+     (0, 1000)),
+    ("GET /api/products",
+     *catalog.build_query(catalog.parse_options({"sort": "name"}))),
+    ("GET /api/products",
+     *catalog.build_query(catalog.parse_options({"sort": "price", "order": "desc", "after": catalog.encode_cursor(9.99, 42)}))),
+    ("GET /api/products",
+     *catalog.build_query(catalog.parse_options({"q": "choc bar", "lowStock": "true"}))),
+    ("GET /api/products",
+     *catalog.build_query(catalog.parse_options({"supplierId": "3"}))),
+    ("GET /api/products",
+     *catalog.build_query(catalog.parse_options({"minQuantity": "100"}))),
+    ("GET /api/products",
+     *catalog.build_query(catalog.parse_options({"maxQuantity": "20", "sort": "name"}))),
+    ("GET /api/barcodes/<barcode>",
+     "SELECT ProductID, ProductName, Barcode, SalePrice, QuantityInStock FROM Product"
+     " WHERE Barcode = ? ORDER BY ProductID LIMIT 1",
+     ("4000000000012",)),
+    ("GET /api/stock",
+     "SELECT SnapshotID, TakenAt, LastMovementID FROM StockSnapshot WHERE TakenAt <= ?"
+     " ORDER BY TakenAt DESC, SnapshotID DESC LIMIT 1",
+     ("2024-03-01 23:59:59",)),
+    ("GET /api/stock",
+     "SELECT ProductID, COUNT(*), SUM(Delta) FROM StockMovement"
+     " WHERE MovementID > ? AND MovementID <= ? AND MovedAt <= ? GROUP BY ProductID",
+     (100, 200, "2024-03-01 23:59:59")),
+    ("GET /api/products/<id>/stock",
+     "SELECT COUNT(*), IFNULL(SUM(Delta), 0) FROM StockMovement"
+     " WHERE ProductID = ? AND MovementID > ? AND MovementID <= ? AND MovedAt <= ?",
+     (42, 100, 200, "2024-03-01 23:59:59")),
+    ("GET /api/products/<id>/movements",
+     "SELECT MovementID, Delta, Reason, SaleID, MovedAt FROM StockMovement"
+     " WHERE ProductID = ? AND MovementID < ? ORDER BY MovementID DESC LIMIT ?",
+     (42, 1000, 50)),
+    ("GET /api/products/reorder-suggestions",
+     "SELECT ProductID, CAST(julianday(?) - julianday(SaleDay) AS INTEGER), ItemsSold"
+     " FROM ProductSalesDaily WHERE SaleDay BETWEEN ? AND ?",
+     ("2024-03-28", "2024-03-01", "2024-03-28")),
+    ("GET /api/sales/history",
+     archive.HISTORY_SQL.format(table='Sale'),
+     ("2024-01-01", "2024-02-01", "2024-01-10 09:00:00", 1000, 101)),
+    ("GET /api/sales/history",
+     archive.ARCHIVED_MONTHS_SQL,
+     ("2024-01-01", "2024-02-01")),
+    ("GET /api/export/products",
+     export.page_sql('products'),
+     (0, export.PAGE_SIZE)),
+    ("GET /api/export/sales",
+     archive.EXPORT_SQL.format(table='Sale'),
+     (0, export.PAGE_SIZE)),
+]
+
+# "SCAN <table>" without "USING ... INDEX" is a full table scan.
+# Scans of subqueries and CTEs are fine; only real tables are checked.
+SCAN_PATTERN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+
+def explain(conn, sql, params=()):
+    """Returns the EXPLAIN QUERY PLAN detail lines for a statement."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def check_query_plans(conn):
+    """
+    Runs EXPLAIN QUERY PLAN for every route query.
+    Returns a list of (route, sql, plan) for each query that scans a table.
+    """
+    tables = {
+        row[0].lower() for row in
+        conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    failures = []
+    for route, sql, params in ROUTE_QUERIES:
+        plan = explain(conn, sql, params)
+        for detail in plan:
+            match = SCAN_PATTERN.match(detail)
+            if match and match.group(1).lower() in tables:
+                failures.append((route, sql, plan))
+                break
+    return failures
+
+
+# --- Command Line Entry Point ---
+if __name__ == '__main__':
+    from db import STORES, get_db_connection, release_db_connection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ('migrate', 'status', 'check'):
+        print("Usage: python schema.py migrate|status|check")
+        sys.exit(2)
+
+    # Every store's shard has the same schema.
+    failed = False
+    for store in STORES:
+        conn = get_db_connection(store)
+        try:
+            if command == 'status':
+                print(f"[{store}] Schema version {current_version(conn)} (latest {MIGRATIONS[-1][0]})")
+                continue
+
+            applied = migrate(conn)
+            print(f"[{store}] Applied migrations: {applied}" if applied else f"[{store}] Schema is up to date.")
+
+            if command == 'check':
+                failures = check_query_plans(conn)
+                for route, sql, plan in failures:
+                    print(f"\nFULL SCAN in {route}:\n  {' '.join(sql.split())}")
+                    for detail in plan:
+                        print(f"    {detail}")
+                print(f"\n[{store}] {len(ROUTE_QUERIES) - len(failures)}/{len(ROUTE_QUERIES)} route queries use indexes.")
+                failed = failed or bool(failures)
+        finally:
+            release_db_connection(conn)
+    sys.exit(1 if failed else 0)
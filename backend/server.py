@@ -0,0 +1,233 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Prefork Production Server
+# ==============================================================================
+#
+# `python app.py` runs Flask's development server: one process, with the
+# debug reloader. For production, this module serves the same application
+# (app.create_app()) from several worker processes that share one listening
+# socket:
+#
+#   1. The parent builds the application once: imports, schema migrations,
+#      the URL map and every store's in-memory barcode index, which is the
+#      largest structure a process holds.
+#   2. It then closes every SQLite connection it opened (a connection must
+#      never be used, or closed, on both sides of a fork()), freezes the
+#      garbage collector's view of the heap with gc.freeze() (so collections
+#      in the workers do not write to the shared pages and copy them), opens
+#      the listening socket and forks WORKERS workers.
+#   3. Each worker starts with that warm heap, shared copy-on-write with the
+#      parent and the other workers. It only has to open its own
+#      connections: WARM_CONNECTIONS read-only connections per store, tuned
+#      by their pragmas, with the dashboard statements already prepared in
+#      their statement caches. It then serves requests on threads; the
+#      kernel spreads incoming connections across the workers.
+#   4. The parent restarts a worker that dies, and stops them all on
+#      SIGINT or SIGTERM.
+#
+# Startup time and memory are printed at boot: the parent's build time and
+# RSS, then each worker's warm-up time, RSS and (on Linux) the private part
+# of its RSS, i.e. the memory it does not share with the other processes.
+#
+# The response cache, session cache, metrics and pool statistics are kept
+# per worker. Without fork() (Windows), a single process serves instead.
+#
+# Limitations:
+#
+#   - Every worker has its own write queue per store (writer.py), so there
+#     are WORKERS writers, not one. Each still groups its own requests into
+#     batches, but the workers' batches take turns on SQLite's single write
+#     lock, waiting up to busy_timeout for it, and a write can fail with
+#     "database is locked" once enough workers queue behind a long batch.
+#     The number of workers is therefore capped at MAX_WORKERS; the threads
+#     within each worker carry the concurrency.
+#   - Nothing is scheduled per worker. The stock snapshot is checked against
+#     the database by whichever writer commits next (see stock.py), and a
+#     backup only runs when POST /api/backup/start asks for one, in the
+#     worker that received the request.
+#   - The workers serve with werkzeug's make_server(): threaded, but with no
+#     request timeouts, no limit on threads and no protection against slow
+#     clients. It is a stopgap. Keep it behind a reverse proxy (nginx) that
+#     buffers requests and enforces timeouts, or serve create_app() from a
+#     production WSGI server with the same prefork model, e.g.
+#     gunicorn --preload -w 4 --threads 8 'app:create_app()'.
+#
+# Usage (from the backend directory):
+#   python server.py                                  - serve on HOST:PORT
+#   TRACKWISE_WORKERS=4 TRACKWISE_PORT=8000 python server.py
+
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# --- Configuration ---
+HOST = os.environ.get('TRACKWISE_HOST', '127.0.0.1')
+PORT = int(os.environ.get('TRACKWISE_PORT', '5000'))
+MAX_WORKERS = 4               # each worker adds a writer per store (see above)
+WORKERS = int(os.environ.get('TRACKWISE_WORKERS', str(min(os.cpu_count() or 2, MAX_WORKERS))))
+WARM_CONNECTIONS = 2          # read-only connections per store opened by each worker
+LISTEN_BACKLOG = 1024
+RESPAWN_DELAY_SECONDS = 1     # pause before replacing a worker that died
+
+
+def _mib(size):
+    return "n/a" if size is None else f"{size / (1024 * 1024):.1f} MiB"
+
+
+def memory_usage():
+    """
+    Returns (RSS, private) in bytes for this process. Private is the part
+    not shared with other processes; it is only known on Linux.
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as rollup:
+            fields = {
+                line.split(':')[0]: int(line.split()[1]) * 1024
+                for line in rollup if line.rstrip().endswith(' kB')
+            }
+        return fields['Rss'], fields['Private_Clean'] + fields['Private_Dirty']
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # Peak RSS: KiB on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024, None
+
+
+# --- Process State ---
+
+def release_connections():
+    """Closes every SQLite connection this process holds; called before forking."""
+    from barcodes import barcode_indexes
+    from db import pools, read_pools
+
+    for manager in list(pools.values()) + list(read_pools.values()):
+        manager.close_all()
+    for _, index in barcode_indexes.items():
+        index.close()
+
+
+def warm_connections():
+    """
+    Opens WARM_CONNECTIONS read-only connections per store and runs the
+    dashboard queries on each, so their statements are prepared and the
+    pages they read are cached before the first request.
+    """
+    import dashboard
+    from db import STORES, get_db_connection, release_db_connection
+
+    for store in STORES:
+        connections = [get_db_connection(store, readonly=True) for _ in range(WARM_CONNECTIONS)]
+        try:
+            for conn in connections:
+                dashboard.read_bundle(conn)
+        finally:
+            for conn in connections:
+                release_db_connection(conn)
+
+
+# --- Serving ---
+
+def _serve(app, listener, name):
+    """Warms this process's connections, reports, and serves until killed."""
+    from werkzeug.serving import make_server
+
+    started = time.perf_counter()
+    warm_connections()
+    server = make_server(HOST, PORT, app, threaded=True, fd=listener.fileno())
+    rss, private = memory_usage()
+    print(f"[{name}] pid {os.getpid()} ready in {time.perf_counter() - started:.3f}s, "
+          f"RSS {_mib(rss)}, private {_mib(private)}", flush=True)
+    server.serve_forever()
+
+
+def _spawn(app, listener, number):
+    """Forks worker number; returns its pid in the parent, never returns in the worker."""
+    pid = os.fork()
+    if pid:
+        return pid
+    status = 1
+    try:
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        _serve(app, listener, f"worker {number}")
+        status = 0
+    except Exception as e:
+        print(f"[worker {number}] failed: {e}", flush=True)
+    finally:
+        os._exit(status)
+
+
+def _stop(signum, frame):
+    raise SystemExit(0)
+
+
+def main():
+    started = time.perf_counter()
+    # Imported here so the startup time includes Flask and the app modules.
+    from app import create_app
+
+    # 1. Build the application and its warm state once, in the parent.
+    app = create_app()
+    listener = socket.create_server((HOST, PORT), backlog=LISTEN_BACKLOG)
+    rss, _ = memory_usage()
+    print(f"TrackWise built in {time.perf_counter() - started:.3f}s, RSS {_mib(rss)}; "
+          f"listening on http://{HOST}:{PORT}", flush=True)
+
+    if not hasattr(os, 'fork'):
+        print("fork() is not available; serving from a single process.", flush=True)
+        _serve(app, listener, "server")
+        return
+
+    # 2. Nothing SQLite crosses the fork; everything else is shared.
+    release_connections()
+    gc.freeze()
+
+    # 3. Fork the workers, and replace any that die until told to stop.
+    count = min(WORKERS, MAX_WORKERS)
+    if count < WORKERS:
+        print(f"TRACKWISE_WORKERS={WORKERS} exceeds the cap of {MAX_WORKERS} writers per store; "
+              f"starting {count}.", flush=True)
+    workers = {}
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    try:
+        for number in range(1, count + 1):
+            workers[_spawn(app, listener, number)] = number
+        print(f"Started {count} workers in {time.perf_counter() - started:.3f}s.", flush=True)
+        while True:
+            pid, status = os.wait()
+            number = workers.pop(pid, None)
+            if number is None:
+                continue
+            print(f"[worker {number}] pid {pid} exited ({status}); restarting.", flush=True)
+            time.sleep(RESPAWN_DELAY_SECONDS)
+            workers[_spawn(app, listener, number)] = number
+    except SystemExit:
+        pass
+    finally:
+        # 4. Stop the workers.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in workers:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        listener.close()
+        print("TrackWise stopped.", flush=True)
+
+
+# --- Command Line Entry Point ---
+if __name__ == '__main__':
+    main()
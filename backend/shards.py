@@ -0,0 +1,144 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Cross-Store Fan-Out
+# ==============================================================================
+#
+# Every store is its own database shard (see db.py), so a view over all
+# stores (store=all) has to ask each of them. The shards are independent
+# files, so they are queried in parallel:
+#
+#   - fan_out.run() runs the same function against every shard on a small
+#     thread pool, each with a read-only connection from that store. SQLite
+#     releases the GIL while it works, so the total time is roughly that of
+#     the slowest shard rather than the sum.
+#   - Lists that every shard returns already sorted (low stock by quantity,
+#     recent sales by date) are combined with a k-way merge (heapq.merge),
+#     which reads each shard's rows once and stops as soon as the limit is
+#     reached. Each row is tagged with its store, since IDs repeat across
+#     shards.
+#   - Dashboard totals are summed, with the per-store figures alongside.
+#   - The dashboard bundle (see dashboard.py) reads each shard's KPIs and
+#     lists in one read transaction, then sums and merges them as above.
+
+import heapq
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import dashboard
+import kpi
+from db import STORES, get_db_connection, read_transaction, release_db_connection
+
+# --- Configuration ---
+FANOUT_WORKERS = int(os.environ.get('TRACKWISE_FANOUT_WORKERS', '8'))
+
+
+class FanOut:
+    """Runs a query against every store's shard in parallel."""
+
+    def __init__(self, max_workers=FANOUT_WORKERS):
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+
+    def _pool(self):
+        # Created lazily, and again after a fork: a forked process does not
+        # inherit the parent's worker threads.
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=min(self.max_workers, len(STORES)), thread_name_prefix='trackwise-fanout'
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def run(self, query, stores=None):
+        """
+        Calls query(conn) once per store and returns [(store, result), ...]
+        in store order. The first failure is raised once all have finished.
+        """
+        stores = list(stores or STORES)
+
+        def on_shard(store):
+            conn = get_db_connection(store, readonly=True)
+            try:
+                return query(conn)
+            finally:
+                release_db_connection(conn)
+
+        futures = [(store, self._pool().submit(on_shard, store)) for store in stores]
+        return [(store, future.result()) for store, future in futures]
+
+
+# --- Merging ---
+
+def _fetch_rows(sql, params):
+    def query(conn):
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(sql, params)
+        return [description[0] for description in cursor.description], cursor.fetchall()
+    return query
+
+
+def merge_lists(sql, params=(), sort_column=None, descending=False, limit=None, fmt='rows'):
+    """
+    Runs a list query on every shard and k-way merges the results, which
+    each shard must return ordered by sort_column. Rows gain a leading
+    "Store" column. Returns the same shapes as payload.fetch_list().
+    """
+    return _merge(fan_out.run(_fetch_rows(sql, params)), sort_column, descending, limit, fmt)
+
+
+def _merge(results, sort_column, descending, limit, fmt):
+    """K-way merges [(store, (columns, rows)), ...] into one list."""
+    columns = ['Store'] + (results[0][1][0] if results else [])
+    key_index = columns.index(sort_column)
+    shards = [[(store,) + row for row in rows] for store, (_, rows) in results]
+    merged = heapq.merge(*shards, key=lambda row: row[key_index], reverse=descending)
+    rows = list(itertools.islice(merged, limit))
+
+    if fmt == 'columnar':
+        return {"columns": columns, "rows": rows, "count": len(rows)}
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def dashboard_totals():
+    """Sums the dashboard KPIs of every store, with each store's own figures."""
+    return _sum_kpis(dict(fan_out.run(kpi.read_dashboard)))
+
+
+def _sum_kpis(per_store):
+    totals = {
+        name: round(sum(kpis[name] for kpis in per_store.values()), 2)
+        for name in ("totalSalesToday", "totalItemsInStock", "totalInventoryValue")
+    }
+    totals["stores"] = per_store
+    return totals
+
+
+def dashboard_bundle(fmt='rows'):
+    """
+    The dashboard bundle over every store: each shard's KPIs, low stock
+    list and recent sales are read in one read transaction on that shard.
+    """
+    low_stock_query = _fetch_rows(dashboard.LOW_STOCK_SQL, ())
+    recent_sales_query = _fetch_rows(dashboard.RECENT_SALES_SQL, ())
+
+    def query(conn):
+        with read_transaction(conn):
+            return kpi.read_dashboard(conn), low_stock_query(conn), recent_sales_query(conn)
+
+    results = fan_out.run(query)
+    return {
+        "kpis": _sum_kpis({store: kpis for store, (kpis, _, _) in results}),
+        "lowStock": _merge([(store, rows) for store, (_, rows, _) in results],
+                           'QuantityInStock', False, None, fmt),
+        "recentSales": _merge([(store, rows) for store, (_, _, rows) in results],
+                              'SaleDate', True, dashboard.RECENT_SALES_LIMIT, fmt),
+    }
+
+
+# --- Shared Instance ---
+fan_out = FanOut()
@@ -0,0 +1,139 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Slow-Query Log
+# ==============================================================================
+#
+# The metrics say which statement is slow; this log says why. Any statement
+# whose execution (execute plus the fetches that follow it) takes longer than
+# SLOW_QUERY_MS is recorded by the instrumented cursors in db.py:
+#
+#   - Occurrences are collapsed by normalized SQL (see metrics.statement_label)
+#     into a digest with a count, total and worst time, rows returned and the
+#     shapes of the bound parameters. Parameter values are never stored, so
+#     usernames and other user input do not end up in the log.
+#   - The first time a statement turns up slow, its EXPLAIN QUERY PLAN is
+#     captured on the same connection, so a full scan or a temporary B-tree
+#     is visible right next to the timing.
+#   - Each slow occurrence is also printed to the server log.
+#
+# The digest is served at GET /api/debug/slow-queries.
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+# --- Configuration ---
+SLOW_QUERY_MS = float(os.environ.get('TRACKWISE_SLOW_QUERY_MS', '100'))
+MAX_DIGESTS = 200          # distinct slow statements kept (least recently seen dropped)
+MAX_PARAMETER_SHAPES = 10  # distinct parameter shapes kept per statement
+
+
+def parameter_shape(parameters):
+    """Describes bound parameters by type only, e.g. '(int, str)' or '{name: str}'."""
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f"{key}: {type(value).__name__}" for key, value in parameters.items()) + '}'
+    if isinstance(parameters, (tuple, list)):
+        return '(' + ', '.join(type(value).__name__ for value in parameters) + ')'
+    # executemany(): an iterable of parameter sets, consumed by SQLite.
+    return 'many'
+
+
+def explain(conn, sql, parameters):
+    """
+    Returns the EXPLAIN QUERY PLAN lines for a statement, or None if it
+    cannot be explained (DDL, transaction control, executemany).
+    """
+    if not isinstance(parameters, (tuple, list, dict)):
+        return None
+    try:
+        # A plain cursor, so the EXPLAIN itself is not instrumented.
+        rows = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", parameters).fetchall()
+    except sqlite3.Error:
+        return None
+    return [row[3] for row in rows] or None
+
+
+class SlowQueryLog:
+    """Thread-safe digest of slow statements, keyed by normalized SQL."""
+
+    def __init__(self, threshold_ms=SLOW_QUERY_MS, max_digests=MAX_DIGESTS):
+        self.threshold = threshold_ms / 1000.0
+        self.max_digests = max_digests
+        self._digests = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, conn, label, sql, parameters, elapsed, rows):
+        """
+        Records a statement that crossed the threshold and returns its
+        occurrence handle, which extend() uses to add later fetches.
+        """
+        shape = parameter_shape(parameters)
+        with self._lock:
+            digest = self._digests.get(label)
+            needs_plan = digest is None
+            if digest is None:
+                digest = self._digests[label] = {
+                    "statement": label,
+                    "sql": ' '.join(sql.split()),
+                    "count": 0,
+                    "totalMs": 0.0,
+                    "maxMs": 0.0,
+                    "rows": 0,
+                    "parameterShapes": [],
+                    "plan": None,
+                    "firstSeen": _utc_now(),
+                    "lastSeen": None,
+                }
+                while len(self._digests) > self.max_digests:
+                    self._digests.popitem(last=False)
+            self._digests.move_to_end(label)
+            digest["count"] += 1
+            digest["totalMs"] += elapsed * 1000
+            digest["maxMs"] = max(digest["maxMs"], elapsed * 1000)
+            digest["rows"] += rows
+            digest["lastSeen"] = _utc_now()
+            if shape not in digest["parameterShapes"] and len(digest["parameterShapes"]) < MAX_PARAMETER_SHAPES:
+                digest["parameterShapes"].append(shape)
+
+        if needs_plan:
+            plan = explain(conn, sql, parameters)
+            with self._lock:
+                digest["plan"] = plan
+        print(f"Slow query ({elapsed * 1000:.1f} ms, {rows} rows, params {shape}): {label}")
+        if needs_plan and digest["plan"]:
+            print("  plan: " + " | ".join(digest["plan"]))
+        return {"digest": digest, "elapsed": elapsed}
+
+    def extend(self, occurrence, seconds, rows):
+        """Adds fetch time and rows to an occurrence that was already recorded."""
+        with self._lock:
+            digest = occurrence["digest"]
+            occurrence["elapsed"] += seconds
+            digest["totalMs"] += seconds * 1000
+            digest["maxMs"] = max(digest["maxMs"], occurrence["elapsed"] * 1000)
+            digest["rows"] += rows
+
+    def digest(self):
+        """Returns the slow statements, worst total time first."""
+        with self._lock:
+            entries = [dict(entry, parameterShapes=list(entry["parameterShapes"]))
+                       for entry in self._digests.values()]
+        for entry in entries:
+            entry["totalMs"] = round(entry["totalMs"], 3)
+            entry["maxMs"] = round(entry["maxMs"], 3)
+            entry["avgMs"] = round(entry["totalMs"] / entry["count"], 3)
+        entries.sort(key=lambda entry: entry["totalMs"], reverse=True)
+        return {"thresholdMs": self.threshold * 1000, "queries": entries}
+
+    def clear(self):
+        with self._lock:
+            self._digests.clear()
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+# --- Shared Instance ---
+slow_queries = SlowQueryLog()
@@ -0,0 +1,369 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Stock Movement Ledger and Snapshots
+# ==============================================================================
+#
+# Product.QuantityInStock only holds the current number. To answer "what was
+# in stock on March 1" or to reconcile shrinkage, every change is now also
+# recorded in an append-only ledger:
+#
+#   - StockMovement gets one row per stock change: the product, the signed
+#     delta, the reason (receipt, sale or adjustment) and the time. Triggers
+#     on Product write the rows, so no code path (or hand-written SQL) can
+#     change stock without a trace. A new product's initial quantity is
+#     recorded as a receipt, and any other change as an adjustment until the
+#     code that made it labels it (label_last_movement), in the same
+#     transaction.
+#   - StockSnapshot/StockSnapshotItem hold the quantity of every product at a
+#     point in time. One is taken when the ledger is installed (the opening
+#     balance) and then every SNAPSHOT_INTERVAL_HOURS by the writer (see
+#     writer.py), in a transaction of its own after a batch commits, so a
+#     full-catalog copy never holds up the sale that happened to be due.
+#   - The stock at time T is the nearest snapshot at or before T plus the
+#     movements between that snapshot and T. Those movements all fall between
+#     two consecutive snapshots, so the replay is bounded by one interval of
+#     activity however long the history gets.
+#
+# Usage (from the backend directory):
+#   python stock.py snapshot                   - take a snapshot now
+#   python stock.py at "2024-03-01" [ProductID] - stock at the end of a day
+
+import os
+import re
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+# --- Configuration ---
+SNAPSHOT_INTERVAL_HOURS = float(os.environ.get('TRACKWISE_SNAPSHOT_HOURS', '24'))
+SNAPSHOT_CHECK_SECONDS = 60     # how often the write path checks whether one is due
+MOVEMENT_REASONS = ('receipt', 'sale', 'adjustment')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# --- Schema ---
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS StockMovement (
+    MovementID INTEGER PRIMARY KEY AUTOINCREMENT,
+    ProductID INTEGER NOT NULL,
+    Delta INTEGER NOT NULL,
+    Reason TEXT NOT NULL DEFAULT 'adjustment',
+    SaleID INTEGER,
+    MovedAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_movement_product ON StockMovement (ProductID, MovementID);
+
+CREATE TABLE IF NOT EXISTS StockSnapshot (
+    SnapshotID INTEGER PRIMARY KEY AUTOINCREMENT,
+    TakenAt TEXT NOT NULL,
+    LastMovementID INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_snapshot_taken ON StockSnapshot (TakenAt);
+
+CREATE TABLE IF NOT EXISTS StockSnapshotItem (
+    SnapshotID INTEGER NOT NULL,
+    ProductID INTEGER NOT NULL,
+    Quantity INTEGER NOT NULL,
+    PRIMARY KEY (SnapshotID, ProductID)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_product_insert AFTER INSERT ON Product
+WHEN NEW.QuantityInStock <> 0
+BEGIN
+    INSERT INTO StockMovement (ProductID, Delta, Reason)
+    VALUES (NEW.ProductID, NEW.QuantityInStock, 'receipt');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_product_stock AFTER UPDATE OF QuantityInStock ON Product
+WHEN OLD.QuantityInStock IS NOT NEW.QuantityInStock
+BEGIN
+    INSERT INTO StockMovement (ProductID, Delta, Reason)
+    VALUES (NEW.ProductID, NEW.QuantityInStock - OLD.QuantityInStock, 'adjustment');
+END;
+"""
+
+
+class StockError(ValueError):
+    """A stock change that cannot be made; `status` is the HTTP status to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def install(conn):
+    """Creates the ledger tables and triggers, and records the opening balance."""
+    conn.executescript(SCHEMA)
+    if conn.execute("SELECT 1 FROM StockSnapshot LIMIT 1").fetchone() is None:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            take_snapshot(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def _utc_timestamp(moment=None):
+    return (moment or datetime.now(timezone.utc)).strftime(TIMESTAMP_FORMAT)
+
+
+# --- Writing ---
+
+def label_last_movement(conn, reason, sale_id=None):
+    """
+    Sets the reason (and sale) of the movement the caller's last stock
+    update just wrote. Must run in the same transaction as that update.
+    """
+    conn.execute(
+        """UPDATE StockMovement SET Reason = ?, SaleID = ?
+           WHERE MovementID = (SELECT seq FROM sqlite_sequence WHERE name = 'StockMovement')""",
+        (reason, sale_id)
+    )
+
+
+def movement_request(data):
+    """
+    Validates a stock change payload ({quantity, reason}) and returns
+    (delta, reason). Receipts must add stock; adjustments may go either way.
+    """
+    if not isinstance(data, dict):
+        raise StockError("Invalid request format")
+    reason = data.get('reason', 'adjustment')
+    if reason not in ('receipt', 'adjustment'):
+        raise StockError("reason must be receipt or adjustment")
+    try:
+        delta = int(data.get('quantity'))
+    except (TypeError, ValueError):
+        raise StockError("quantity must be a non-zero integer")
+    if delta == 0 or (reason == 'receipt' and delta < 0):
+        raise StockError("quantity must be positive for a receipt and non-zero for an adjustment")
+    return delta, reason
+
+
+def adjust_stock(conn, product_id, delta, reason):
+    """
+    Applies a receipt or adjustment on the writer's connection and returns
+    the new quantity. Stock may not go below zero.
+    """
+    product = conn.execute(
+        "SELECT QuantityInStock FROM Product WHERE ProductID = ?", (product_id,)
+    ).fetchone()
+    if product is None:
+        raise StockError("Product not found", status=404)
+    quantity = product['QuantityInStock'] + delta
+    if quantity < 0:
+        raise StockError("Stock cannot go below zero", status=409)
+
+    conn.execute("UPDATE Product SET QuantityInStock = ? WHERE ProductID = ?", (quantity, product_id))
+    label_last_movement(conn, reason)
+    return quantity
+
+
+def take_snapshot(conn):
+    """
+    Records every product's current quantity. The caller provides the
+    transaction, so the snapshot and its ledger position are consistent.
+    Returns the new SnapshotID.
+    """
+    last_movement_id = conn.execute(
+        "SELECT IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'StockMovement'), 0)"
+    ).fetchone()[0]
+    snapshot_id = conn.execute(
+        "INSERT INTO StockSnapshot (TakenAt, LastMovementID) VALUES (?, ?)",
+        (_utc_timestamp(), last_movement_id)
+    ).lastrowid
+    conn.execute(
+        """INSERT INTO StockSnapshotItem (SnapshotID, ProductID, Quantity)
+           SELECT ?, ProductID, QuantityInStock FROM Product""",
+        (snapshot_id,)
+    )
+    return snapshot_id
+
+
+class SnapshotSchedule:
+    """
+    Takes a snapshot once the latest one is older than SNAPSHOT_INTERVAL_HOURS.
+    Only writer threads call maybe_take() (one per store, each with its own
+    schedule), between batches, and the check costs a clock read except once
+    every SNAPSHOT_CHECK_SECONDS.
+    """
+
+    def __init__(self, interval_hours=SNAPSHOT_INTERVAL_HOURS):
+        self.interval = timedelta(hours=interval_hours)
+        self._next_check = {}
+
+    def maybe_take(self, conn):
+        """
+        Takes the snapshot if one is due, in its own write transaction (conn
+        must have none open). The database decides, so writers in other
+        worker processes never take a second one. Returns the new
+        SnapshotID, or None.
+        """
+        now = time.monotonic()
+        store = getattr(conn, 'store', None)
+        if now < self._next_check.get(store, 0.0):
+            return None
+        self._next_check[store] = now + SNAPSHOT_CHECK_SECONDS
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            snapshot_id = None
+            latest = conn.execute("SELECT MAX(TakenAt) FROM StockSnapshot").fetchone()[0]
+            if latest is None or latest <= _utc_timestamp(datetime.now(timezone.utc) - self.interval):
+                snapshot_id = take_snapshot(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return snapshot_id
+
+
+# --- Point-in-Time Reads ---
+
+_DATE_ONLY = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def parse_moment(text):
+    """
+    Parses ?at= into a ledger timestamp (UTC). A bare date means the end of
+    that day, i.e. the closing stock; no value means now.
+    """
+    text = (text or '').strip().replace('T', ' ').rstrip('Z')
+    if not text:
+        return _utc_timestamp()
+    if _DATE_ONLY.match(text):
+        text += ' 23:59:59'
+    try:
+        return datetime.strptime(text[:19], TIMESTAMP_FORMAT).strftime(TIMESTAMP_FORMAT)
+    except ValueError:
+        raise StockError("at must be a date (YYYY-MM-DD) or a UTC time (YYYY-MM-DD HH:MM:SS)")
+
+
+def _snapshot_window(conn, moment):
+    """
+    Returns (snapshot, upper movement bound) for a moment: the nearest
+    snapshot at or before it and the ledger position of the one after.
+    """
+    snapshot = conn.execute(
+        "SELECT SnapshotID, TakenAt, LastMovementID FROM StockSnapshot WHERE TakenAt <= ? "
+        "ORDER BY TakenAt DESC, SnapshotID DESC LIMIT 1",
+        (moment,)
+    ).fetchone()
+    if snapshot is None:
+        first = conn.execute("SELECT MIN(TakenAt) FROM StockSnapshot").fetchone()[0]
+        raise StockError(f"No stock history before {first}", status=404)
+    following = conn.execute(
+        "SELECT LastMovementID FROM StockSnapshot WHERE TakenAt > ? ORDER BY TakenAt, SnapshotID LIMIT 1",
+        (moment,)
+    ).fetchone()
+    if following is not None:
+        upper = following[0]
+    else:
+        upper = conn.execute(
+            "SELECT IFNULL((SELECT seq FROM sqlite_sequence WHERE name = 'StockMovement'), 0)"
+        ).fetchone()[0]
+    return snapshot, upper
+
+
+def product_stock_at(conn, product_id, moment):
+    """Returns one product's stock at a moment, from its snapshot row plus its tail."""
+    snapshot, upper = _snapshot_window(conn, moment)
+    base = conn.execute(
+        "SELECT Quantity FROM StockSnapshotItem WHERE SnapshotID = ? AND ProductID = ?",
+        (snapshot['SnapshotID'], product_id)
+    ).fetchone()
+    tail = conn.execute(
+        """SELECT COUNT(*), IFNULL(SUM(Delta), 0) FROM StockMovement
+           WHERE ProductID = ? AND MovementID > ? AND MovementID <= ? AND MovedAt <= ?""",
+        (product_id, snapshot['LastMovementID'], upper, moment)
+    ).fetchone()
+    return {
+        "at": moment,
+        "productId": product_id,
+        "quantity": (base[0] if base else 0) + tail[1],
+        "snapshotTakenAt": snapshot['TakenAt'],
+        "replayedMovements": tail[0],
+    }
+
+
+def stock_at(conn, moment):
+    """
+    Returns every product's stock at a moment as columns plus rows:
+    the snapshot quantities with the tail of movements applied.
+    """
+    snapshot, upper = _snapshot_window(conn, moment)
+    quantities = dict(conn.execute(
+        "SELECT ProductID, Quantity FROM StockSnapshotItem WHERE SnapshotID = ?",
+        (snapshot['SnapshotID'],)
+    ).fetchall())
+    replayed = 0
+    for product_id, movements, delta in conn.execute(
+        """SELECT ProductID, COUNT(*), SUM(Delta) FROM StockMovement
+           WHERE MovementID > ? AND MovementID <= ? AND MovedAt <= ?
+           GROUP BY ProductID""",
+        (snapshot['LastMovementID'], upper, moment)
+    ):
+        quantities[product_id] = quantities.get(product_id, 0) + delta
+        replayed += movements
+    return {
+        "at": moment,
+        "snapshotTakenAt": snapshot['TakenAt'],
+        "replayedMovements": replayed,
+        "columns": ["ProductID", "Quantity"],
+        "rows": sorted(quantities.items()),
+    }
+
+
+def movements(conn, product_id, limit=50, before=None):
+    """Returns a product's ledger, newest first, one keyset page at a time."""
+    rows = conn.execute(
+        """SELECT MovementID, Delta, Reason, SaleID, MovedAt FROM StockMovement
+           WHERE ProductID = ? AND MovementID < ?
+           ORDER BY MovementID DESC LIMIT ?""",
+        (product_id, before if before is not None else sys.maxsize, limit)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+# --- Shared Instance ---
+snapshot_schedule = SnapshotSchedule()
+
+
+# --- Command Line Entry Point ---
+if __name__ == '__main__':
+    import json
+
+    from db import STORES, get_db_connection, release_db_connection
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ('snapshot', 'at') or (command == 'at' and len(sys.argv) < 3):
+        print('Usage: python stock.py snapshot | python stock.py at "YYYY-MM-DD[ HH:MM:SS]" [ProductID]')
+        sys.exit(2)
+
+    try:
+        moment = parse_moment(sys.argv[2]) if command == 'at' else None
+    except StockError as e:
+        print(e)
+        sys.exit(1)
+
+    failed = False
+    for store in STORES:
+        conn = get_db_connection(store, readonly=False)
+        try:
+            if command == 'snapshot':
+                conn.execute("BEGIN IMMEDIATE")
+                snapshot_id = take_snapshot(conn)
+                conn.commit()
+                print(f"[{store}] Snapshot {snapshot_id} taken.")
+            elif len(sys.argv) > 3:
+                print(f"[{store}] " + json.dumps(product_stock_at(conn, int(sys.argv[3]), moment), indent=2))
+            else:
+                result = stock_at(conn, moment)
+                print(f"[{store}] Stock at {moment}: {len(result['rows'])} products, "
+                      f"{sum(quantity for _, quantity in result['rows'])} items "
+                      f"(snapshot {result['snapshotTakenAt']} + {result['replayedMovements']} movements)")
+        except StockError as e:
+            # Reported per store: the others may still have an answer.
+            print(f"[{store}] {e}")
+            failed = True
+        finally:
+            release_db_connection(conn)
+    sys.exit(1 if failed else 0)
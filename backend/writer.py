@@ -0,0 +1,200 @@
+# ==============================================================================
+# TrackWise Inventory Management System - Group-Commit Write Queue
+# ==============================================================================
+#
+# Every write used to run on its own short-lived connection and commit on its
+# own. With several concurrent writers, SQLite serializes them anyway: each
+# waits on the database lock and pays for its own commit.
+#
+# Product and sale writes now go through a single writer thread instead:
+#
+#   - Request handlers submit a write operation (a function that receives the
+#     writer's connection and returns a value, usually the new row ID) and
+#     wait on a Future for its result.
+#   - The writer collects whatever arrives within BATCH_WINDOW_SECONDS (up to
+#     MAX_BATCH_SIZE operations) and runs the whole batch in one transaction,
+#     so N concurrent writes cost one commit.
+#   - Each operation runs inside its own SAVEPOINT: one failing operation is
+#     rolled back and reported to its caller without affecting the others.
+#   - The queue is bounded. When it is full, submit() raises WriteQueueFull
+#     and the API answers 503, which is explicit backpressure.
+#   - Each store has its own queue and writer thread (write_queues.get()),
+#     so stores commit independently.
+#   - Every events.PRUNE_EVERY_WRITES committed writes, the writer also
+#     prunes the change feed (see events.py).
+#   - After a batch, the writer also takes the periodic stock snapshot when
+#     one is due (see stock.py), in a transaction of its own rather than
+#     inside the batch of the write that happened to be due.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import events
+import stock
+from db import PerStore, get_db_connection, release_db_connection
+
+# --- Configuration ---
+MAX_PENDING_WRITES = 1024     # queue bound; beyond this, writes are rejected
+MAX_BATCH_SIZE = 256          # operations per transaction
+BATCH_WINDOW_SECONDS = 0.002  # how long the writer gathers a batch
+WRITE_TIMEOUT_SECONDS = 10    # how long a request waits for its result
+
+
+class WriteQueueFull(Exception):
+    """Raised by submit() when too many writes are already pending."""
+
+
+# Raised by execute() when the result is not ready in time. The operation
+# stays queued and may still commit, so callers should not treat it as failed.
+WriteTimeout = FutureTimeoutError
+
+
+class WriteQueue:
+    """A bounded queue of write operations drained by a single writer thread."""
+
+    def __init__(self, store=None, max_pending=MAX_PENDING_WRITES, max_batch=MAX_BATCH_SIZE,
+                 batch_window=BATCH_WINDOW_SECONDS):
+        self.store = store
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._since_prune = 0
+        self._stats = {"submitted": 0, "rejected": 0, "batches": 0, "committed": 0, "failed": 0}
+
+    # --- Public API ---
+
+    def submit(self, operation):
+        """
+        Queues operation(conn) for the writer thread and returns a Future that
+        resolves (after the batch commits) to the operation's return value.
+        """
+        self._ensure_started()
+        future = Future()
+        try:
+            self._queue.put_nowait((operation, future))
+        except queue.Full:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise WriteQueueFull("Too many pending writes")
+        with self._lock:
+            self._stats["submitted"] += 1
+        return future
+
+    def execute(self, operation, timeout=WRITE_TIMEOUT_SECONDS):
+        """
+        Submits an operation and blocks until its result is available.
+        Raises WriteTimeout if it is not available within timeout seconds.
+        """
+        return self.submit(operation).result(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["pending"] = self._queue.qsize()
+        snapshot["avgBatchSize"] = (
+            round(snapshot["committed"] / snapshot["batches"], 2) if snapshot["batches"] else None
+        )
+        return snapshot
+
+    # --- Writer Thread ---
+
+    def _ensure_started(self):
+        # Started lazily so a forked worker process gets its own writer.
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"trackwise-writer-{self.store}",
+                                                daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        """Blocks for the first operation, then gathers more for a short window."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        # The store's one read-write connection for queued writes.
+        conn = get_db_connection(self.store, readonly=False)
+        try:
+            while True:
+                self._commit_batch(conn, self._next_batch())
+        finally:
+            release_db_connection(conn)
+
+    def _commit_batch(self, conn, batch):
+        """Runs a batch in one transaction, then resolves every Future."""
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for operation, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT write_operation")
+                try:
+                    value = operation(conn)
+                    conn.execute("RELEASE write_operation")
+                    results.append((future, value, None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_operation")
+                    conn.execute("RELEASE write_operation")
+                    results.append((future, None, e))
+            conn.commit()
+        except Exception as e:
+            # The transaction itself failed (e.g. BEGIN IMMEDIATE timed out
+            # on the lock): nothing in the batch was written. Every caller
+            # still waiting gets the error now rather than at its timeout.
+            print(f"Write batch error: {e}")
+            if conn.in_transaction:
+                conn.rollback()
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            with self._lock:
+                self._stats["failed"] += len(batch)
+            return
+
+        # Only report success once the data is committed.
+        failed = 0
+        for future, value, error in results:
+            if error is None:
+                future.set_result(value)
+            else:
+                future.set_exception(error)
+                failed += 1
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["committed"] += len(results) - failed
+            self._stats["failed"] += failed
+
+        # Keep the change feed short, after the callers have their results.
+        self._since_prune += len(results) - failed
+        if self._since_prune >= events.PRUNE_EVERY_WRITES:
+            self._since_prune = 0
+            try:
+                events.prune(conn)
+                conn.commit()
+            except Exception as e:
+                print(f"Change feed prune error: {e}")
+                if conn.in_transaction:
+                    conn.rollback()
+
+        # Take the periodic stock snapshot, if due, in a transaction of its own.
+        try:
+            stock.snapshot_schedule.maybe_take(conn)
+        except Exception as e:
+            print(f"Stock snapshot error: {e}")
+
+
+# --- Shared Instances ---
+# One queue per store; write_queues.get() is the current store's.
+write_queues = PerStore(WriteQueue)